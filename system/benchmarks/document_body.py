@@ -0,0 +1,62 @@
+"""Storage saved and CPU cost of compressing document bodies.
+
+Run from the system directory:
+    $ python -m benchmarks.document_body
+"""
+import argparse
+import random
+import timeit
+
+from model.compression import compress_text, decompress_text
+
+WORDS = (
+    "the document audit review system user permission comment approve reject "
+    "project proposal budget schedule team member report result meeting note "
+    "update draft version section summary change request owner deadline"
+).split()
+
+
+def make_body(size: int, seed: int = 0) -> str:
+    """Build an HTML body of about size characters of repetitive prose."""
+    rng = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+            sentences.append(sentence.capitalize() + '.')
+        paragraph = '<p>' + ' '.join(sentences) + '</p>'
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return ''.join(paragraphs)[:size]
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--level', type=int, default=6, help='zlib compression level')
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'stored':>10} {'saved':>7} {'write +us':>10} {'read +us':>10}")
+    for size in args.sizes:
+        body = make_body(size)
+        plain = body.encode('utf-8')
+        stored = compress_text(body, level=args.level)
+        number = max(1, 2000000 // size)
+
+        # the cost added on top of storing the body as plain UTF-8 text
+        write = per_call_us(lambda: compress_text(body, level=args.level), number) - \
+            per_call_us(lambda: body.encode('utf-8'), number)
+        read = per_call_us(lambda: decompress_text(stored), number) - \
+            per_call_us(lambda: plain.decode('utf-8'), number)
+        saved = 1 - len(stored) / len(plain)
+        print(f"{len(plain):>10} {len(stored):>10} {saved:>7.1%} {write:>10.1f} {read:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
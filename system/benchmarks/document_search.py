@@ -0,0 +1,96 @@
+"""Latency of full-text document search on a generated corpus.
+
+Run from the system directory:
+    $ python -m benchmarks.document_search --documents 100000
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from itertools import accumulate
+from typing import List
+
+from flask import Flask
+from sqlalchemy import insert
+
+from model.base_model import db
+from model.document_model import Document
+from model.search_model import SearchDocument, SearchPosting
+from model.user_model import User
+from service.search_service import NAME_WEIGHT, SearchService, tokenize
+
+
+def make_vocabulary(size: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def make_text(vocabulary: List[str], weights: List[float], words: int, rng: random.Random) -> str:
+    """Draw words with a Zipf distribution, as in natural language."""
+    return ' '.join(rng.choices(vocabulary, cum_weights=weights, k=words))
+
+
+def build_corpus(documents: int, body_words: int, vocabulary: List[str], batch_size: int = 1000):
+    weights = list(accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    rng = random.Random(0)
+    db.session.add(User(id=1, username="owner", name="Owner", mail="owner@example.com", google_id="google_id_1"))
+    db.session.commit()
+    for start in range(0, documents, batch_size):
+        rows, postings, lengths = [], [], []
+        for document_id in range(start + 1, min(start + batch_size, documents) + 1):
+            name = make_text(vocabulary, weights, 3, rng)
+            body = '<p>' + make_text(vocabulary, weights, body_words, rng) + '</p>'
+            rows.append({"id": document_id, "uid": f"doc{document_id}", "name": name, "body": body,
+                         "owner_id": 1, "document_status_id": 1})
+            # same terms as SearchService.index_document, written in bulk
+            term_counts = Counter(tokenize(body))
+            for term in tokenize(name):
+                term_counts[term] += NAME_WEIGHT
+            postings.extend({"term": term, "document_id": document_id, "term_frequency": count}
+                            for term, count in term_counts.items())
+            lengths.append({"document_id": document_id, "length": sum(term_counts.values())})
+        db.session.execute(insert(Document), rows)
+        db.session.execute(insert(SearchPosting), postings)
+        db.session.execute(insert(SearchDocument), lengths)
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--body-words', type=int, default=300)
+    parser.add_argument('--vocabulary', type=int, default=50000, help='number of distinct words')
+    parser.add_argument('--database', default='sqlite:///:memory:', help='SQLAlchemy database URI')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    db.init_app(app)
+    with app.test_request_context():
+        db.create_all()
+        started = time.perf_counter()
+        vocabulary = make_vocabulary(args.vocabulary)
+        build_corpus(args.documents, args.body_words, vocabulary)
+        print(f"indexed {args.documents} documents in {time.perf_counter() - started:.1f}s")
+
+        search_service = SearchService()
+        # from the most common words to rare ones
+        queries = {
+            "common word": vocabulary[0],
+            "two common words": f"{vocabulary[1]} {vocabulary[2]}",
+            "common + rare": f"{vocabulary[3]} {vocabulary[500]}",
+            "frequent word": vocabulary[50],
+            "rare words": f"{vocabulary[2000]} {vocabulary[3000]}",
+        }
+        print(f"{'query':<20} {'ms':>8}")
+        for label, query in queries.items():
+            search_service.search(1, query)
+            started = time.perf_counter()
+            for _ in range(5):
+                search_service.search(1, query)
+            print(f"{label:<20} {(time.perf_counter() - started) / 5 * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Publish latency of a new connection per message against the pooled publisher.
+
+Without --host, the broker is an in-memory stand-in that only simulates the
+handshake of a new connection and the round trip of a publisher confirm.
+
+Run from the system directory:
+    $ python -m benchmarks.rabbitmq_publish
+    $ python -m benchmarks.rabbitmq_publish --host localhost
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from typing import Callable, List
+
+import pika
+from flask import Flask
+
+from repo.rabbitmq_repo import RabbitMQPubliser
+
+QUEUE_NAME = 'benchmark_email'
+MESSAGE = {
+    "title": "You Have a New Audit Task!",
+    "content": "You have been assigned new audit tasks for these documents:\n- Document 1\n",
+    "recipient": "auditor@example.com"
+}
+
+
+class StandInChannel:
+    def __init__(self, confirm_seconds: float):
+        self.confirm_seconds = confirm_seconds
+        self.is_open = True
+        self.published = 0
+
+    def confirm_delivery(self):
+        pass
+
+    def queue_declare(self, queue, durable=False):
+        self.wait_for_broker()
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        # waiting for the confirm of the broker
+        self.wait_for_broker()
+        self.published += 1
+
+    def wait_for_broker(self):
+        if self.confirm_seconds:
+            time.sleep(self.confirm_seconds)
+
+
+class StandInConnection:
+    """Connection to an in-memory broker, sleeping where a real one waits on the network."""
+    def __init__(self, connect_seconds: float, confirm_seconds: float):
+        # TCP handshake, AMQP protocol negotiation and opening the channel
+        time.sleep(connect_seconds)
+        self.stand_in_channel = StandInChannel(confirm_seconds)
+        self.is_open = True
+
+    def channel(self):
+        return self.stand_in_channel
+
+    def process_data_events(self, time_limit=0):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def publish_with_new_connection(connect: Callable, message) -> None:
+    """How messages were published before the pool: one connection each."""
+    with connect() as connection:
+        channel = connection.channel()
+        channel.confirm_delivery()
+        channel.queue_declare(queue=QUEUE_NAME, durable=True)
+        channel.basic_publish(
+            exchange='',
+            routing_key=QUEUE_NAME,
+            body=json.dumps(message),
+            properties=pika.BasicProperties(delivery_mode=pika.DeliveryMode.Persistent),
+            mandatory=True
+        )
+
+
+def latencies_us(publish: Callable[[], None], count: int) -> List[float]:
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        publish()
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def throughput(publish: Callable[[], None], threads: int, count: int) -> float:
+    """Messages per second of threads publishing count messages each."""
+    workers = [
+        threading.Thread(target=lambda: [publish() for _ in range(count)])
+        for _ in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', help='a RabbitMQ broker, the in-memory stand-in when omitted')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--connect-ms', type=float, default=3.0,
+                        help='simulated cost of opening a connection and channel')
+    parser.add_argument('--confirm-us', type=float, default=0.0,
+                        help='simulated round trip of a publisher confirm')
+    args = parser.parse_args()
+
+    if args.host:
+        def connect():
+            return pika.BlockingConnection(pika.ConnectionParameters(host=args.host))
+    else:
+        def connect():
+            return StandInConnection(args.connect_ms / 1000, args.confirm_us / 1e6)
+
+    publisher = RabbitMQPubliser(pool_size=args.pool_size, connection_factory=connect)
+    # the publisher logs its errors through the Flask app
+    with Flask(__name__).app_context():
+        candidates = {
+            "connection per message": lambda: publish_with_new_connection(connect, MESSAGE),
+            "pooled publisher": lambda: publisher.send_message_to_queue(QUEUE_NAME, MESSAGE),
+        }
+        # opens the first pooled channel and declares the queue
+        publisher.send_message_to_queue(QUEUE_NAME, MESSAGE)
+
+        print(f"{'publish':<24} {'p50 us':>10} {'p99 us':>10} {'msg/s x' + str(args.threads):>12}")
+        for name, publish in candidates.items():
+            latencies = sorted(latencies_us(publish, args.messages))
+            p50 = statistics.median(latencies)
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            rate = throughput(publish, args.threads, max(1, args.messages // args.threads))
+            print(f"{name:<24} {p50:>10.1f} {p99:>10.1f} {rate:>12.0f}")
+
+        start = time.perf_counter()
+        publisher.send_messages_to_queue(QUEUE_NAME, [MESSAGE] * args.messages)
+        batch = (time.perf_counter() - start) * 1e6 / args.messages
+        print(f"{'pooled batch':<24} {batch:>10.1f} {'':>10} {'':>12}")
+        publisher.close()
+
+        if args.host:
+            with connect() as connection:
+                connection.channel().queue_delete(queue=QUEUE_NAME)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from .account.routes import account
 from .llm.routes import llm
 from .googleAuth.routes import googleAuth
 from .users.routes import users
+from .commands import commands
 from .config import Config
 from model.base_model import db
 from model.document_model import (
@@ -26,6 +27,7 @@ from model.document_model import Document
 from repo.audit_repo import AuditRepository
 from repo.user_repo import UserRepository
 from repo.document_repo import DocumentRepository
+from repo.lookup import lookup_registry
 
 from flask_admin.contrib.sqla import ModelView
 from model.user_model import User
@@ -150,6 +152,9 @@ def create_app():
             db.create_all()
             init_dummy(db)
 
+        # statuses and permission types are checked against in-memory copies
+        lookup_registry.load()
+
     # register document component
     # and also add prefix /document of URL
     app.register_blueprint(documents, url_prefix='/documents')
@@ -180,6 +185,9 @@ def create_app():
 
     app.register_blueprint(users, url_prefix='/users')
 
+    # register maintenance commands of flask CLI
+    app.register_blueprint(commands)
+
     # import admin and register
     admin = Admin(app, url="/admin", name='microblog', template_mode='bootstrap3')
     admin.add_view(ModelView(Document, db.session))
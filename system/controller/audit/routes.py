@@ -4,8 +4,8 @@ from model.audit_model import Audit
 from service.audit_service import AuditService
 from service.user_service import UserService
 
-from .schema import NewAuditSchema
-from ..util import validate_json
+from .schema import BulkAuditSchema, NewAuditSchema
+from ..util import validate_json, get_page_args
 
 # Create a Blueprint for the audit endpoints
 audit = Blueprint('audit', __name__)
@@ -14,10 +14,14 @@ user_service = UserService()
 
 @audit.route('/', methods=['GET'], strict_slashes=False)
 def get_audits():
-    """Retrieve all audits with optional sorting.
+    """Retrieve audits with optional sorting and cursor pagination.
 
-    This endpoint retrieves all audit records that the user needs to audit.
-    It supports optional sorting based on query parameters.
+    This endpoint retrieves audit records that the user needs to audit.
+    It supports optional sorting based on query parameters, and returns
+    `limit` audits per page when `limit` is given. The `nextCursor` of the
+    response is passed as `cursor` to fetch the next page, with the same
+    `sort` and `status`. `status` only lists audits in that status, e.g. 3
+    for the pending ones.
 
     Returns:
         Response: A JSON response containing a list of documents to be audited.
@@ -34,12 +38,13 @@ def get_audits():
                     "auditCreatedTime": "2000-09-27T00:00:00Z"
                 },
                 // Additional documents...
-            ]
+            ],
+            "nextCursor": null
         }
 
         Using curl to call endpoint:
             ```bash
-            $ curl -i "http://localhost:5000/api/audits?sort=created_date"
+            $ curl -i "http://localhost:5000/api/audits?sort=created_date&limit=20&status=3"
             {
                 "documents": [
                     {
@@ -52,15 +57,44 @@ def get_audits():
                         "auditor": "Albert",
                     },
                     // Additional documents...
-                ]
+                ],
+                "nextCursor": "eyJ2IjoiMjAwMC0wOS0yN1QwMDowMDowMCIsInQiOiJkYXRldGltZSIsImlkIjo0Mn0="
             }
             ```
     """
     google_id = session['google_id']
     user_id = user_service.get_user_by_google_id(google_id).id
     sort = request.args.get(key = 'sort', default = 'created_date')
-    audits = audit_service.get_all_audits(user_id, sort)
-    return jsonify({"documents": audits})
+    status = request.args.get('status')
+    if status is not None and not status.isdigit():
+        return jsonify({"error": "status must be an audit status ID"}), 400
+    try:
+        limit, cursor = get_page_args()
+        page = audit_service.get_all_audits(user_id, sort, limit, cursor, int(status) if status else None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@audit.route('/counts', methods=['GET'])
+def get_audit_counts():
+    """Count the audits of the user by status.
+
+    `auditor` counts the audits assigned to the user, `owner` the audits of
+    the documents the user owns. Counts are kept up to date by every audit
+    write, so this never reads the audits themselves.
+
+    Example:
+        ```bash
+        $ curl -i "http://localhost:5000/api/audits/counts"
+        {
+            "auditor": {"pending": 2, "approved": 10, "rejected": 1, "notSent": 0},
+            "owner": {"pending": 1, "approved": 4, "rejected": 0, "notSent": 3}
+        }
+        ```
+    """
+    google_id = session['google_id']
+    user_id = user_service.get_user_by_google_id(google_id).id
+    return jsonify(audit_service.get_audit_counts(user_id))
 
 @audit.route('/', methods=['POST'], strict_slashes=False)
 # FIXME: valid query parameter
@@ -131,3 +165,50 @@ def request_audit():
         return jsonify(audit), 200
     else:
         return jsonify({"error": "User not found or audit creation failed"}), 400
+
+@audit.route('/bulk', methods=['POST'])
+@validate_json(BulkAuditSchema)
+def request_audits(assignments):
+    """Request audits for many documents in one call.
+
+    Every assignment is applied in one transaction, or none when a document
+    or an auditor cannot be found. Each auditor receives one email listing
+    all of their new documents.
+
+    Request JSON format:
+        {
+            "assignments": [
+                {"documentUid": "abc123", "auditorUsername": "albert123"},
+                {"documentUid": "def456", "auditorUsername": "albert123"}
+            ]
+        }
+
+    Returns:
+        Response: The audit UID of each assignment, in the order of the request.
+
+    Example:
+        POST /audits/bulk
+
+        Response Body:
+        {
+            "audits": [
+                {"documentUid": "abc123", "auditUid": "0b3d..."},
+                {"documentUid": "def456", "auditUid": "5f1a..."}
+            ]
+        }
+
+        Using curl to call endpoint:
+            ```bash
+            $ curl -i -X POST "http://localhost:5000/api/audits/bulk" \
+                -H "Content-Type: application/json" \
+                -d '{"assignments": [{"documentUid": "NotExist", "auditorUsername": "albert123"}]}'
+            {
+                "error": "Can't find document by UID: NotExist"
+            }
+            ```
+    """
+    try:
+        audits = audit_service.create_audits(assignments)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"audits": audits}), 200
@@ -1,8 +1,21 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
+
+# the most assignments of one POST /audits/bulk
+MAX_BULK_AUDITS = 1000
 
 
 class NewAuditSchema(Schema):
     """Schema for validating message data.
     """
     documentUid = fields.String(required = True)
-    auditorUsername = fields.String(required = True)
\ No newline at end of file
+    auditorUsername = fields.String(required = True)
+
+
+class BulkAuditSchema(Schema):
+    """Schema for validating the assignments of a bulk audit request.
+    """
+    assignments = fields.List(
+        fields.Nested(NewAuditSchema),
+        required = True,
+        validate = validate.Length(min = 1, max = MAX_BULK_AUDITS)
+    )
@@ -0,0 +1,87 @@
+import click
+from flask import Blueprint
+
+from repo.document_repo import DocumentRepository
+from service.audit_service import AuditService
+from service.import_service import ImportService, iter_records
+from service.search_service import SearchService
+from service.user_service import UserService
+
+# register commands directly under `flask`, e.g. `flask --app controller.app backfill-document-summary`
+commands = Blueprint('commands', __name__, cli_group=None)
+
+
+@commands.cli.command('backfill-document-summary')
+@click.option('--batch-size', default=500, show_default=True, help='Documents updated per transaction.')
+def backfill_document_summary(batch_size: int):
+    """Compute snippet and body size of documents stored before they existed."""
+    updated = DocumentRepository().backfill_document_summaries(batch_size)
+    click.echo(f"Updated summary of {updated} documents")
+
+
+@commands.cli.command('compress-document-bodies')
+@click.option('--batch-size', default=500, show_default=True, help='Documents read per transaction.')
+def compress_document_bodies(batch_size: int):
+    """Compress document bodies stored as plain text before compression existed."""
+    rewritten = DocumentRepository().compress_document_bodies(batch_size)
+    click.echo(f"Compressed body of {rewritten} documents")
+
+
+@commands.cli.command('reindex-documents')
+@click.option('--batch-size', default=500, show_default=True, help='Documents read per query.')
+def reindex_documents(batch_size: int):
+    """Rebuild the full-text search index of every document."""
+    indexed = SearchService().reindex_documents(batch_size)
+    click.echo(f"Indexed {indexed} documents")
+
+
+@commands.cli.command('reindex-users')
+@click.option('--batch-size', default=500, show_default=True, help='Users indexed per transaction.')
+def reindex_users(batch_size: int):
+    """Rebuild the autocomplete index of every user, used by the share dialog."""
+    indexed = UserService().reindex_users(batch_size)
+    click.echo(f"Indexed {indexed} users")
+
+
+@commands.cli.command('import-documents')
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+@click.option('--owner', help='Username of the owner of the imported documents.')
+@click.option('--resume', 'import_id', type=int, help='ID of a failed import of the same archive to resume.')
+@click.option('--batch-size', default=500, show_default=True, help='Documents inserted per transaction.')
+def import_documents(archive: str, owner: str, import_id: int, batch_size: int):
+    """Import the documents of an NDJSON or JSON array archive, e.g. written by the export."""
+    import_service = ImportService()
+    if import_id is not None:
+        try:
+            document_import = import_service.resume_import(import_id, archive)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Resuming import {import_id} after {document_import.imported} documents")
+    elif owner:
+        try:
+            document_import = import_service.start_import(owner, archive)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Started import {document_import.id}")
+    else:
+        raise click.UsageError('Either --owner or --resume is required')
+
+    with open(archive, encoding='utf-8') as stream:
+        document_import = import_service.import_documents(
+            document_import,
+            iter_records(stream),
+            batch_size,
+            progress=lambda imported: click.echo(f"Imported {imported} documents")
+        )
+    if document_import.status == 'failed':
+        raise click.ClickException(
+            f"{document_import.error}\nResume with: import-documents {archive} --resume {document_import.id}"
+        )
+    click.echo(f"Imported {document_import.imported} documents")
+
+
+@commands.cli.command('rebuild-audit-counters')
+def rebuild_audit_counters():
+    """Recount the audits of every user by status, e.g. after the counters were created."""
+    written = AuditService().rebuild_audit_counts()
+    click.echo(f"Wrote {written} audit counters")
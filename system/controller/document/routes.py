@@ -1,41 +1,116 @@
 from typing import List, Dict
 
-from flask import Blueprint, request, jsonify, current_app, session
+from flask import Blueprint, Response, request, jsonify, current_app, session, stream_with_context
 from service.document_service import DocumentService
 from service.audit_service import AuditService
 from service.user_service import UserService
-from .schema import NewDocumentSchema, UpdateDocumentSchema
-from ..util import validate_json
-from model.document_model import Document, DocumentStatus, DocumentComment, DocumentPermission, DocumentPermissionType
+from service.revision_service import RevisionService
+from service.search_service import SearchService
+from .schema import NewDocumentSchema, UpdateDocumentSchema, PatchDocumentSchema
+from ..util import validate_json, get_page_args, conditional_get
+from model.document_model import NEW_DOCUMENT_STATUS_ID, Document, DocumentStatus, DocumentComment, DocumentPermission, DocumentPermissionType
 
 documents = Blueprint('documents', __name__)
 
 document_service = DocumentService()
 audit_service = AuditService()
 user_service = UserService()
+revision_service = RevisionService()
+search_service = SearchService()
 
 @documents.route('/', methods=['GET'], strict_slashes=False)
 def get_documents():
     """
-    Retrieve all documents with optional sorting.
+    Retrieve documents with optional sorting and cursor pagination.
 
     Example:
         Use the following curl command to call the endpoint with sorting by 'name':
             ```bash
             curl -i -X GET 'http://localhost:5000/documents?sort=name'
             ```
+        Fetch 20 documents per page, passing the returned nextCursor to get the next page:
+            ```bash
+            curl -i -X GET 'http://localhost:5000/documents?limit=20'
+            curl -i -X GET 'http://localhost:5000/documents?limit=20&cursor=<nextCursor>'
+            ```
 
     Args:
-        sort (str): Query parameter to specify sorting of documents. Default is 'date'.
+        sort (str): Query parameter to specify sorting of documents. Default is 'created_date'.
+        limit (int): Query parameter to specify the page size. Every document is returned if omitted.
+        cursor (str): Query parameter with the nextCursor of the previous page.
 
     Returns:
-        JSON response containing a list of documents.
+        JSON response containing a list of documents and the cursor of the next page,
+        which is null on the last page.
     """
     sort = request.args.get('sort', 'created_date')
     google_id = session['google_id']
     user_id = user_service.get_user_by_google_id(google_id).id
-    docs = document_service.get_all_documents(user_id, sort)
-    return jsonify({"documents": docs})
+    try:
+        limit, cursor = get_page_args()
+        page = document_service.get_all_documents(user_id, sort, limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@documents.route('/search', methods=['GET'])
+def search_documents():
+    """
+    Search the names and bodies of the documents the user can open.
+
+    Documents are ranked with BM25 over a full-text index, the best match first.
+
+    Example:
+        curl -i -X GET 'http://localhost:5000/documents/search?q=project+proposal&limit=10'
+
+    Args:
+        q (str): Query parameter with the words searched for.
+        limit (int): Query parameter to specify the number of documents returned. Default is 20.
+
+    Returns:
+        JSON response with the matching documents, 400 if the limit is invalid.
+    """
+    query = request.args.get('q', '')
+    google_id = session['google_id']
+    user_id = user_service.get_user_by_google_id(google_id).id
+    try:
+        limit, _ = get_page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    documents = search_service.search(user_id, query, limit or 20)
+    return jsonify({"documents": documents})
+
+@documents.route('/export', methods=['GET'])
+def export_documents():
+    """
+    Download every document the user can open as NDJSON, one JSON document per line.
+
+    The response is streamed while the documents are read, so exporting
+    100k documents needs as much memory as exporting 10.
+
+    Example:
+        ```bash
+        curl -o documents.ndjson 'http://localhost:5000/documents/export'
+        curl -o documents.ndjson.gz 'http://localhost:5000/documents/export?compress=gzip'
+        ```
+
+    Args:
+        compress (str): Query parameter, `gzip` compresses the export.
+
+    Returns:
+        The NDJSON stream, 400 if compress is not supported.
+    """
+    compress = request.args.get('compress')
+    if compress not in (None, 'gzip'):
+        return jsonify({"error": f"Unsupported compression: {compress}"}), 400
+    google_id = session['google_id']
+    user_id = user_service.get_user_by_google_id(google_id).id
+    filename = 'documents.ndjson.gz' if compress else 'documents.ndjson'
+    return Response(
+        stream_with_context(document_service.export_documents(user_id, compress=bool(compress))),
+        mimetype='application/gzip' if compress else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @documents.route('/', methods=['POST'], strict_slashes=False)
 def create_document():
@@ -63,7 +138,7 @@ def create_document():
     name = 'New Document'
     google_id = session['google_id']
     owner_id = user_service.get_user_by_google_id(google_id).id
-    document_status_id = 2
+    document_status_id = NEW_DOCUMENT_STATUS_ID
     document_uid = document_service.create_document(name, owner_id, document_status_id)
     return jsonify({"documentUid": document_uid}), 201
 
@@ -77,8 +152,13 @@ def update_document(uid, body, comments):
         body (str): The new content of the document's body.
         comments (str): The updated comments associated with the document.
 
+    A commentor is given by its user ID ({"id": 3}) or its full name ({"name": "Adam"}),
+    the ID skips the name lookup.
+
     Returns:
-        An empty HTTP 200 response indicating successful update.
+        An empty HTTP 200 response indicating successful update, 400 if a commentor
+        cannot be found, 409 with the current version if concurrent saves kept
+        winning over this one.
 
     Example:
         Use the following curl command to update a new document:
@@ -99,9 +179,58 @@ def update_document(uid, body, comments):
             }'
             ```
     """
-    document_service.update_document(uid, body, comments)
+    author_id = user_service.get_user_by_google_id(session['google_id']).id
+    try:
+        data = document_service.update_document(uid, body, comments, author_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if data is not None and data['state'] == 'conflict':
+        return jsonify(data), 409
     return '', 200
 
+@documents.route('/<uid>', methods=['PATCH'], strict_slashes=False)
+@validate_json(PatchDocumentSchema)
+def patch_document(uid, base_version, ops, comments):
+    """Apply text operations to the document's body instead of uploading the whole body.
+
+    The operations are computed against the body at baseVersion, the version
+    returned by GET /documents/<uid> or by the previous patch. Comments are
+    only replaced when they are sent.
+
+    Args:
+        uid (str): The unique identifier of the document.
+        base_version (int): The version of the body the operations apply to.
+        ops (list): The retain, insert and delete operations. Lengths count UTF-16
+                    code units, as the editor does, so an emoji counts as two.
+        comments (list): The updated comments associated with the document, optional.
+
+    Returns:
+        JSON response with the new version, 409 with the current version if
+        baseVersion is stale, 400 if the document is not found or the operations
+        do not apply to the body.
+
+    Example:
+        Replace the 5 characters after the first 12 characters with "world":
+            ```bash
+            curl -i -X PATCH http://localhost:5000/documents/doc1 \
+            -H "Content-Type: application/json" \
+            -d '{
+                "baseVersion": 3,
+                "ops": [{"retain": 12}, {"delete": 5}, {"insert": "world"}]
+            }'
+            ```
+    """
+    try:
+        author_id = user_service.get_user_by_google_id(session['google_id']).id
+        data = document_service.patch_document(uid, base_version, ops, comments, author_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if data is None:
+        return jsonify({"error": "Can't find document by uid"}), 400
+    if data['state'] == 'conflict':
+        return jsonify(data), 409
+    return jsonify(data), 200
+
 @documents.route('/<uid>', methods=['GET'], strict_slashes=False)
 def get_document(uid):
     """
@@ -115,6 +244,10 @@ def get_document(uid):
     Args:
         uid (str): The unique identifier of the document to retrieve.
 
+    The response carries an ETag. A request with a matching If-None-Match header
+    gets an empty 304 response, answered from a version lookup without loading
+    the document.
+
     Returns:
         JSON: A JSON response containing detailed information about the document, or an error message if not found.
 
@@ -125,22 +258,116 @@ def get_document(uid):
             ```
     """
     user = user_service.get_user_by_google_id(session['google_id'])
-    document = document_service.get_document(user.id, uid)
-    if 'state' in document:
+
+    def build_response():
+        document = document_service.get_document(user.id, uid)
+        if 'state' in document:
+            return jsonify({"error": "Can't find document by uid"}), 400
+        else:
+            return jsonify(document), 200
+
+    return conditional_get(document_service.get_document_version(user, uid), build_response)
+
+@documents.route('/<string:document_uid>/revisions', methods=['GET'], strict_slashes=False)
+def get_document_revisions(document_uid):
+    """
+    List the revisions of a document, oldest first, with cursor pagination.
+
+    Every save of the body (PUT or PATCH /documents/<uid>) records a revision,
+    numbered by the document version it saved.
+
+    Args:
+        limit (int): Query parameter to specify the page size. Every revision is returned if omitted.
+        cursor (str): Query parameter with the nextCursor of the previous page.
+
+    Returns:
+        JSON response with the revisions and the cursor of the next page,
+        400 if the document is not found or the pagination arguments are invalid.
+
+    Example:
+        curl -X GET 'http://localhost:5000/documents/doc1/revisions?limit=20'
+    """
+    try:
+        limit, cursor = get_page_args()
+        page = revision_service.list_revisions(document_uid, limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if page is None:
         return jsonify({"error": "Can't find document by uid"}), 400
+    return jsonify(page), 200
+
+@documents.route('/<string:document_uid>/revisions/<int:revision>', methods=['GET'])
+def get_document_revision(document_uid, revision):
+    """
+    Retrieve the body of a document as saved by a revision.
+
+    Returns:
+        JSON response with the revision number and body, 400 if the document or
+        the revision is not found.
+
+    Example:
+        curl -X GET http://localhost:5000/documents/doc1/revisions/3
+    """
+    data = revision_service.get_revision(document_uid, revision)
+    if data is None:
+        return jsonify({"error": "Can't find revision"}), 400
+    return jsonify(data), 200
+
+@documents.route('/<string:document_uid>/revisions/<int:from_revision>/diff/<int:to_revision>', methods=['GET'])
+def diff_document_revisions(document_uid, from_revision, to_revision):
+    """
+    Compare two revisions of a document.
+
+    Returns:
+        JSON response with the retain, insert and delete operations turning the
+        body of from_revision into the body of to_revision, counted in UTF-16
+        code units like the ops of PATCH, 400 if the document or one of the
+        revisions is not found.
+
+    Example:
+        curl -X GET http://localhost:5000/documents/doc1/revisions/3/diff/5
+    """
+    data = revision_service.diff_revisions(document_uid, from_revision, to_revision)
+    if data is None:
+        return jsonify({"error": "Can't find revision"}), 400
+    return jsonify(data), 200
+
+@documents.route('/<string:document_uid>/lock-session', methods=['POST'], strict_slashes=False)
+def acquire_document_lock_session(document_uid):
+    """
+    Take the edit lease of a document by (UID).
+
+    Reading a document with GET /documents/<uid> never takes the lease, editors
+    call this endpoint once, then keep the lease with PUT and release it with DELETE.
+
+    Returns:
+        JSON response with the fencing token of the lease if it is taken,
+        409 if another user is editing the document, 400 if the document is not found,
+        503 if the lease store cannot be reached.
+
+    Example:
+        curl -X POST http://localhost:5000/documents/doc1/lock-session
+    """
+    data = document_service.acquire_lock_session_by_uid(document_uid)
+    if data['state'] == 'true':
+        return jsonify(data), 200
+    elif data['state'] == 'unavailable':
+        return jsonify(data), 503
+    elif data['otherIsEditting']:
+        return jsonify(data), 409
     else:
-        return jsonify(document), 200
+        return jsonify(data), 400
 
 @documents.route('/<string:document_uid>/lock-session', methods=['DELETE'], strict_slashes=False)
 def delete_document_lock_session(document_uid):
     """
-    Delete lock_session by (UID).
+    Release the edit lease of a document by (UID).
 
     Args:
-        uid (str): The unique identifier of the document to be deleted.
+        uid (str): The unique identifier of the document.
 
     Returns:
-        JSON response indicating whether the deletion was successful or failed.
+        JSON response indicating whether the lease held by this session was released.
 
     Example:
         Use the following curl command to delete a document by UID:
@@ -151,12 +378,16 @@ def delete_document_lock_session(document_uid):
     data = document_service.delete_lock_session_by_uid(document_uid)
     if data['state'] == 'true':
         return jsonify(data), 200
+    elif data['state'] == 'unavailable':
+        return jsonify(data), 503
     else:
         return jsonify(data), 400
 
 @documents.route('/<string:document_uid>/lock-session', methods=['PUT'])
 def update_document_lock_session(document_uid):
     """
+    Renew the edit lease of a document held by this session (heartbeat).
+
     Example:
         curl -X PUT http://localhost:5000/documents/doc1/lock-session \
              -H "Content-Type: application/json" \
@@ -165,6 +396,8 @@ def update_document_lock_session(document_uid):
     data = document_service.update_lock_session_by_uid(document_uid)
     if data['state'] == 'true':
         return jsonify(data), 200
+    elif data['state'] == 'unavailable':
+        return jsonify(data), 503
     else:
         return jsonify(data), 400
 
@@ -176,17 +409,23 @@ def get_audit_result(document_uid):
     Args:
         document_uid (str): The unique identifier for the document.
 
+    The response carries an ETag, a request with a matching If-None-Match header
+    gets an empty 304 response.
+
     Example:
         curl -X GET  http://localhost:8080/api/v1/documents/doc1/audit-result
 
     Returns:
         A JSON response containing the audit results if found, or an error message if not found.
     """
-    audit_result = audit_service.get_audit_result(document_uid)
-    if audit_result:
-        return jsonify(audit_result), 200
-    else:
-        return jsonify({"error": "Audit record not found"}), 400
+    def build_response():
+        audit_result = audit_service.get_audit_result(document_uid)
+        if audit_result:
+            return jsonify(audit_result), 200
+        else:
+            return jsonify({"error": "Audit record not found"}), 400
+
+    return conditional_get(audit_service.get_audit_result_version(document_uid), build_response)
 
 @documents.route('/<string:document_uid>/audit-result', methods=['POST'])
 def submit_audit_result(document_uid):
@@ -10,3 +10,9 @@ class UpdateDocumentSchema(Schema):
     """Schema for validating updated document data."""
     body = fields.String(required=True)
     comments = fields.List(fields.Dict(), required=True)
+
+class PatchDocumentSchema(Schema):
+    """Schema for validating text operations against a version of the document body."""
+    base_version = fields.Integer(required=True, data_key='baseVersion')
+    ops = fields.List(fields.Dict(), required=True)
+    comments = fields.List(fields.Dict(), load_default=None)
@@ -64,10 +64,11 @@ def callback():
     auth_service.fetch_token()
     auth_service.validate_state()
     auth_service.get_user_info()
-    if not user_service.get_user_by_google_id(session['google_id']):
-        user_service.create_user(session['email'], session['name'], session['email'], session['google_id'], third_party_info=session['picture'])
+    user = user_service.get_user_by_google_id(session['google_id'])
+    if not user:
+        user = user_service.create_user(session['email'], session['name'], session['email'], session['google_id'], third_party_info=session['picture'])
 
-    session['id'] = user_service.get_user_by_google_id(session['google_id']).id
+    session['id'] = user.id
 
     return redirect("/")
 
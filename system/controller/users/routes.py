@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request, current_app, session
 from service.user_service import UserService
+from ..util import get_page_args
 
 users = Blueprint('users', __name__)
 user_service = UserService()
@@ -7,16 +8,20 @@ user_service = UserService()
 @users.route('/', methods=['GET'], strict_slashes=False)
 def find_users():
     """
-    Retrieve a list of users whose names contain the provided search text. The search is case-sensitive.
+    Retrieve a list of users whose username, name, a word of their name or mail starts with
+    the provided search text, for the share dialog of a document. The search ignores case and accents.
+    The owner of the document and the caller are never returned.
 
     Args:
         search-text (str): The search string used to filter user names and emails.
+        document-uid (str): The document being shared.
+        limit (int): The maximum number of users returned, 10 by default.
 
     Returns:
-        JSON array of users matching the search criteria. Each user object contains the user's name,
-        email, and optionally, their profile picture URL. If no users match the criteria,
-        an empty list is returned. If the search text is not provided, returns a 400 error with
-        a JSON error message.
+        JSON array of users matching the search criteria, best match first. Each user object contains
+        the user's name, email, and optionally, their profile picture URL. If no users match the criteria,
+        an empty list is returned. If the search text is not provided or the limit is invalid, returns
+        a 400 error with a JSON error message.
 
     Example:
         * search user exist:
@@ -43,10 +48,14 @@ def find_users():
     user_id = user_service.get_user_by_google_id(session['google_id']).id
     if not search_text:
         return jsonify({'error': 'Search text parameter is required'}), 400
+    try:
+        limit, _ = get_page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     try:
         current_app.logger.info(f"Search user info by : {search_text}")
-        users_info = user_service.get_user_info_by_search_text(search_text, document_uid, user_id)
+        users_info = user_service.get_user_info_by_search_text(search_text, document_uid, user_id, limit or 10)
         current_app.logger.info(f"Found {len(users_info)} data by : {search_text}")
         return jsonify(users_info), 200
     except Exception as e:
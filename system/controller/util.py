@@ -1,6 +1,8 @@
+import hashlib
 from functools import wraps
+from typing import Any, Callable, Optional
 
-from flask import jsonify, request
+from flask import Response, jsonify, make_response, request
 from marshmallow import Schema, fields, ValidationError
 
 
@@ -28,4 +30,61 @@ def validate_json(schema):
             except ValidationError as e:
                 return jsonify({'error': str(e)}), 422
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+MAX_PAGE_SIZE = 200
+
+
+def get_page_args():
+    """Read the keyset pagination query parameters of the current request.
+
+    Returns:
+        Tuple[Optional[int], Optional[str]]: The page size and the cursor of the
+        page to be fetched. The page size is None when `limit` is not given.
+
+    Raises:
+        ValueError: If `limit` is not an integer between 1 and MAX_PAGE_SIZE.
+    """
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is not None:
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be an integer between 1 and {MAX_PAGE_SIZE}")
+        limit = int(limit)
+    return limit, cursor or None
+
+
+def make_etag(version: Any) -> str:
+    """Build a strong ETag from the values a response depends on."""
+    return hashlib.sha1(repr(version).encode('utf-8')).hexdigest()
+
+
+def conditional_get(version: Optional[Any], build_response: Callable[[], Any]) -> Response:
+    """Answer a GET with 304 Not Modified when the client copy is still current.
+
+    The ETag is derived from version, so the check never calls build_response,
+    which assembles the full response only when the client copy is missing or
+    outdated.
+
+    Args:
+        version (Optional[Any]): The values the response depends on, None if
+                                 they cannot be found, e.g. for a missing document.
+        build_response (Callable[[], Any]): Builds the response, anything a view
+                                            function may return.
+
+    Returns:
+        Response: The 304 or built response, with the ETag of a 200 response set.
+    """
+    if version is None:
+        return make_response(build_response())
+    etag = make_etag(version)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(build_response())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    # responses differ per user, and must be revalidated before every reuse
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
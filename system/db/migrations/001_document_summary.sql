@@ -0,0 +1,5 @@
+-- Precomputed body preview used by document listings.
+-- Run `flask --app controller.app backfill-document-summary` afterwards to fill existing rows.
+ALTER TABLE document
+    ADD COLUMN snippet VARCHAR(200) NULL AFTER body,
+    ADD COLUMN body_size INT NOT NULL DEFAULT 0 AFTER snippet;
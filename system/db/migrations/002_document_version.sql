@@ -0,0 +1,3 @@
+-- Body version used by PATCH /documents/<uid> to reject patches against a stale body.
+ALTER TABLE document
+    ADD COLUMN version INT NOT NULL DEFAULT 1 AFTER body_size;
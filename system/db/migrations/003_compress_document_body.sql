@@ -0,0 +1,5 @@
+-- Document bodies are stored zlib compressed (see model/compression.py).
+-- Existing rows keep their UTF-8 text and stay readable as they are.
+-- Run `flask --app controller.app compress-document-bodies` afterwards to compress them.
+ALTER TABLE document
+    MODIFY COLUMN body LONGBLOB NULL;
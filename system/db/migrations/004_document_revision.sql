@@ -0,0 +1,14 @@
+-- Revision history of document bodies: a snapshot every 20 revisions and
+-- deltas (JSON text operations) in between, both stored like document.body.
+CREATE TABLE document_revision (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    document_id INT NOT NULL,
+    revision INT NOT NULL,
+    is_snapshot BOOLEAN NOT NULL DEFAULT FALSE,
+    content LONGBLOB NOT NULL,
+    author_id INT NULL,
+    created_date DATETIME NULL,
+    UNIQUE KEY uq_document_revision (document_id, revision),
+    FOREIGN KEY (document_id) REFERENCES document (id),
+    FOREIGN KEY (author_id) REFERENCES user (id)
+);
@@ -0,0 +1,2 @@
+-- Comments refer to their commenter by name, see UserRepository.find_user_ids_by_names.
+CREATE INDEX ix_user_name ON user (name);
@@ -0,0 +1,16 @@
+-- Inverted index of document names and bodies, see service/search_service.py.
+-- Run `flask --app controller.app reindex-documents` afterwards to index existing documents.
+CREATE TABLE search_posting (
+    term VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+    document_id INT NOT NULL,
+    term_frequency INT NOT NULL,
+    PRIMARY KEY (term, document_id),
+    KEY ix_search_posting_document_id (document_id),
+    FOREIGN KEY (document_id) REFERENCES document (id)
+);
+
+CREATE TABLE search_document (
+    document_id INT NOT NULL PRIMARY KEY,
+    length INT NOT NULL,
+    FOREIGN KEY (document_id) REFERENCES document (id)
+);
@@ -0,0 +1,10 @@
+-- Autocomplete index of users by username, name and mail, see UserRepository.find_users_by_search_text.
+-- Run `flask --app controller.app reindex-users` afterwards to index existing users.
+CREATE TABLE user_search_token (
+    token VARCHAR(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+    user_id INT NOT NULL,
+    kind INT NOT NULL,
+    PRIMARY KEY (token, user_id),
+    KEY ix_user_search_token_user_id (user_id),
+    FOREIGN KEY (user_id) REFERENCES user (id)
+);
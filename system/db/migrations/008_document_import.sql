@@ -0,0 +1,12 @@
+-- Progress of bulk document imports, see service/import_service.py.
+CREATE TABLE document_import (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    owner_id INT NOT NULL,
+    source VARCHAR(255) NOT NULL,
+    imported INT NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    error TEXT NULL,
+    created_date DATETIME NULL,
+    updated_date DATETIME NULL,
+    FOREIGN KEY (owner_id) REFERENCES user (id)
+);
@@ -0,0 +1,2 @@
+-- The audit inbox lists the audits of an auditor, optionally in one status, see AuditRepository.get_all_audits.
+CREATE INDEX ix_audit_auditor_id_audit_status_id ON audit (auditor_id, audit_status_id);
@@ -0,0 +1,11 @@
+-- Audit counts per user, role and status, see repo/audit_counter_repo.py.
+-- Run `flask --app controller.app rebuild-audit-counters` afterwards to count existing audits.
+CREATE TABLE audit_counter (
+    user_id INT NOT NULL,
+    role VARCHAR(10) NOT NULL,
+    audit_status_id INT NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, role, audit_status_id),
+    FOREIGN KEY (user_id) REFERENCES user (id),
+    FOREIGN KEY (audit_status_id) REFERENCES audit_status (id)
+);
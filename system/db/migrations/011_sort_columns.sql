@@ -0,0 +1,18 @@
+-- Documents and audits are only sorted by columns that are never NULL, and each sort is an index range.
+-- See DOCUMENT_SORT_COLUMNS and AUDIT_SORT_COLUMNS.
+UPDATE document SET created_date = UTC_TIMESTAMP() WHERE created_date IS NULL;
+UPDATE document SET updated_date = created_date WHERE updated_date IS NULL;
+ALTER TABLE document
+    MODIFY COLUMN created_date DATETIME NOT NULL,
+    MODIFY COLUMN updated_date DATETIME NOT NULL;
+CREATE INDEX ix_document_name ON document (name);
+CREATE INDEX ix_document_created_date ON document (created_date);
+CREATE INDEX ix_document_updated_date ON document (updated_date);
+
+UPDATE audit SET created_date = UTC_TIMESTAMP() WHERE created_date IS NULL;
+UPDATE audit SET updated_date = created_date WHERE updated_date IS NULL;
+ALTER TABLE audit
+    MODIFY COLUMN created_date DATETIME NOT NULL,
+    MODIFY COLUMN updated_date DATETIME NOT NULL;
+CREATE INDEX ix_audit_auditor_id_created_date ON audit (auditor_id, created_date);
+CREATE INDEX ix_audit_auditor_id_updated_date ON audit (auditor_id, updated_date);
@@ -114,26 +114,38 @@ class NotificationService:
             pika.ConnectionParameters(host=self.host)
         )
         channel = connection.channel()
-        channel.queue_declare(queue=self.email_queue)
+        # durable, like the API declares it, so queued emails survive a broker restart
+        channel.queue_declare(queue=self.email_queue, durable=True)
+        # take one email at a time, the others stay in the queue for other consumers
+        channel.basic_qos(prefetch_count=1)
 
         def callback(ch, method, properties, body):
-            if body:
-                try:
-                    data = json.loads(body)
-                    logger.info(f"Receive message: {data}")
-                    self.email_repo.send(
-                        recipient=data['recipient'],
-                        title=data['title'],
-                        content=data['content']
-                    )
-                except Exception as e:
-                    logger.error("Error when send to email")
-                    logger.error(e)
+            try:
+                data = json.loads(body)
+            except ValueError as e:
+                logger.error(f"Drop malformed message: {e}")
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                return
+            logger.info(f"Receive message: {data}")
+            try:
+                self.email_repo.send(
+                    recipient=data['recipient'],
+                    title=data['title'],
+                    content=data['content']
+                )
+            except Exception as e:
+                logger.error("Error when send to email")
+                logger.error(e)
+                # retry once, a message failing again is dropped instead of looping
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=not method.redelivered)
+                return
+            # acknowledged only once sent, so an email is not lost if this service stops
+            ch.basic_ack(delivery_tag=method.delivery_tag)
 
         channel.basic_consume(
             queue=self.email_queue, 
             on_message_callback=callback, 
-            auto_ack=True
+            auto_ack=False
         )
         logger.info('Service started. Waiting for messages')
         channel.start_consuming()
@@ -2,16 +2,30 @@ from datetime import datetime
 
 from .base_model import db
 
+# IDs of the rows of audit_status, see repo.lookup for their names
+AUDIT_STATUS_APPROVED = 1
+AUDIT_STATUS_REJECTED = 2
+AUDIT_STATUS_PENDING = 3
+AUDIT_STATUS_NOT_SENT = 4
+
 class Audit(db.Model):
     __tablename__ = 'audit'
+    # the audit inbox lists the audits of an auditor, optionally in one status,
+    # sorted by one of AUDIT_SORT_COLUMNS
+    __table_args__ = (
+        db.Index('ix_audit_auditor_id_audit_status_id', 'auditor_id', 'audit_status_id'),
+        db.Index('ix_audit_auditor_id_created_date', 'auditor_id', 'created_date'),
+        db.Index('ix_audit_auditor_id_updated_date', 'auditor_id', 'updated_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     uid = db.Column(db.String(50), unique=True, nullable=False)
     document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False)
-    auditor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    audit_status_id = db.Column(db.Integer, db.ForeignKey('audit_status.id'), nullable=False)
+    # the previous values are kept even when the audit was expired, audit counts move by them
+    auditor_id = db.mapped_column(db.Integer, db.ForeignKey('user.id'), nullable=False, active_history=True)
+    audit_status_id = db.mapped_column(db.Integer, db.ForeignKey('audit_status.id'), nullable=False, active_history=True)
     rejected_reason = db.Column(db.Text, nullable=True)
-    created_date = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def to_dict(self) -> dict:
         # Convert the Audit object to a dictionary.
@@ -35,3 +49,16 @@ class AuditStatus(db.Model):
     name = db.Column(db.String(50), nullable=False)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AuditCounter(db.Model):
+    """How many audits a user has in one status, as auditor or as document owner.
+
+    Maintained by the repositories on every audit write, so counts are read
+    without going through the audits, see AuditCounterRepository.
+    """
+    __tablename__ = 'audit_counter'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    # 'auditor' or 'owner'
+    role = db.Column(db.String(10), primary_key=True)
+    audit_status_id = db.Column(db.Integer, db.ForeignKey('audit_status.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
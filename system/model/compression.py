@@ -0,0 +1,70 @@
+import zlib
+from typing import Optional
+
+from sqlalchemy.dialects import mysql
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+# Compressed values start with this header: a NUL byte, which never starts a
+# text body, the codec and the format version. Anything else is UTF-8 text,
+# either written before compression existed or too short to be worth it.
+ZLIB_HEADER = b'\x00z\x01'
+
+
+def compress_text(value: str, min_size: int = 512, level: int = 6) -> bytes:
+    """Encode text for storage, compressing it when it is at least min_size bytes.
+
+    Args:
+        value (str): The text to be stored.
+        min_size (int): The UTF-8 size under which the text is stored uncompressed.
+        level (int): The zlib compression level.
+
+    Returns:
+        bytes: The stored representation of value.
+    """
+    data = value.encode('utf-8')
+    if len(data) < min_size and not data.startswith(b'\x00'):
+        return data
+    return ZLIB_HEADER + zlib.compress(data, level)
+
+
+def decompress_text(data: bytes) -> str:
+    """Decode a value written by compress_text, or plain UTF-8 text."""
+    if data.startswith(ZLIB_HEADER):
+        data = zlib.decompress(data[len(ZLIB_HEADER):])
+    return data.decode('utf-8')
+
+
+def is_compressed(data: bytes) -> bool:
+    return data.startswith(ZLIB_HEADER)
+
+
+class CompressedText(TypeDecorator):
+    """A text column stored zlib compressed, read and written as str.
+
+    Rows holding plain UTF-8 text, e.g. written while the column was still a
+    TEXT column, are read as they are, so existing data keeps working after
+    the column type changes and can be compressed later at any pace.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, min_size: int = 512, level: int = 6):
+        super().__init__()
+        self.min_size = min_size
+        self.level = level
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'mysql':
+            # BLOB holds 64KB at most
+            return dialect.type_descriptor(mysql.LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return compress_text(value, self.min_size, self.level)
+
+    def process_result_value(self, value, dialect) -> Optional[str]:
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(bytes(value))
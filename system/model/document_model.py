@@ -1,23 +1,64 @@
+import html
+import re
 from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import validates
+
 from .base_model import db
+from .compression import CompressedText
+
+SNIPPET_LENGTH = 200
+
+# IDs of the rows of document_permission_type, see repo.lookup for their names.
+# The mode a user opens a document in is a permission type or DOCUMENT_MODE_AUDIT.
+DOCUMENT_PERMISSION_READ = 1
+DOCUMENT_PERMISSION_WRITE = 2
+DOCUMENT_MODE_AUDIT = 3
+# the document_status of documents created in the editor
+NEW_DOCUMENT_STATUS_ID = 2
+
+def make_snippet(body: Optional[str], length: int = SNIPPET_LENGTH) -> str:
+    """Build a short plain-text preview of an HTML document body."""
+    if not body:
+        return ''
+    text = html.unescape(re.sub(r'<[^>]+>', ' ', body))
+    text = ' '.join(text.split())
+    return text[:length]
 
 class Document(db.Model):
     __tablename__ = 'document'
     id = db.Column(db.Integer, primary_key=True)
     uid = db.Column(db.String(50), unique=True, nullable=False)
-    name = db.Column(db.String(100), nullable=False)
-    body = db.Column(db.Text, nullable=True)
+    name = db.Column(db.String(100), nullable=False, index=True)
+    # stored zlib compressed, see CompressedText
+    body = db.Column(CompressedText(), nullable=True)
+    # precomputed from body, so listings never need to load the body column
+    snippet = db.Column(db.String(SNIPPET_LENGTH), nullable=True)
+    body_size = db.Column(db.Integer, nullable=False, default=0)
+    # increased on every body save, patches are applied against a known version
+    version = db.Column(db.Integer, nullable=False, default=1)
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     lock_session = db.Column(db.String(50), nullable=True)
     document_status_id = db.Column(db.Integer, db.ForeignKey('document_status.id'), nullable=False)
-    created_date = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # sort columns of the document listing, see DOCUMENT_SORT_COLUMNS
+    created_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    updated_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    @validates('body')
+    def update_summary(self, key, body):
+        self.snippet = make_snippet(body)
+        self.body_size = len(body) if body else 0
+        return body
 
     def to_dict(self) -> dict:
         return {
             'uid': self.uid,
             'name': self.name,
             'body': self.body,
+            'snippet': self.snippet,
+            'body_size': self.body_size,
+            'version': self.version,
             'owner_id': self.owner_id,
             'lock_session': self.lock_session,
             'document_status_id': self.document_status_id,
@@ -25,6 +66,26 @@ class Document(db.Model):
             'updated_date': self.updated_date,
         }
 
+class DocumentRevision(db.Model):
+    """A saved version of a document body.
+
+    Snapshots hold the whole body, other revisions hold the JSON encoded text
+    operations turning the body of the previous revision into this one, see
+    service.text_ops.
+    """
+    __tablename__ = 'document_revision'
+    __table_args__ = (db.UniqueConstraint('document_id', 'revision'),)
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False)
+    # the document version saved by this revision
+    revision = db.Column(db.Integer, nullable=False)
+    is_snapshot = db.Column(db.Boolean, nullable=False, default=False)
+    content = db.Column(CompressedText(), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    author = db.relationship('User')
+
 class DocumentStatus(db.Model):
     __tablename__ = 'document_status'
     id = db.Column(db.Integer, primary_key=True)
@@ -43,6 +104,8 @@ class DocumentComment(db.Model):
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    commenter = db.relationship('User')
+
     def to_dict(self) -> dict:
         return {
             'inlineId': self.inline_id,
@@ -72,3 +135,20 @@ class DocumentPermissionType(db.Model):
     name = db.Column(db.String(50), nullable=False)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DocumentImport(db.Model):
+    """A bulk import of documents from an archive, see service.import_service.
+
+    Records are committed in batches together with the number of records
+    consumed, so a failed import resumes after the last committed batch.
+    """
+    __tablename__ = 'document_import'
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    source = db.Column(db.String(255), nullable=False)
+    # records of the archive already imported, counted from the start
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='running')
+    error = db.Column(db.Text, nullable=True)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,14 @@
+from .base_model import db
+
+class SearchPosting(db.Model):
+    """One entry of the full-text inverted index: how often a term occurs in a document."""
+    __tablename__ = 'search_posting'
+    term = db.Column(db.String(64), primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), primary_key=True, index=True)
+    term_frequency = db.Column(db.Integer, nullable=False)
+
+class SearchDocument(db.Model):
+    """The number of indexed terms of a document, used by BM25 length normalization."""
+    __tablename__ = 'search_document'
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), primary_key=True)
+    length = db.Column(db.Integer, nullable=False)
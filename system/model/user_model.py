@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import NamedTuple
 
 from .base_model import db
 
@@ -6,7 +7,8 @@ class User(db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
-    name = db.Column(db.String(100), nullable=False)
+    # indexed, comments refer to their commenter by name
+    name = db.Column(db.String(100), nullable=False, index=True)
     mail = db.Column(db.String(100), unique=True, nullable=False)
     google_id = db.Column(db.String(100), unique=True, nullable=False)
     lock_session = db.Column(db.String(50), nullable=True)
@@ -14,3 +16,37 @@ class User(db.Model):
     third_party_info = db.Column(db.String(255), nullable=True)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserIdentity(NamedTuple):
+    """Lightweight, immutable copy of the User fields needed to identify the caller.
+
+    Unlike User it is not bound to a database session, so it can be cached across requests.
+    """
+    id: int
+    username: str
+    name: str
+    mail: str
+    google_id: str
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserIdentity':
+        return cls(
+            id=user.id,
+            username=user.username,
+            name=user.name,
+            mail=user.mail,
+            google_id=user.google_id
+        )
+
+
+class UserSearchToken(db.Model):
+    """One entry of the user autocomplete index: a lower cased word a user can be found by.
+
+    Tokens are matched by prefix, which the index on token answers with a range scan.
+    """
+    __tablename__ = 'user_search_token'
+    token = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
+    # what the token was taken from, lower ranks first, see repo/user_repo.py
+    kind = db.Column(db.Integer, nullable=False)
@@ -1,13 +1,48 @@
 import json
+from typing import Optional, Tuple
 
 import redis
 
 from model.NotificationModel import Notification
 
+# Lease scripts run atomically on the Redis server, so every lease operation
+# costs one round trip. A lease value is "<fencing token>:<holder>".
+ACQUIRE_LEASE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local token, holder = string.match(current, '^(%d+):(.*)$')
+    if holder == ARGV[1] then
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        return {1, tonumber(token), holder}
+    end
+    return {0, tonumber(token), holder}
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], token .. ':' .. ARGV[1], 'NX', 'PX', ARGV[2])
+return {1, token, ARGV[1]}
+"""
+
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 class RedisRepo:
     def __init__(self, host='localhost', port=6379, db=0):
         self.redis = redis.Redis(host=host, port=port, db=db)
+        self.acquire_lease_script = self.redis.register_script(ACQUIRE_LEASE_SCRIPT)
+        self.renew_lease_script = self.redis.register_script(RENEW_LEASE_SCRIPT)
+        self.release_lease_script = self.redis.register_script(RELEASE_LEASE_SCRIPT)
 
     def publish(self, notification: Notification):
         """Publish a notification to the appropriate Redis channel based on notification_type."""
@@ -19,4 +54,44 @@ class RedisRepo:
         """Subscribe to a specific notification type and consume messages."""
         pubsub = self.redis.pubsub()
         pubsub.subscribe(notification_type)
-        return pubsub
\ No newline at end of file
+        return pubsub
+
+    def acquire_lease(self, key: str, holder: str, ttl_ms: int) -> Tuple[bool, int, str]:
+        """Take the lease stored at key unless another holder owns it.
+
+        A new lease gets a fencing token from the counter at "<key>:token", which
+        only ever increases. Acquiring a lease already owned by holder extends it
+        and keeps its token.
+
+        Args:
+            key (str): The Redis key of the lease.
+            holder (str): The identity of the caller.
+            ttl_ms (int): The lease duration in milliseconds.
+
+        Returns:
+            Tuple[bool, int, str]: Whether the lease is owned by holder, and the
+                                   fencing token and holder of the current lease.
+        """
+        acquired, token, current_holder = self.acquire_lease_script(
+            keys=[key, f"{key}:token"],
+            args=[holder, ttl_ms]
+        )
+        if isinstance(current_holder, bytes):
+            current_holder = current_holder.decode('utf-8')
+        return bool(acquired), int(token), current_holder
+
+    def renew_lease(self, key: str, holder: str, token: int, ttl_ms: int) -> bool:
+        """Extend the lease if it is still owned by holder with the given fencing token."""
+        return bool(self.renew_lease_script(keys=[key], args=[f"{token}:{holder}", ttl_ms]))
+
+    def release_lease(self, key: str, holder: str, token: int) -> bool:
+        """Delete the lease if it is still owned by holder with the given fencing token."""
+        return bool(self.release_lease_script(keys=[key], args=[f"{token}:{holder}"]))
+
+    def get_lease(self, key: str) -> Optional[Tuple[int, str]]:
+        """Get the fencing token and holder of the current lease, None if nobody holds it."""
+        value = self.redis.get(key)
+        if value is None:
+            return None
+        token, holder = value.decode('utf-8').split(':', 1)
+        return int(token), holder
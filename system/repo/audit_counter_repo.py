@@ -0,0 +1,101 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from model.audit_model import Audit, AuditCounter
+from model.base_model import db
+from model.document_model import Document
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+AUDITOR = 'auditor'
+OWNER = 'owner'
+
+class AuditCounterRepository:
+    """
+    Repository class for the audit counts of users.
+
+    Every audit counts once for its auditor and once for the owner of its
+    document, in its current status. The write methods only add to the
+    current transaction, so counts are committed together with the audit
+    writes that change them.
+    """
+
+    def count_audit(self, document_id: int, auditor_id: int, audit_status_id: int, delta: int) -> None:
+        """
+        Add delta to the counts of an audit in a status, for its auditor and its document owner.
+
+        Args:
+            document_id (int): The document of the audit.
+            auditor_id (int): The auditor of the audit.
+            audit_status_id (int): The status the audit enters (delta 1) or leaves (delta -1).
+            delta (int): The change of the counts.
+        """
+        owner_id = db.session.query(Document.owner_id).filter(Document.id == document_id).scalar()
+        self.add_counts([(auditor_id, AUDITOR, audit_status_id, delta), (owner_id, OWNER, audit_status_id, delta)])
+
+    def add_counts(self, changes: Iterable[Tuple[Optional[int], str, int, int]]) -> None:
+        """Apply (user_id, role, audit_status_id, delta) changes, creating missing counters."""
+        changes = [change for change in changes if change[0] is not None and change[3]]
+        if not changes:
+            return
+        upsert = {
+            'mysql': mysql.insert,
+            'postgresql': postgresql.insert,
+            'sqlite': sqlite.insert
+        }[db.session.get_bind().dialect.name]
+        for user_id, role, audit_status_id, delta in changes:
+            statement = upsert(AuditCounter).values(
+                user_id=user_id,
+                role=role,
+                audit_status_id=audit_status_id,
+                count=delta
+            )
+            if upsert is mysql.insert:
+                statement = statement.on_duplicate_key_update(count=AuditCounter.count + delta)
+            else:
+                statement = statement.on_conflict_do_update(
+                    index_elements=[AuditCounter.user_id, AuditCounter.role, AuditCounter.audit_status_id],
+                    set_={"count": AuditCounter.count + delta}
+                )
+            db.session.execute(statement)
+
+    def get_counts(self, user_id: int) -> Dict[str, Dict[int, int]]:
+        """
+        Read the counts of a user, with one primary key range read.
+
+        Returns:
+            Dict[str, Dict[int, int]]: The count of each audit status, by role.
+                                       Statuses without audits may be missing.
+        """
+        counts = {AUDITOR: {}, OWNER: {}}
+        rows = db.session.execute(
+            select(AuditCounter.role, AuditCounter.audit_status_id, AuditCounter.count).
+            where(AuditCounter.user_id == user_id)
+        )
+        for role, audit_status_id, count in rows:
+            counts[role][audit_status_id] = count
+        return counts
+
+    def rebuild_counts(self) -> int:
+        """
+        Recount every audit, e.g. after the counters were created.
+
+        Returns:
+            int: The number of counters written.
+        """
+        by_auditor = db.session.query(Audit.auditor_id, Audit.audit_status_id, func.count()).\
+            group_by(Audit.auditor_id, Audit.audit_status_id).\
+            all()
+        by_owner = db.session.query(Document.owner_id, Audit.audit_status_id, func.count()).\
+            join(Document, Document.id == Audit.document_id).\
+            group_by(Document.owner_id, Audit.audit_status_id).\
+            all()
+        rows = [
+            {"user_id": user_id, "role": role, "audit_status_id": audit_status_id, "count": count}
+            for role, grouped in ((AUDITOR, by_auditor), (OWNER, by_owner))
+            for user_id, audit_status_id, count in grouped
+        ]
+        db.session.execute(delete(AuditCounter))
+        if rows:
+            db.session.execute(insert(AuditCounter), rows)
+        db.session.commit()
+        return len(rows)
@@ -1,44 +1,250 @@
-from typing import List
+from collections import Counter
+from typing import Any, List, Optional, Tuple
+from uuid import uuid4
 
 from model.audit_model import Audit, AuditStatus
 from model.base_model import db
+from model.document_model import Document
+from model.user_model import User
+from repo.audit_counter_repo import AUDITOR, OWNER, AuditCounterRepository
+from repo.document_repo import document_mode_cache
+from repo.lookup import lookup_registry
+from repo.pagination import keyset_page
+from sqlalchemy import insert, inspect
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import joinedload, load_only
+
+# the columns audits may be sorted by: never NULL, and small enough for a cursor
+AUDIT_SORT_COLUMNS = {
+    'id': Audit.id,
+    'created_date': Audit.created_date,
+    'updated_date': Audit.updated_date
+}
 
 class AuditRepository:
     """
     Repository class for accessing Audit data.
+
+    Writes to audits keep the audit counts of their auditor and document
+    owner up to date, in the same transaction.
     """
+    def __init__(self):
+        self.counter_repo = AuditCounterRepository()
 
-    def get_all_audits(self, user_id: int, sort: str = 'created_date') -> List[Audit]:
-        """Retrieve all audits with optional sorting."""
-        return Audit.query.\
+    def get_all_audits(
+        self,
+        user_id: int,
+        sort: str = 'created_date',
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, int]] = None,
+        audit_status_id: Optional[int] = None
+    ) -> List[Audit]:
+        """Retrieve audits assigned to the user, one keyset page at a time.
+
+        The document and the auditor of each audit are joined into the same
+        query, only with the columns the listing shows, so a page costs one
+        query whatever its size.
+
+        Args:
+            user_id (int): The ID of the auditor.
+            sort (str): The column name used to sort the audits.
+            limit (Optional[int]): The page size, None returns every audit.
+                                   One extra row is returned when a next page exists.
+            after (Optional[Tuple[Any, int]]): The (sort value, audit ID) of the last
+                                               audit of the previous page.
+            audit_status_id (Optional[int]): Only return audits in this status.
+
+        Raises:
+            ValueError: If sort is not one of AUDIT_SORT_COLUMNS.
+        """
+        sort_column = AUDIT_SORT_COLUMNS.get(sort)
+        if sort_column is None:
+            raise ValueError(f"Unsupported sorting key: {sort}")
+
+        query = Audit.query.\
             filter(Audit.auditor_id == user_id).\
-            order_by(sort).\
-            all()
+            options(
+                joinedload(Audit.document).load_only(Document.uid, Document.name),
+                joinedload(Audit.auditor).load_only(User.username)
+            )
+        if audit_status_id is not None:
+            query = query.filter(Audit.audit_status_id == audit_status_id)
+        return keyset_page(query, sort_column, Audit.id, limit, after).all()
 
     def create_audit(self, audit: Audit) -> Audit:
         """Create a new audit record."""
         db.session.add(audit)
+        self.counter_repo.count_audit(audit.document_id, audit.auditor_id, audit.audit_status_id, 1)
         db.session.commit()
+        document_mode_cache.pop(audit.document_id)
         return audit
 
     def update_audit(self, audit: Audit) -> Audit:
-        """Update an existing audit record."""
+        """Update an existing audit record, moving it between counts if its status or auditor changed."""
+        state = inspect(audit)
+        status_history = state.attrs.audit_status_id.history
+        auditor_history = state.attrs.auditor_id.history
+        if status_history.deleted or auditor_history.deleted:
+            previous_status_id = status_history.deleted[0] if status_history.deleted else audit.audit_status_id
+            previous_auditor_id = auditor_history.deleted[0] if auditor_history.deleted else audit.auditor_id
+            self.counter_repo.count_audit(audit.document_id, previous_auditor_id, previous_status_id, -1)
+            self.counter_repo.count_audit(audit.document_id, audit.auditor_id, audit.audit_status_id, 1)
         db.session.commit()
+        # the auditor may have changed
+        document_mode_cache.pop(audit.document_id)
+
+    def transition_audit(
+        self,
+        audit: Audit,
+        from_status_id: int,
+        to_status_id: int,
+        rejected_reason: Optional[str] = None
+    ) -> bool:
+        """Move an audit from one status to another, unless another write moved it first.
+
+        The status check and the write are one conditional UPDATE, and the
+        counts only move when it updated the audit, in the same transaction.
+        Of two concurrent transitions of the same audit only one succeeds.
+
+        Args:
+            audit (Audit): The audit to move.
+            from_status_id (int): The status the audit must still be in.
+            to_status_id (int): The new status.
+            rejected_reason (Optional[str]): The reason saved with the new status.
+
+        Returns:
+            bool: True if the audit was moved, False if it was not in from_status_id.
+        """
+        updated = Audit.query.\
+            filter_by(id=audit.id, audit_status_id=from_status_id).\
+            update({
+                Audit.audit_status_id: to_status_id,
+                Audit.rejected_reason: rejected_reason
+            }, synchronize_session=False)
+        if updated == 1:
+            self.counter_repo.count_audit(audit.document_id, audit.auditor_id, from_status_id, -1)
+            self.counter_repo.count_audit(audit.document_id, audit.auditor_id, to_status_id, 1)
+        db.session.commit()
+        return updated == 1
+
+    def assign_audits(self, assignments: List[Tuple[Row, int]], audit_status_id: int) -> List[str]:
+        """Assign many documents to auditors in one transaction.
+
+        The audits of the documents are read with one query. Documents without
+        an audit get a new one, the others are moved to their new auditor, all
+        in audit_status_id. The count changes are summed before they are
+        written, so the counters are updated once per user and status.
+
+        Args:
+            assignments (List[Tuple[Row, int]]): The (id, uid, name, owner_id) row of
+                                                 each document and the ID of its auditor.
+                                                 Documents must not repeat.
+            audit_status_id (int): The status of the assigned audits.
+
+        Returns:
+            List[str]: The audit UID of each assignment, in the same order.
+        """
+        document_ids = [document.id for document, _ in assignments]
+        existing = {}
+        for audit in Audit.query.filter(Audit.document_id.in_(document_ids)).order_by(Audit.id.desc()):
+            # sorted by descending ID, so the first audit of a document is written last
+            existing[audit.document_id] = audit
+
+        counts = Counter()
+        new_audits = []
+        audit_uids = []
+        for document, auditor_id in assignments:
+            audit = existing.get(document.id)
+            if audit is None:
+                new_audits.append({
+                    "uid": str(uuid4()),
+                    "document_id": document.id,
+                    "auditor_id": auditor_id,
+                    "audit_status_id": audit_status_id
+                })
+                audit_uids.append(new_audits[-1]["uid"])
+            else:
+                audit_uids.append(audit.uid)
+                if (audit.auditor_id, audit.audit_status_id) == (auditor_id, audit_status_id):
+                    continue
+                counts[(audit.auditor_id, AUDITOR, audit.audit_status_id)] -= 1
+                counts[(document.owner_id, OWNER, audit.audit_status_id)] -= 1
+                audit.auditor_id = auditor_id
+                audit.audit_status_id = audit_status_id
+            counts[(auditor_id, AUDITOR, audit_status_id)] += 1
+            counts[(document.owner_id, OWNER, audit_status_id)] += 1
+
+        if new_audits:
+            db.session.execute(insert(Audit), new_audits)
+        self.counter_repo.add_counts((*key, delta) for key, delta in counts.items())
+        db.session.commit()
+        for document_id in document_ids:
+            document_mode_cache.pop(document_id)
+        return audit_uids
 
     def create_audit_status(self, audit_status: AuditStatus) -> AuditStatus:
         """Create a new audit status record."""
         db.session.add(audit_status)
         db.session.commit()
+        lookup_registry.invalidate()
         return audit_status
 
     def update_audit_status(self, audit_status: AuditStatus) -> AuditStatus:
         """Update an existing audit status record."""
         db.session.commit()
+        lookup_registry.invalidate()
 
     def get_audit_by_document_id(self, document_id: int) -> Audit:
-        """Get audit record by document ID."""
-        return Audit.query.filter_by(document_id=document_id).first()
+        """Get the current audit record of a document by the document ID.
+
+        A document sent to audit again has several audits, the current one is
+        the latest, with the highest id, as in the document listing.
+        """
+        return Audit.query.\
+            filter_by(document_id=document_id).\
+            order_by(Audit.id.desc()).\
+            first()
+
+    def get_audit_by_document_uid(self, document_uid: str) -> Optional[Audit]:
+        """Get the current audit record of a document by the document UID, with one query."""
+        return Audit.query.\
+            join(Document, Document.id == Audit.document_id).\
+            filter(Document.uid == document_uid).\
+            order_by(Audit.id.desc()).\
+            first()
+
+    def get_audit_result_by_document_uid(self, document_uid: str) -> Optional[Row]:
+        """Look up the current audit of a document together with its auditor, with one query.
+
+        Returns:
+            Optional[Row]: A row of (Audit, auditor User), None if the document
+                           or its audit cannot be found.
+        """
+        return db.session.query(Audit, User).\
+            join(Document, Document.id == Audit.document_id).\
+            join(User, User.id == Audit.auditor_id).\
+            filter(Document.uid == document_uid).\
+            order_by(Audit.id.desc()).\
+            first()
+
+    def get_audit_result_version(self, document_uid: str) -> Optional[Row]:
+        """Look up what the audit result of a document depends on, without loading it.
+
+        Used to answer conditional requests: the audit row and its auditor row
+        change whenever the audit result does.
 
-    def get_audit_status_by_audit_status_id(self, audit_status_id: str) -> AuditStatus:
-        """Get audit status by audit_status_id."""
-        return AuditStatus.query.filter_by(id=audit_status_id).first()
+        Returns:
+            Optional[Row]: A row of (id, audit_status_id, updated_date, auditor_updated_date),
+                           None if the document or its audit cannot be found.
+        """
+        return db.session.query(
+                Audit.id,
+                Audit.audit_status_id,
+                Audit.updated_date,
+                User.updated_date.label('auditor_updated_date')
+            ).\
+            join(Document, Document.id == Audit.document_id).\
+            join(User, User.id == Audit.auditor_id).\
+            filter(Document.uid == document_uid).\
+            order_by(Audit.id.desc()).\
+            first()
@@ -1,24 +1,144 @@
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from flask import current_app
 from model.document_model import (
+    DOCUMENT_MODE_AUDIT,
+    DOCUMENT_PERMISSION_WRITE,
     Document,
     DocumentStatus,
     DocumentComment,
     DocumentPermission,
-    DocumentPermissionType
+    DocumentPermissionType,
+    DocumentRevision,
+    make_snippet
 )
 from model.user_model import User
 from model.audit_model import Audit
+from model.search_model import SearchDocument, SearchPosting
 from model.base_model import db
-from sqlalchemy import or_
+from model.compression import decompress_text, is_compressed
+from repo.audit_counter_repo import AUDITOR, OWNER, AuditCounterRepository
+from repo.cache import TTLCache
+from repo.lookup import lookup_registry
+from repo.pagination import keyset_page
+from sqlalchemy import LargeBinary, and_, func, insert, or_, select, type_coerce, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer, joinedload
+
+# document_id -> {user_id: mode}, see DocumentRepository.get_document_mode.
+# Every write to the permissions or audits of a document must pop its entry.
+document_mode_cache = TTLCache(maxsize=10000, ttl=60)
+
+# the columns documents may be sorted by: never NULL, and small enough for a cursor
+DOCUMENT_SORT_COLUMNS = {
+    'id': Document.id,
+    'name': Document.name,
+    'created_date': Document.created_date,
+    'updated_date': Document.updated_date
+}
 
 class DocumentRepository:
-    def get_all_documents(self, user: User, sort: str = 'date') -> List[Document]:
-        return Document.query.\
-            join(DocumentPermission, DocumentPermission.document_id == Document.id, isouter=True).\
-            filter(or_(DocumentPermission.user_id == user.id, Document.owner_id == user.id)).\
-            order_by(sort).\
-            all()
+    def get_all_documents(
+        self,
+        user_id: int,
+        sort: str = 'created_date',
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, int]] = None
+    ) -> List[Row]:
+        """
+        Retrieve every document the user owns or has a permission on, in one query.
+
+        Each row carries the document together with the caller's permission type
+        and the status of the latest audit of the document, so callers don't need
+        to issue a permission and an audit lookup per document. Document.body is
+        deferred, listings use the precomputed snippet and body_size instead.
+
+        Args:
+            user_id (int): The ID of the user listing documents.
+            sort (str): The column name used to sort the documents.
+            limit (Optional[int]): The page size, None returns every document.
+                                   One extra row is returned when a next page exists.
+            after (Optional[Tuple[Any, int]]): The (sort value, document ID) of the last
+                                               document of the previous page.
+
+        Raises:
+            ValueError: If sort is not one of DOCUMENT_SORT_COLUMNS.
+
+        Returns:
+            List[Row]: Rows of (Document, permission_type_id, audit_status_id).
+                       permission_type_id and audit_status_id are None when the
+                       user has no explicit permission or the document has never
+                       been sent to audit.
+        """
+        sort_column = DOCUMENT_SORT_COLUMNS.get(sort)
+        if sort_column is None:
+            raise ValueError(f"Unsupported sorting key: {sort}")
+
+        latest_audit_status = db.session.query(Audit.audit_status_id).\
+            filter(Audit.document_id == Document.id).\
+            order_by(Audit.id.desc()).\
+            limit(1).\
+            correlate(Document).\
+            scalar_subquery()
+
+        query = db.session.query(
+                Document,
+                DocumentPermission.document_permission_type_id.label('permission_type_id'),
+                latest_audit_status.label('audit_status_id')
+            ).\
+            join(
+                DocumentPermission,
+                and_(
+                    DocumentPermission.document_id == Document.id,
+                    DocumentPermission.user_id == user_id
+                ),
+                isouter=True
+            ).\
+            filter(or_(DocumentPermission.id.isnot(None), Document.owner_id == user_id)).\
+            options(defer(Document.body))
+        return keyset_page(query, sort_column, Document.id, limit, after).all()
+
+    def stream_documents(self, user_id: int, batch_size: int = 500) -> Iterator[Row]:
+        """
+        Read every document the user owns or has a permission on, with its body,
+        without holding more than one batch of rows in memory.
+
+        Rows are fetched batch_size at a time through a server-side cursor where
+        the driver supports one, and are plain column rows, so nothing is kept in
+        the session while the caller works through them.
+
+        Args:
+            user_id (int): The ID of the user exporting documents.
+            batch_size (int): The number of rows fetched at a time.
+
+        Returns:
+            Iterator[Row]: Rows of (uid, name, body, version, owner_id, created_date,
+                           updated_date, permission_type_id) ordered by document ID.
+                           permission_type_id is None when the user owns the
+                           document without an explicit permission.
+        """
+        statement = select(
+                Document.uid,
+                Document.name,
+                Document.body,
+                Document.version,
+                Document.owner_id,
+                Document.created_date,
+                Document.updated_date,
+                DocumentPermission.document_permission_type_id.label('permission_type_id')
+            ).\
+            join(
+                DocumentPermission,
+                and_(
+                    DocumentPermission.document_id == Document.id,
+                    DocumentPermission.user_id == user_id
+                ),
+                isouter=True
+            ).\
+            where(or_(DocumentPermission.id.isnot(None), Document.owner_id == user_id)).\
+            order_by(Document.id).\
+            execution_options(yield_per=batch_size)
+        yield from db.session.execute(statement)
 
     def create_document(self, document: Document) -> Document:
         db.session.add(document)
@@ -28,9 +148,109 @@ class DocumentRepository:
     def get_document_by_uid(self, uid: str) -> Document:
         return Document.query.filter_by(uid=uid).first()
 
-    def update_document(self, document: Document):
+    def get_documents_by_uids(self, uids: List[str]) -> Dict[str, Row]:
+        """
+        Look up many documents by UID with one query, UIDs not found are omitted.
+
+        Returns:
+            Dict[str, Row]: The (id, uid, name, owner_id) row of each document found.
+        """
+        if not uids:
+            return {}
+        rows = db.session.execute(
+            select(Document.id, Document.uid, Document.name, Document.owner_id).
+            where(Document.uid.in_(set(uids)))
+        )
+        return {row.uid: row for row in rows}
+
+    def update_document(self, document: Document, revision: Optional[DocumentRevision] = None):
+        if revision is not None:
+            db.session.add(revision)
         db.session.commit()
 
+    def update_document_body(
+        self,
+        document: Document,
+        base_version: int,
+        body: str,
+        revision: Optional[DocumentRevision] = None
+    ) -> bool:
+        """
+        Save a new body unless the document changed since base_version.
+
+        The version check and the write are one conditional UPDATE, so of two
+        saves against the same version only the first one succeeds.
+
+        Args:
+            document (Document): The document to be updated.
+            base_version (int): The version the new body was computed from.
+            body (str): The new body.
+            revision (Optional[DocumentRevision]): The revision recording the change,
+                                                   saved in the same transaction.
+
+        Returns:
+            bool: True if the body was saved, False if base_version is stale or
+                  its revision was already recorded. Nothing is saved then.
+        """
+        updated = Document.query.\
+            filter_by(id=document.id, version=base_version).\
+            update({
+                Document.body: body,
+                Document.snippet: make_snippet(body),
+                Document.body_size: len(body),
+                Document.version: Document.version + 1
+            }, synchronize_session=False)
+        if updated == 1 and revision is not None:
+            db.session.add(revision)
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            # a concurrent save recorded the same revision first
+            db.session.rollback()
+            current_app.logger.info(f"Reject save of document id: {document.id}, {e.orig}")
+            return False
+        return updated == 1
+
+    def get_document_version(self, uid: str) -> Optional[Row]:
+        """
+        Look up what GET /documents/<uid> depends on, without loading the document.
+
+        Used to answer conditional requests: the body version, the last change
+        of the document, of its comments and commenters, and of its audits are
+        read with one query.
+
+        Args:
+            uid (str): The unique identifier of the document.
+
+        Returns:
+            Optional[Row]: A row of (id, uid, owner_id, version, updated_date,
+                           comment_count, comment_updated_date, commenter_updated_date,
+                           audit_count, audit_updated_date), None if the document
+                           cannot be found.
+        """
+        comments = db.session.query(DocumentComment).\
+            filter(DocumentComment.document_id == Document.id)
+        commenters = comments.join(User, User.id == DocumentComment.commenter_id)
+        audits = db.session.query(Audit).filter(Audit.document_id == Document.id)
+
+        def aggregate(query, column):
+            return query.with_entities(column).correlate(Document).scalar_subquery()
+
+        return db.session.query(
+                Document.id,
+                Document.uid,
+                Document.owner_id,
+                Document.version,
+                Document.updated_date,
+                aggregate(comments, func.count(DocumentComment.id)).label('comment_count'),
+                aggregate(comments, func.max(DocumentComment.updated_date)).label('comment_updated_date'),
+                aggregate(commenters, func.max(User.updated_date)).label('commenter_updated_date'),
+                aggregate(audits, func.count(Audit.id)).label('audit_count'),
+                aggregate(audits, func.max(Audit.updated_date)).label('audit_updated_date')
+            ).\
+            filter(Document.uid == uid).\
+            first()
+
     def get_permissions(self, user_id: int, document_id: str) -> List[DocumentPermission]:
         return DocumentPermission.query.\
             filter_by(document_id=document_id).\
@@ -44,6 +264,7 @@ class DocumentRepository:
 
     def update_document_permission(self, document_permission: DocumentPermission) -> None:
         db.session.commit()
+        document_mode_cache.pop(document_permission.document_id)
 
     def add_document_permission(self, user: User, document: Document, document_permission_type_id: int) -> None:
         permission = DocumentPermission(
@@ -53,6 +274,7 @@ class DocumentRepository:
         )
         db.session.add(permission)
         db.session.commit()
+        document_mode_cache.pop(document.id)
 
     def create_document_status(self, document_status: DocumentStatus) -> DocumentStatus:
         """Add a new user to the database.
@@ -65,6 +287,7 @@ class DocumentRepository:
         """
         db.session.add(document_status)
         db.session.commit()
+        lookup_registry.invalidate()
         return document_status
 
     def update_document_comments(
@@ -75,56 +298,92 @@ class DocumentRepository:
         """
         Partially update comments for a specific document based on the provided updates.
 
-        This function fetches comments associated with a given document by their
-        unique identifier (document_id), and applies updates specified in the comments_updates list.
-        If cannot find inline_id means new comment, also write to database.
-        Each entry in the list should include the unique inline identifier for the comment and
-        the fields to be updated.
+        This function fetches the existing comments matching the inline_ids of
+        comments_updates with one query, then applies the changed comments with
+        one bulk UPDATE and the new ones with one bulk INSERT. Comments whose
+        text and commenter did not change are skipped, so an autosave with
+        unchanged comments only costs the lookup. If cannot find inline_id
+        means new comment, also write to database.
 
         Args:
             document_id (int): The unique identifier of the document whose comments are to be updated.
             comments_updates (list): A list of dictionaries containing updates for each comment.
-                                    Each dictionary must include the 'inlineId' of the comment
-                                    and the fields to be updated, such as 'text'.
+                                    Each dictionary must include the 'inline_id' of the comment,
+                                    its 'text' and its 'commentor_id'.
 
         Returns:
             bool: Returns True if all specified comments are successfully updated, False otherwise.
         """
         try:
-            for update in comments_updates:
-                comment = DocumentComment.query.filter_by(
-                    document_id=document_id,
-                    inline_id=update['inline_id']
-                ).first()
-
-                if comment:
-                    # Update existing comment
-                    comment.text = update['text']
-                    comment.comment_id = update['commentor_id']
+            # later entries for the same inline_id win
+            updates_by_inline_id = {}
+            # comments without inline_id never match an existing comment
+            created = []
+            for comment in comments_updates:
+                if comment['inline_id'] is None:
+                    created.append(comment)
                 else:
-                    # Create new comment
-                    new_comment = DocumentComment(
-                        document_id=document_id,
-                        inline_id=update['inline_id'],
-                        text=update['text'],
-                        commenter_id=update['commentor_id']
+                    updates_by_inline_id[comment['inline_id']] = comment
+
+            existing_by_inline_id = {}
+            if updates_by_inline_id:
+                existing_by_inline_id = {
+                    row.inline_id: row
+                    for row in db.session.execute(
+                        select(
+                            DocumentComment.id,
+                            DocumentComment.inline_id,
+                            DocumentComment.text,
+                            DocumentComment.commenter_id
+                        ).
+                        where(
+                            DocumentComment.document_id == document_id,
+                            DocumentComment.inline_id.in_(updates_by_inline_id)
+                        )
                     )
-                    db.session.add(new_comment)
+                }
 
-            db.session.commit()
+            changed = []
+            for inline_id, comment in updates_by_inline_id.items():
+                row = existing_by_inline_id.get(inline_id)
+                if row is None:
+                    created.append(comment)
+                elif (row.text, row.commenter_id) != (comment['text'], comment['commentor_id']):
+                    changed.append({"id": row.id, "text": comment['text'], "commenter_id": comment['commentor_id']})
+
+            if changed:
+                db.session.execute(update(DocumentComment), changed)
+            if created:
+                # render_nulls keeps rows without inline_id in the same batch
+                db.session.execute(insert(DocumentComment).execution_options(render_nulls=True), [
+                    {
+                        "document_id": document_id,
+                        "inline_id": comment['inline_id'],
+                        "text": comment['text'],
+                        "commenter_id": comment['commentor_id']
+                    }
+                    for comment in created
+                ])
+            if changed or created:
+                db.session.commit()
+            current_app.logger.info(
+                f"Comments of document_id: {document_id}, updated: {len(changed)}, created: {len(created)}, "
+                f"unchanged: {len(existing_by_inline_id) - len(changed)}"
+            )
             return True
         except Exception as e:
+            db.session.rollback()
             current_app.logger.error(f"Error when updated comment for document_id: {document_id}")
             current_app.logger.error(e)
             return False
 
-
     def get_document_comment_by_document_id(self, document_id: str) -> list[DocumentComment]:
         """
         Retrieve all comments associated with a specific document.
 
         This method queries the database for all comments linked to a given document ID.
         It returns a list of DocumentComment model instances. If no comments are found, an empty list is returned.
+        The commenter of each comment is loaded by the same query.
 
         Args:
             document_id (int): The unique identifier of the document for which comments are being retrieved.
@@ -132,7 +391,10 @@ class DocumentRepository:
         Returns:
             List[DocumentComment]: A list of DocumentComment model instances that are associated with the document.
         """
-        return DocumentComment.query.filter_by(document_id=document_id).all()
+        return DocumentComment.query.\
+            filter_by(document_id=document_id).\
+            options(joinedload(DocumentComment.commenter).load_only(User.name)).\
+            all()
 
     def delete_document(self, document: Document) -> bool:
         """Delete a document given found document of database
@@ -143,11 +405,24 @@ class DocumentRepository:
         Returns:
             None
         """
+        # the audits of the document no longer count for their auditor and the owner
+        audits = db.session.query(Audit.auditor_id, Audit.audit_status_id).\
+            filter(Audit.document_id == document.id).\
+            all()
+        AuditCounterRepository().add_counts(
+            change
+            for auditor_id, audit_status_id in audits
+            for change in ((auditor_id, AUDITOR, audit_status_id, -1), (document.owner_id, OWNER, audit_status_id, -1))
+        )
         Audit.query.filter_by(document_id=document.id).delete()
         DocumentPermission.query.filter_by(document_id=document.id).delete()
+        DocumentRevision.query.filter_by(document_id=document.id).delete()
+        SearchPosting.query.filter_by(document_id=document.id).delete()
+        SearchDocument.query.filter_by(document_id=document.id).delete()
 
         db.session.delete(document)
         db.session.commit()
+        document_mode_cache.pop(document.id)
 
     def create_document_permission_type_not_exist(self, document_permission_type: DocumentPermissionType):
         """Create document permission type to database if not exist
@@ -158,6 +433,7 @@ class DocumentRepository:
         if existing_type is None:
             db.session.add(document_permission_type)
             db.session.commit()
+            lookup_registry.invalidate()
             return document_permission_type
         else:
             return existing_type
@@ -167,25 +443,166 @@ class DocumentRepository:
         """
         db.session.add(document_permission)
         db.session.commit()
+        document_mode_cache.pop(document_permission.document_id)
         return document_permission
 
-    def is_document_permission_type_exist(self, type_id):
-        document_permission_type = DocumentPermissionType.query.filter_by(id=type_id).first()
-        if document_permission_type:
-            return True
-        else:
-            return False
+    def get_document_mode(self, user: User, document: Document) -> Optional[int]:
+        """
+        Resolve how a user may open a document.
+
+        Modes are cached per document for a short time. Writes to permissions and
+        audits of the document invalidate its entry, see document_mode_cache.
+
+        Args:
+            user (User): The user opening the document.
+            document (Document): The document being opened.
 
-    def get_document_mode(self, user: User, document: Document):
+        Returns:
+            Optional[int]: 2 for the owner, 3 for the auditor, otherwise the
+                           document permission type of the user, or None
+                           when the user has no access.
+        """
         if document.owner_id == user.id:
-            return 2
-        audit = Audit.query.filter_by(document_id=document.id).first()
-        if audit and audit.auditor_id == user.id:
-            return 3
-        document_permission = DocumentPermission.query.\
-            filter_by(user_id=user.id, document_id=document.id)\
-            .first()
-        if document_permission:
-            return document_permission.document_permission_type_id
+            return DOCUMENT_PERMISSION_WRITE
+        modes = document_mode_cache.get(document.id, {})
+        if user.id in modes:
+            return modes[user.id]
+
+        # the same predicate as get_document_modes, both fill document_mode_cache
+        is_auditor = db.session.query(
+            Audit.query.filter_by(document_id=document.id, auditor_id=user.id).exists()
+        ).scalar()
+        if is_auditor:
+            mode = DOCUMENT_MODE_AUDIT
         else:
-            return None
+            document_permission = DocumentPermission.query.\
+                filter_by(user_id=user.id, document_id=document.id)\
+                .first()
+            mode = document_permission.document_permission_type_id if document_permission else None
+        # copy on write, so readers never see a dict being changed
+        document_mode_cache.set(document.id, {**modes, user.id: mode})
+        return mode
+
+    def get_document_modes(self, user: User, documents: List[Document]) -> Dict[int, Optional[int]]:
+        """
+        Resolve how a user may open each of the given documents.
+
+        Same as get_document_mode, but documents missing from the cache are
+        resolved together with one audit and one permission query.
+
+        Args:
+            user (User): The user opening the documents.
+            documents (List[Document]): The documents being opened.
+
+        Returns:
+            Dict[int, Optional[int]]: The mode of each document, keyed by document ID.
+        """
+        modes = {}
+        missing = []
+        for document in documents:
+            if document.owner_id == user.id:
+                modes[document.id] = DOCUMENT_PERMISSION_WRITE
+                continue
+            cached_modes = document_mode_cache.get(document.id, {})
+            if user.id in cached_modes:
+                modes[document.id] = cached_modes[user.id]
+            else:
+                missing.append(document.id)
+
+        if missing:
+            audited_ids = {
+                document_id for document_id, in db.session.query(Audit.document_id).\
+                    filter(Audit.document_id.in_(missing), Audit.auditor_id == user.id)
+            }
+            permission_types = dict(
+                db.session.query(DocumentPermission.document_id, DocumentPermission.document_permission_type_id).\
+                    filter(DocumentPermission.document_id.in_(missing), DocumentPermission.user_id == user.id).\
+                    all()
+            )
+            for document_id in missing:
+                mode = DOCUMENT_MODE_AUDIT if document_id in audited_ids else permission_types.get(document_id)
+                modes[document_id] = mode
+                document_mode_cache.set(
+                    document_id,
+                    {**document_mode_cache.get(document_id, {}), user.id: mode}
+                )
+        return modes
+
+    def backfill_document_summaries(self, batch_size: int = 500) -> int:
+        """Compute snippet and body_size of documents stored before they existed.
+
+        Documents are processed in batches of batch_size, committing after each
+        batch, so the backfill can be interrupted and run again.
+
+        Args:
+            batch_size (int): The number of documents updated per transaction.
+
+        Returns:
+            int: The number of documents updated.
+        """
+        updated = 0
+        while True:
+            rows = db.session.execute(
+                select(Document.id, Document.body).
+                where(Document.snippet.is_(None)).
+                order_by(Document.id).
+                limit(batch_size)
+            ).all()
+            if not rows:
+                return updated
+            for document_id, body in rows:
+                db.session.execute(
+                    update(Document).
+                    where(Document.id == document_id).
+                    # derived columns, not an edit of the document
+                    values(
+                        snippet=make_snippet(body),
+                        body_size=len(body) if body else 0,
+                        updated_date=Document.updated_date
+                    ).
+                    execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+            updated += len(rows)
+
+    def compress_document_bodies(self, batch_size: int = 500) -> int:
+        """Rewrite bodies stored as plain text so they are stored compressed.
+
+        The raw stored bytes are read, so bodies already compressed or too short
+        to be compressed are left untouched. Documents are walked by id in
+        batches of batch_size, committing after each batch.
+
+        Args:
+            batch_size (int): The number of documents read per transaction.
+
+        Returns:
+            int: The number of documents rewritten.
+        """
+        body_type = Document.__table__.c.body.type
+        raw_body = type_coerce(Document.body, LargeBinary)
+        rewritten = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(Document.id, raw_body).
+                where(Document.id > last_id, Document.body.isnot(None)).
+                order_by(Document.id).
+                limit(batch_size)
+            ).all()
+            if not rows:
+                return rewritten
+            for document_id, data in rows:
+                data = bytes(data)
+                body = decompress_text(data)
+                if is_compressed(data) or len(data) < body_type.min_size:
+                    continue
+                db.session.execute(
+                    update(Document).
+                    where(Document.id == document_id).
+                    # a change of the storage format, not an edit of the document
+                    values(body=body, updated_date=Document.updated_date).
+                    execution_options(synchronize_session=False)
+                )
+                rewritten += 1
+            db.session.commit()
+            last_id = rows[-1][0]
@@ -1,3 +1,4 @@
+import logging
 import time
 import os
 import smtplib
@@ -5,9 +6,11 @@ from abc import ABC, abstractmethod
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
-from flask import current_app
 from model.NotificationModel import Notification
 
+# sending runs in the email notification system, outside of the Flask app
+logger = logging.getLogger(__name__)
+
 class NotificationStrategy(ABC):
     """Using strategy pattern to support multiple notificiation service.
     """
@@ -51,6 +54,8 @@ class EmailRepo(NotificationStrategy):
 
             # Close the connection
             server.quit()
-            current_app.logger.info("Email sent successfully.")
+            logger.info("Email sent successfully.")
         except Exception as e:
-            current_app.logger.info(f"Failed to send email. Error: {e}")
+            logger.error(f"Failed to send email. Error: {e}")
+            # let the consumer leave the message in the queue
+            raise
@@ -0,0 +1,57 @@
+from typing import Dict, List, Optional
+
+from model.base_model import db
+from model.document_model import Document, DocumentComment, DocumentImport, DocumentPermission
+from sqlalchemy import insert, select
+
+class ImportRepository:
+    """
+    Repository class for bulk imports of documents.
+
+    The insert methods only add to the current transaction, save_progress
+    commits a whole batch together with the progress of its import.
+    """
+
+    def create_import(self, document_import: DocumentImport) -> DocumentImport:
+        db.session.add(document_import)
+        db.session.commit()
+        return document_import
+
+    def get_import(self, import_id: int) -> Optional[DocumentImport]:
+        return db.session.get(DocumentImport, import_id)
+
+    def insert_documents(self, documents: List[Dict]) -> Dict[str, int]:
+        """
+        Insert documents with one multi-row INSERT.
+
+        Args:
+            documents (List[Dict]): The column values of each document, with a unique 'uid'.
+
+        Returns:
+            Dict[str, int]: The ID of each inserted document by uid.
+        """
+        if not documents:
+            return {}
+        db.session.execute(insert(Document), documents)
+        uids = [document['uid'] for document in documents]
+        return dict(db.session.execute(select(Document.uid, Document.id).where(Document.uid.in_(uids))).all())
+
+    def insert_permissions(self, permissions: List[Dict]) -> None:
+        if permissions:
+            db.session.execute(insert(DocumentPermission), permissions)
+
+    def insert_comments(self, comments: List[Dict]) -> None:
+        if comments:
+            # render_nulls keeps comments without inline_id in the same batch
+            db.session.execute(insert(DocumentComment).execution_options(render_nulls=True), comments)
+
+    def save_progress(self, document_import: DocumentImport, imported: int, status: str = 'running', error: Optional[str] = None) -> None:
+        """Record how far an import got and commit the batch imported with it."""
+        document_import.imported = imported
+        document_import.status = status
+        document_import.error = error
+        db.session.commit()
+
+    def rollback(self) -> None:
+        """Drop the inserts of a failed batch."""
+        db.session.rollback()
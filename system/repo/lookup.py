@@ -0,0 +1,69 @@
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from model.audit_model import AuditStatus
+from model.base_model import db
+from model.document_model import DocumentPermissionType, DocumentStatus
+
+
+class LookupTables(NamedTuple):
+    """Read-only copies of the lookup tables, ID -> name."""
+    audit_statuses: Mapping[int, str]
+    document_statuses: Mapping[int, str]
+    document_permission_types: Mapping[int, str]
+
+
+class LookupRegistry:
+    """In-memory copies of the small tables statuses and permission types are checked against.
+
+    The tables are read once, on startup or first use, into immutable maps that
+    every request of the process shares. Writes to these tables through the
+    repositories call invalidate, so the next lookup reads them again. Another
+    API replica may have changed them too, so the copies are also read again
+    after max_age seconds.
+    """
+    def __init__(self, max_age: float = 300):
+        self.max_age = max_age
+        self._tables: Optional[LookupTables] = None
+        self._loaded_at = 0.0
+
+    def load(self) -> LookupTables:
+        """Read the lookup tables, replacing the previous copies as a whole."""
+        def read(model) -> Mapping[int, str]:
+            return MappingProxyType(dict(db.session.query(model.id, model.name).all()))
+
+        tables = LookupTables(
+            audit_statuses=read(AuditStatus),
+            document_statuses=read(DocumentStatus),
+            document_permission_types=read(DocumentPermissionType)
+        )
+        self._tables = tables
+        self._loaded_at = time.monotonic()
+        return tables
+
+    def invalidate(self) -> None:
+        """Drop the copies after a lookup table changed."""
+        self._tables = None
+
+    @property
+    def tables(self) -> LookupTables:
+        tables = self._tables
+        if tables is None or time.monotonic() - self._loaded_at > self.max_age:
+            tables = self.load()
+        return tables
+
+    @property
+    def audit_statuses(self) -> Mapping[int, str]:
+        return self.tables.audit_statuses
+
+    @property
+    def document_statuses(self) -> Mapping[int, str]:
+        return self.tables.document_statuses
+
+    @property
+    def document_permission_types(self) -> Mapping[int, str]:
+        return self.tables.document_permission_types
+
+
+lookup_registry = LookupRegistry()
@@ -0,0 +1,99 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import Column, and_, or_
+from sqlalchemy.orm import Query
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """Encode the sort value and ID of the last row of a page into an opaque cursor.
+
+    Args:
+        sort_value (Any): The value of the sort column of the last row.
+        row_id (int): The primary key of the last row.
+
+    Returns:
+        str: A URL-safe cursor string.
+    """
+    if isinstance(sort_value, datetime):
+        payload = {"v": sort_value.isoformat(), "t": "datetime", "id": row_id}
+    else:
+        payload = {"v": sort_value, "id": row_id}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Decode a cursor created by encode_cursor.
+
+    Args:
+        cursor (str): The cursor returned to the client with the previous page.
+
+    Returns:
+        Tuple[Any, int]: The sort value and the ID of the last row of the previous page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        sort_value = payload["v"]
+        if payload.get("t") == "datetime":
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(payload["id"])
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def keyset_page(
+    query: Query,
+    sort_column: Column,
+    id_column: Column,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[Any, int]] = None
+) -> Query:
+    """Restrict a query to one page ordered by (sort_column, id_column).
+
+    The page starts right after the (sort value, ID) pair of the previous page,
+    so every page is an index range scan instead of an OFFSET scan. One extra
+    row is fetched to tell whether a next page exists, see split_page.
+
+    Args:
+        query (Query): The query to be paginated.
+        sort_column (Column): The column the rows are sorted by.
+        id_column (Column): The primary key column, used as tie breaker.
+        limit (Optional[int]): The page size, None returns every row.
+        after (Optional[Tuple[Any, int]]): The decoded cursor of the previous page.
+
+    Returns:
+        Query: The paginated query.
+
+    Raises:
+        ValueError: If the cursor holds no sort value. Pages are only keyed on
+                    columns that are never NULL, see the SORT_COLUMNS of the repositories.
+    """
+    if after is not None:
+        sort_value, row_id = after
+        if sort_value is None:
+            raise ValueError("Invalid cursor: no sort value")
+        query = query.filter(or_(
+            sort_column > sort_value,
+            and_(sort_column == sort_value, id_column > row_id)
+        ))
+    query = query.order_by(sort_column, id_column)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+
+def split_page(rows: List[Any], limit: Optional[int]) -> Tuple[List[Any], bool]:
+    """Drop the extra row fetched by keyset_page.
+
+    Returns:
+        Tuple[List[Any], bool]: The rows of the page and whether a next page exists.
+    """
+    if limit is not None and len(rows) > limit:
+        return rows[:limit], True
+    return rows, False
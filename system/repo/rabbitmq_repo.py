@@ -1,21 +1,77 @@
 import json
-import threading
-import logging
 import os
-from typing import Dict, Union
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
 
 import pika
 from flask import current_app
+from pika.adapters.blocking_connection import BlockingChannel
+
+# the channel or its connection is gone, a new connection may succeed
+RECONNECT_ERRORS = (
+    pika.exceptions.AMQPConnectionError,
+    pika.exceptions.ChannelClosed,
+    pika.exceptions.ChannelWrongStateError
+)
+
+
+class PooledChannel:
+    """A confirm mode channel with the connection it is the only user of."""
+    def __init__(self, connection: pika.BlockingConnection):
+        self.connection = connection
+        self.channel = connection.channel()
+        self.channel.confirm_delivery()
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            # closing a broken connection, nothing left to release
+            pass
+
 
 class RabbitMQPubliser():
+    """Long-lived publisher keeping a pool of open channels.
+
+    Opening a connection costs a TCP and an AMQP handshake, so channels are
+    opened on first use and then reused by every publish of the process. A
+    BlockingConnection must only be used by one thread at a time, so each
+    pooled channel has its own connection and is checked out by one thread
+    at a time, at most pool_size at once. A channel whose connection broke
+    is dropped, and the publish is retried once on a new connection.
+
+    Every channel is in confirm mode: a publish returns once the broker
+    accepted and stored the message. Queues are declared once per process.
+    """
     def __init__(
         self,
+        host: Optional[str] = None,
+        port: int = 5672,
+        pool_size: int = 4,
+        checkout_timeout: float = 5,
+        connection_factory: Optional[Callable[[], pika.BlockingConnection]] = None
     ):
         """
         Initializes the RabbitMQPublisher with the host and port.
+
+        Args:
+            host (Optional[str]): The broker host, RABBITMQ_HOST when None.
+            port (int): The broker port.
+            pool_size (int): The most channels, and connections, open at once.
+            checkout_timeout (float): The seconds to wait for a free channel.
+            connection_factory (Optional[Callable]): Opens a connection, create_connection by default.
         """
-        self.host = os.getenv("RABBITMQ_HOST")
-        self.port = 5672
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.connection_factory = connection_factory or self.create_connection
+        self._idle: "queue.LifoQueue[PooledChannel]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._declared_queues = set()
 
     def create_connection(self) -> pika.BlockingConnection:
         """Creates a connection to the RabbitMQ server.
@@ -26,16 +82,67 @@ class RabbitMQPubliser():
         try:
             return pika.BlockingConnection(
                 pika.ConnectionParameters(
-                    host = self.host, 
-                    port = self.port, 
+                    # read on first use, the environment is loaded by create_app
+                    host = self.host or os.getenv("RABBITMQ_HOST"),
+                    port = self.port,
                 )
             )
         except Exception as e:
             current_app.logger.error(f"Failed to create connection: {e}")
             raise
 
+    @contextmanager
+    def channel(self) -> Iterator[BlockingChannel]:
+        """Check out a channel of the pool, opening one if none is idle.
+
+        Raises:
+            TimeoutError: If all pool_size channels stay in use for checkout_timeout seconds.
+        """
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError(f"No RabbitMQ channel free after {self.checkout_timeout} seconds")
+        try:
+            pooled = self.checkout()
+            try:
+                yield pooled.channel
+            except RECONNECT_ERRORS:
+                self.discard(pooled)
+                raise
+            except BaseException:
+                # e.g. an unroutable message, the channel itself is fine
+                self._idle.put(pooled)
+                raise
+            self._idle.put(pooled)
+        finally:
+            self._slots.release()
+
+    def checkout(self) -> PooledChannel:
+        """Take an idle channel that is still open, or open a new one."""
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return PooledChannel(self.connection_factory())
+            try:
+                # answers the heartbeats missed while idle and notices a closed connection
+                pooled.connection.process_data_events(time_limit=0)
+                if pooled.channel.is_open:
+                    return pooled
+            except RECONNECT_ERRORS:
+                pass
+            self.discard(pooled)
+
+    def discard(self, pooled: PooledChannel):
+        pooled.close()
+        # the broker may have restarted without the queues
+        self._declared_queues.clear()
+
+    def declare_queue(self, channel: BlockingChannel, queue_name: str):
+        if queue_name not in self._declared_queues:
+            channel.queue_declare(queue=queue_name, durable=True)
+            self._declared_queues.add(queue_name)
+
     def create_queue(
-        self, 
+        self,
         queue_name: str
     ):
         """Creates a queue on the RabbitMQ server.
@@ -44,37 +151,84 @@ class RabbitMQPubliser():
             queue_name: The name of the queue to be created.
         """
         try:
-            with self.create_connection() as connection:
-                channel = connection.channel()
-                channel.queue_declare(queue=queue_name)
+            with self.channel() as channel:
+                self.declare_queue(channel, queue_name)
         except Exception as e:
             current_app.logger.error(f"Failed to create queue '{queue_name}': {e}")
             raise
 
     def send_message_to_queue(
-        self, 
-        queue_name: str, 
+        self,
+        queue_name: str,
         message: Union[Dict, str]
     ):
         """Sends a message to a specified queue on the RabbitMQ server.
 
+        The queue is durable and the message persistent, and the channel is in
+        confirm mode, so when this returns the broker has accepted the message
+        and written it to disk. It then survives a broker restart until the
+        consumer acknowledges it.
+
         Args:
             queue_name: The name of the queue to send the message to.
             message: The message to be sent.
+
+        Raises:
+            pika.exceptions.UnroutableError: If the queue does not exist.
+            pika.exceptions.NackError: If the broker could not take the message.
         """
-        try:
-            with self.create_connection() as connection:
-                channel = connection.channel()
-                channel.queue_declare(queue=queue_name)
-                # Serialize the message to JSON if it's a dict
-                message_json = json.dumps(message) if isinstance(message, dict) else message
-                channel.basic_publish(exchange='', routing_key=queue_name, body=message_json)
-        except Exception as e:
-            current_app.logger.error(f"Failed to send message to queue '{queue_name}': {e}")
-            raise
+        self.send_messages_to_queue(queue_name, [message])
+
+    def send_messages_to_queue(
+        self,
+        queue_name: str,
+        messages: Iterable[Union[Dict, str]]
+    ) -> int:
+        """Sends messages to a queue over one checked out channel.
+
+        Each message is confirmed by the broker before the next is sent. When
+        the connection breaks, the messages not confirmed yet are sent again
+        on a new connection, so a message whose confirm was lost may be
+        delivered twice.
+
+        Args:
+            queue_name: The name of the queue to send the messages to.
+            messages: The messages to be sent.
+
+        Returns:
+            int: The number of messages sent.
+        """
+        # Serialize the messages to JSON if they are dicts
+        bodies: List[str] = [json.dumps(message) if isinstance(message, dict) else message for message in messages]
+        sent = 0
+        for attempt in range(2):
+            try:
+                with self.channel() as channel:
+                    self.declare_queue(channel, queue_name)
+                    for body in bodies[sent:]:
+                        channel.basic_publish(
+                            exchange='',
+                            routing_key=queue_name,
+                            body=body,
+                            properties=pika.BasicProperties(
+                                content_type='application/json',
+                                delivery_mode=pika.DeliveryMode.Persistent
+                            ),
+                            mandatory=True
+                        )
+                        sent += 1
+                return sent
+            except RECONNECT_ERRORS as e:
+                if attempt:
+                    current_app.logger.error(f"Failed to send message to queue '{queue_name}': {e}")
+                    raise
+                current_app.logger.warning(f"Reconnect to send message to queue '{queue_name}': {e}")
+            except Exception as e:
+                current_app.logger.error(f"Failed to send message to queue '{queue_name}': {e}")
+                raise
 
     def delete_queue(
-        self, 
+        self,
         queue_name: str
     ):
         """Deletes a queue from the RabbitMQ server.
@@ -83,10 +237,21 @@ class RabbitMQPubliser():
             queue_name (str): The name of the queue to be deleted.
         """
         try:
-            with self.create_connection() as connection:
-                channel = connection.channel()
-                channel.queue_declare(queue=queue_name)
+            with self.channel() as channel:
                 channel.queue_delete(queue=queue_name)
+                self._declared_queues.discard(queue_name)
         except Exception as e:
             current_app.logger.error(f"Failed to delete queue '{queue_name}': {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def close(self):
+        """Close the idle channels and their connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# shared by every service of the process, so channels are reused across requests
+rabbitmq_publisher = RabbitMQPubliser()
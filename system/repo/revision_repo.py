@@ -0,0 +1,74 @@
+from typing import Any, List, Optional, Tuple
+
+from model.base_model import db
+from model.document_model import DocumentRevision
+from repo.pagination import keyset_page
+from sqlalchemy import func
+from sqlalchemy.orm import defer, joinedload
+
+class RevisionRepository:
+    """
+    Repository class for accessing the revision history of documents.
+    """
+
+    def get_latest_revision(self, document_id: int) -> Optional[DocumentRevision]:
+        """Get the newest revision of a document, without its content."""
+        return DocumentRevision.query.\
+            filter_by(document_id=document_id).\
+            options(defer(DocumentRevision.content)).\
+            order_by(DocumentRevision.revision.desc()).\
+            first()
+
+    def get_last_snapshot_revision(self, document_id: int, revision: int) -> Optional[int]:
+        """Get the number of the newest snapshot at or before revision."""
+        return db.session.query(func.max(DocumentRevision.revision)).\
+            filter(
+                DocumentRevision.document_id == document_id,
+                DocumentRevision.is_snapshot.is_(True),
+                DocumentRevision.revision <= revision
+            ).\
+            scalar()
+
+    def get_revisions(
+        self,
+        document_id: int,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, int]] = None
+    ) -> List[DocumentRevision]:
+        """
+        List the revisions of a document, oldest first, with their authors.
+
+        Args:
+            document_id (int): The ID of the document.
+            limit (Optional[int]): The page size, None returns every revision.
+                                   One extra row is returned when a next page exists.
+            after (Optional[Tuple[Any, int]]): The (revision, ID) of the last
+                                               revision of the previous page.
+
+        Returns:
+            List[DocumentRevision]: The revisions, content is not loaded.
+        """
+        query = DocumentRevision.query.\
+            filter_by(document_id=document_id).\
+            options(defer(DocumentRevision.content), joinedload(DocumentRevision.author))
+        return keyset_page(query, DocumentRevision.revision, DocumentRevision.id, limit, after).all()
+
+    def get_revision_chain(self, document_id: int, revision: int) -> List[DocumentRevision]:
+        """
+        Get what rebuilding a revision needs: the newest snapshot at or before it
+        and every delta between that snapshot and the revision, oldest first.
+
+        Returns:
+            List[DocumentRevision]: The chain starting with a snapshot, empty if
+                                    the revision cannot be rebuilt.
+        """
+        snapshot = self.get_last_snapshot_revision(document_id, revision)
+        if snapshot is None:
+            return []
+        return DocumentRevision.query.\
+            filter(
+                DocumentRevision.document_id == document_id,
+                DocumentRevision.revision.between(snapshot, revision)
+            ).\
+            order_by(DocumentRevision.revision).\
+            all()
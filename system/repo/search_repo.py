@@ -0,0 +1,165 @@
+from typing import Dict, List, Tuple
+
+from flask import current_app
+from model.base_model import db
+from model.document_model import Document, DocumentPermission
+from model.search_model import SearchDocument, SearchPosting
+from sqlalchemy import Float, and_, case, cast, delete, exists, func, insert, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import defer
+
+class SearchRepository:
+    """
+    Repository class for the full-text inverted index of documents.
+    """
+
+    def replace_document_terms(self, document_id: int, term_counts: Dict[str, int]) -> bool:
+        """
+        Replace the indexed terms of a document, writing only the postings that changed.
+
+        Args:
+            document_id (int): The ID of the document.
+            term_counts (Dict[str, int]): How often each term occurs in the document.
+
+        Returns:
+            bool: True if the index was updated, False otherwise. A document missing
+                  from the index is indexed again by the next save or by reindexing.
+        """
+        try:
+            existing = dict(db.session.execute(
+                select(SearchPosting.term, SearchPosting.term_frequency).
+                where(SearchPosting.document_id == document_id)
+            ).all())
+
+            removed = [term for term in existing if term not in term_counts]
+            changed = [
+                {"term": term, "document_id": document_id, "term_frequency": count}
+                for term, count in term_counts.items()
+                if term in existing and existing[term] != count
+            ]
+            added = [
+                {"term": term, "document_id": document_id, "term_frequency": count}
+                for term, count in term_counts.items()
+                if term not in existing
+            ]
+            if removed:
+                db.session.execute(
+                    delete(SearchPosting).
+                    where(SearchPosting.document_id == document_id, SearchPosting.term.in_(removed))
+                )
+            if changed:
+                db.session.execute(update(SearchPosting), changed)
+            if added:
+                db.session.execute(insert(SearchPosting), added)
+
+            length = sum(term_counts.values())
+            search_document = db.session.get(SearchDocument, document_id)
+            if search_document is None:
+                db.session.add(SearchDocument(document_id=document_id, length=length))
+            else:
+                search_document.length = length
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error when indexing document_id: {document_id}")
+            current_app.logger.error(e)
+            return False
+
+    def add_documents_terms(self, term_counts_by_document: Dict[int, Dict[str, int]]) -> None:
+        """
+        Insert the postings of documents not indexed yet, without committing.
+
+        Args:
+            term_counts_by_document (Dict[int, Dict[str, int]]): How often each term
+                                                                 occurs, by document ID.
+        """
+        postings = [
+            {"term": term, "document_id": document_id, "term_frequency": count}
+            for document_id, term_counts in term_counts_by_document.items()
+            for term, count in term_counts.items()
+        ]
+        if postings:
+            db.session.execute(insert(SearchPosting), postings)
+        if term_counts_by_document:
+            db.session.execute(insert(SearchDocument), [
+                {"document_id": document_id, "length": sum(term_counts.values())}
+                for document_id, term_counts in term_counts_by_document.items()
+            ])
+
+    def get_index_stats(self) -> Tuple[int, float]:
+        """Get the number of indexed documents and their average length in terms."""
+        count, average_length = db.session.query(
+            func.count(SearchDocument.document_id),
+            func.avg(SearchDocument.length)
+        ).one()
+        return count, float(average_length or 0)
+
+    def get_document_frequencies(self, terms: List[str]) -> Dict[str, int]:
+        """Count the documents containing each term, terms found nowhere are omitted."""
+        return dict(db.session.execute(
+            select(SearchPosting.term, func.count()).
+            where(SearchPosting.term.in_(terms)).
+            group_by(SearchPosting.term)
+        ).all())
+
+    def search(
+        self,
+        user_id: int,
+        term_weights: Dict[str, float],
+        average_length: float,
+        limit: int,
+        k1: float = 1.2,
+        b: float = 0.75
+    ) -> List[Row]:
+        """
+        Rank the documents the user owns or has a permission on with BM25.
+
+        Only the postings of the query terms are read, scores are summed by the
+        database and only the top documents are loaded, without their body.
+
+        Args:
+            user_id (int): The ID of the user searching.
+            term_weights (Dict[str, float]): The inverse document frequency of each query term.
+            average_length (float): The average length of the indexed documents.
+            limit (int): The number of documents returned.
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 length normalization.
+
+        Returns:
+            List[Row]: Rows of (Document, score), best match first.
+        """
+        term_frequency = cast(SearchPosting.term_frequency, Float)
+        idf = case(term_weights, value=SearchPosting.term, else_=0.0)
+        norm = k1 * (1 - b + b * cast(SearchDocument.length, Float) / max(average_length, 1.0))
+        score = func.sum(idf * term_frequency * (k1 + 1) / (term_frequency + norm)).label('score')
+
+        readable = or_(
+            Document.owner_id == user_id,
+            exists().where(and_(
+                DocumentPermission.document_id == Document.id,
+                DocumentPermission.user_id == user_id
+            ))
+        )
+        scores = select(SearchPosting.document_id, score).\
+            join(SearchDocument, SearchDocument.document_id == SearchPosting.document_id).\
+            join(Document, Document.id == SearchPosting.document_id).\
+            where(SearchPosting.term.in_(list(term_weights)), readable).\
+            group_by(SearchPosting.document_id).\
+            order_by(score.desc(), SearchPosting.document_id).\
+            limit(limit).\
+            subquery()
+
+        return db.session.query(Document, scores.c.score).\
+            join(scores, scores.c.document_id == Document.id).\
+            options(defer(Document.body)).\
+            order_by(scores.c.score.desc(), Document.id).\
+            all()
+
+    def get_documents_after(self, document_id: int, batch_size: int) -> List[Document]:
+        """Get the next batch of documents by ID, used to rebuild the index."""
+        return Document.query.\
+            filter(Document.id > document_id).\
+            order_by(Document.id).\
+            limit(batch_size).\
+            all()
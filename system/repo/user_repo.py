@@ -1,7 +1,47 @@
-from typing import Optional, Dict, List
-from model.user_model import User
+import unicodedata
+from typing import Optional, Dict, List, Set
+from model.user_model import User, UserSearchToken
 from model.base_model import db
 from model.document_model import Document
+from sqlalchemy import case, delete, func, insert, select
+
+# kinds of autocomplete tokens, a match on a lower kind ranks first
+USERNAME_TOKEN = 1
+NAME_TOKEN = 2
+MAIL_TOKEN = 3
+MAX_TOKEN_LENGTH = 100
+
+
+def normalize_token(text: str) -> str:
+    """Lower case text and drop its accents, so "José" is found by "jose"."""
+    text = unicodedata.normalize('NFKD', text.strip().lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))[:MAX_TOKEN_LENGTH]
+
+
+def user_search_tokens(user: User) -> Dict[str, int]:
+    """
+    Build the autocomplete tokens of a user: the username, the full name and
+    each of its words, the mail and its local part.
+
+    Returns:
+        Dict[str, int]: The kind of each token, the lowest when a token is
+                        taken from several fields.
+    """
+    tokens = {}
+
+    def add(text: Optional[str], kind: int):
+        token = normalize_token(text or '')
+        if token and kind < tokens.get(token, MAIL_TOKEN + 1):
+            tokens[token] = kind
+
+    add(user.username, USERNAME_TOKEN)
+    add(user.name, NAME_TOKEN)
+    for word in (user.name or '').split():
+        add(word, NAME_TOKEN)
+    add(user.mail, MAIL_TOKEN)
+    add((user.mail or '').split('@')[0], MAIL_TOKEN)
+    return tokens
+
 
 class UserRepository:
     def find_user_by_username(self, username: str) -> Optional[User]:
@@ -33,12 +73,14 @@ class UserRepository:
             User: The newly added user instance.
         """
         db.session.add(user)
+        db.session.flush()
+        self.replace_user_tokens(user)
         db.session.commit()
         return user
 
     def update_user_settings(self, user: User) -> None:
         """
-        Commit changes of the user object to the database.
+        Commit changes of the user object to the database, with its autocomplete tokens.
 
         Args:
             user (User): The user instance with updated fields that needs to be committed.
@@ -46,8 +88,38 @@ class UserRepository:
         Returns:
             None
         """
+        self.replace_user_tokens(user)
         db.session.commit()
 
+    def replace_user_tokens(self, user: User) -> None:
+        """
+        Rewrite the autocomplete tokens of a user, committed by the caller.
+
+        Args:
+            user (User): The user whose username, name or mail changed, with an ID.
+        """
+        db.session.execute(delete(UserSearchToken).where(UserSearchToken.user_id == user.id))
+        rows = [
+            {"token": token, "user_id": user.id, "kind": kind}
+            for token, kind in user_search_tokens(user).items()
+        ]
+        if rows:
+            db.session.execute(insert(UserSearchToken), rows)
+
+    def index_users(self, users: List[User]) -> None:
+        """Rewrite the autocomplete tokens of a batch of users in one transaction."""
+        for user in users:
+            self.replace_user_tokens(user)
+        db.session.commit()
+
+    def get_users_after(self, user_id: int, batch_size: int) -> List[User]:
+        """Get the next batch of users by ID, used to rebuild the autocomplete index."""
+        return User.query.\
+            filter(User.id > user_id).\
+            order_by(User.id).\
+            limit(batch_size).\
+            all()
+
     def find_user_by_name(self, name: str) -> User:
         """
         Find a user by their full name from the database.
@@ -60,6 +132,50 @@ class UserRepository:
         """
         return User.query.filter_by(name=name).first()
 
+    def find_user_ids_by_names(self, names: List[str]) -> Dict[str, int]:
+        """
+        Resolve full names to user IDs with one query.
+
+        Args:
+            names (List[str]): The full names of the users to search for.
+
+        Returns:
+            Dict[str, int]: The user ID of each name found. When several users
+                            share a name, the one with the lowest ID is returned.
+        """
+        if not names:
+            return {}
+        rows = db.session.query(User.name, User.id).\
+            filter(User.name.in_(set(names))).\
+            order_by(User.id.desc()).\
+            all()
+        # rows are sorted by descending ID, so the lowest ID is written last
+        return {name: user_id for name, user_id in rows}
+
+    def find_user_ids_by_usernames(self, usernames: List[str]) -> Dict[str, int]:
+        """
+        Resolve usernames to user IDs with one query, usernames not found are omitted.
+        """
+        if not usernames:
+            return {}
+        return dict(db.session.query(User.username, User.id).filter(User.username.in_(set(usernames))).all())
+
+    def find_existing_user_ids(self, user_ids: List[int]) -> Set[int]:
+        """
+        Check many user IDs with one query, returning those of existing users.
+        """
+        if not user_ids:
+            return set()
+        return set(db.session.scalars(select(User.id).where(User.id.in_(set(user_ids)))))
+
+    def find_users_by_usernames(self, usernames: List[str]) -> Dict[str, User]:
+        """
+        Find the users of many usernames with one query, usernames not found are omitted.
+        """
+        if not usernames:
+            return {}
+        return {user.username: user for user in User.query.filter(User.username.in_(set(usernames)))}
+
     def find_user_by_id(self, user_id: str) -> User:
         """
         Find a user by their full name from the database.
@@ -72,20 +188,47 @@ class UserRepository:
         """
         return User.query.filter_by(id=user_id).first()
 
-    def find_users_by_search_text(self, search_text: str, document: Document, user: User) -> List[User]:
+    def find_users_by_search_text(
+        self,
+        search_text: str,
+        document: Optional[Document],
+        user: User,
+        limit: int = 10
+    ) -> List[User]:
         """
-        Find users by substring of their username from the database.
+        Find users whose username, name, a word of their name, mail or mail
+        local part starts with the search text, ignoring case and accents.
+
+        The prefix is looked up in the autocomplete index instead of scanning the
+        user table. Exact matches rank first, then matches on the username, the
+        name and the mail, then users by username.
 
         Args:
-            search_text (str): The search text for searching users' names and emails.
+            search_text (str): The beginning of the username, name or mail searched for.
+            document (Optional[Document]): The document being shared, its owner is left out.
+            user (User): The user searching, left out of the results.
+            limit (int): The maximum number of users returned.
 
         Returns:
-            List[User]: A list of User objects with the given name. Returns an empty list if no users are found.
+            List[User]: The matching users, best match first. Returns an empty list if no users are found.
         """
+        prefix = normalize_token(search_text)
+        if not prefix:
+            return []
+        excluded = [user.id] if document is None else [user.id, document.owner_id]
+        exact = func.min(case((UserSearchToken.token == prefix, 0), else_=1)).label('exact')
+        kind = func.min(UserSearchToken.kind).label('kind')
+        matches = select(UserSearchToken.user_id, exact, kind).\
+            where(
+                UserSearchToken.token.startswith(prefix, autoescape=True),
+                UserSearchToken.user_id.notin_(excluded)
+            ).\
+            group_by(UserSearchToken.user_id).\
+            subquery()
         return User.query.\
-            filter(User.username.contains(search_text)).\
-            filter(User.id != document.owner_id).\
-            filter(User.id != user.id).\
+            join(matches, matches.c.user_id == User.id).\
+            order_by(matches.c.exact, matches.c.kind, User.username).\
+            limit(limit).\
             all()
 
     def find_user_by_google_id(self, google_id: str) -> Optional[User]:
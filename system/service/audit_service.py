@@ -1,29 +1,75 @@
 from flask import current_app
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from uuid import uuid4
 
-from model.audit_model import Audit, AuditStatus
+from model.audit_model import (
+    AUDIT_STATUS_APPROVED,
+    AUDIT_STATUS_NOT_SENT,
+    AUDIT_STATUS_PENDING,
+    AUDIT_STATUS_REJECTED,
+    Audit,
+    AuditStatus
+)
 from repo.document_repo import DocumentRepository
+from repo.audit_counter_repo import AUDITOR, OWNER, AuditCounterRepository
 from repo.audit_repo import AuditRepository
+from repo.cache import TTLCache
+from repo.lookup import lookup_registry
+from repo.pagination import decode_cursor, encode_cursor, split_page
 from repo.user_repo import UserRepository
-from repo.email_repo import EmailRepo
+from service.notification_service import NotificationService
+
+# document_uid -> audit result, see AuditService.get_audit_result. Every write to
+# the audit of a document must pop its entry, other workers may serve a stale
+# result for at most ttl seconds.
+audit_result_cache = TTLCache(maxsize=10000, ttl=10)
+
+# keys of the audit counts returned by get_audit_counts
+AUDIT_COUNT_KEYS = {
+    AUDIT_STATUS_PENDING: "pending",
+    AUDIT_STATUS_APPROVED: "approved",
+    AUDIT_STATUS_REJECTED: "rejected",
+    AUDIT_STATUS_NOT_SENT: "notSent"
+}
 
 class AuditService:
     def __init__(self):
         self.document_repo = DocumentRepository()
         self.audit_repo = AuditRepository()
+        self.counter_repo = AuditCounterRepository()
         self.user_repo = UserRepository()
+        self.notification_service = NotificationService()
+
+    def get_all_audits(
+        self,
+        user_id: int,
+        sort: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        audit_status_id: Optional[int] = None
+    ) -> Dict:
+        """Retrieve a page of audits assigned to the user with optional sorting.
 
-    def get_all_audits(self, user_id: int, sort: str) -> List[Dict]:
-        """Retrieve all audits with optional sorting.
+        The documents and auditors shown are loaded by the listing query, so
+        the number of statements issued does not grow with the page size.
 
         Args:
+            user_id (int): The ID of the auditor.
             sort (str): The field by which to sort the audits.
+            limit (Optional[int]): The page size, None returns every audit.
+            cursor (Optional[str]): The nextCursor returned with the previous page.
+            audit_status_id (Optional[int]): Only list audits in this status.
 
         Returns:
-            List[Dict]: A list of dictionaries containing audit details.
+            Dict: A dictionary with the audit details of the page and the cursor
+                  of the next page, which is None on the last page.
+
+        Raises:
+            ValueError: If the sorting key or the cursor is invalid.
         """
-        audits = self.audit_repo.get_all_audits(user_id, sort)
+        after = decode_cursor(cursor) if cursor else None
+        audits = self.audit_repo.get_all_audits(user_id, sort, limit, after, audit_status_id)
+        audits, has_next = split_page(audits, limit)
         audits_list = [
             {
                 "auditUid": audit.uid,
@@ -37,13 +83,42 @@ class AuditService:
             for audit in audits
         ]
         current_app.logger.info(f"Get {len(audits_list)} audits record")
-        return audits_list
+        last_audit = audits[-1] if audits else None
+        return {
+            "documents": audits_list,
+            "nextCursor": encode_cursor(getattr(last_audit, sort), last_audit.id) if has_next else None
+        }
+
+    def get_audit_counts(self, user_id: int) -> Dict:
+        """Count the audits of a user by status, as auditor and as owner of the audited documents.
+
+        The counts are maintained by every audit write, so reading them costs
+        the same however many audits there are.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            Dict: {"auditor": {...}, "owner": {...}}, each with the number of
+                  "pending", "approved", "rejected" and "notSent" audits.
+        """
+        counts = self.counter_repo.get_counts(user_id)
+        return {
+            role: {key: counts[role].get(audit_status_id, 0) for audit_status_id, key in AUDIT_COUNT_KEYS.items()}
+            for role in (AUDITOR, OWNER)
+        }
+
+    def rebuild_audit_counts(self) -> int:
+        """Recount every audit, returning the number of counters written."""
+        return self.counter_repo.rebuild_counts()
 
     def create_audit(self, document_uid: str, auditor_username: str) -> Optional[Dict]:
         """Create a new audit record for a document.
 
         This method first checks if the provided auditor username exists.
         If the user exists, it creates a new audit record with an initial status.
+        The auditor is notified through the email queue, the email itself is
+        sent by the email notification system.
 
         Args:
             document_uid (str): The unique identifier of the document to be audited.
@@ -54,7 +129,7 @@ class AuditService:
         """
         auditor = self.user_repo.find_user_by_username(auditor_username)
         document = self.document_repo.get_document_by_uid(document_uid)
-        audit_status_id = 3  # Pending
+        audit_status_id = AUDIT_STATUS_PENDING
         if auditor and document:
             audit = self.audit_repo.get_audit_by_document_id(document.id)
             if not audit:
@@ -67,27 +142,111 @@ class AuditService:
                 new_audit = self.audit_repo.create_audit(audit)
                 current_app.logger.info(f"New audits record {new_audit}")
             else:
-                audit.auditor_id = auditor.id,
+                audit.auditor_id = auditor.id
                 audit.audit_status_id = audit_status_id
                 self.audit_repo.update_audit(audit)
                 current_app.logger.info(f"Update audits record {audit}")
+            audit_result_cache.pop(document_uid)
             if auditor.notification_flag:
-                recipient = auditor.mail
-                title = "You Have a New Audit Task!"
-                content = "You have been assigned a new audit task. Please log in to the system to complete the audit."
-                email_repo = EmailRepo()
-                email_repo.send(recipient, title, content)
+                self.notify_auditors({auditor.mail: [document.name]})
             return {"auditUid": audit.uid}
         return None
 
+    def create_audits(self, assignments: List[Dict]) -> List[Dict]:
+        """Assign many documents to auditors at once.
+
+        The documents, the auditors and the current audits are each read with
+        one query, and every audit is created or reassigned in one transaction,
+        either all of them or none. Auditors are notified after the commit,
+        with one message per auditor listing all of their new documents,
+        published to the email queue instead of sent from the request.
+
+        Args:
+            assignments (List[Dict]): The {"documentUid": ..., "auditorUsername": ...}
+                                      pairs to assign.
+
+        Returns:
+            List[Dict]: The {"documentUid": ..., "auditUid": ...} of each assignment, in the same order.
+
+        Raises:
+            ValueError: If a document or an auditor cannot be found, or a document is
+                        assigned more than once. Nothing is assigned then.
+        """
+        document_uids = [assignment['documentUid'] for assignment in assignments]
+        documents = self.document_repo.get_documents_by_uids(document_uids)
+        auditors = self.user_repo.find_users_by_usernames([assignment['auditorUsername'] for assignment in assignments])
+
+        errors = []
+        seen = set()
+        for assignment in assignments:
+            document_uid = assignment['documentUid']
+            if document_uid not in documents:
+                errors.append(f"Can't find document by UID: {document_uid}")
+            elif document_uid in seen:
+                errors.append(f"Document {document_uid} is assigned more than once")
+            seen.add(document_uid)
+            if assignment['auditorUsername'] not in auditors:
+                errors.append(f"Can't find user by username: {assignment['auditorUsername']}")
+        if errors:
+            raise ValueError("; ".join(dict.fromkeys(errors)))
+
+        pairs = [
+            (documents[assignment['documentUid']], auditors[assignment['auditorUsername']])
+            for assignment in assignments
+        ]
+        # grouped before the commit expires the auditors
+        documents_by_recipient = {}
+        for document, auditor in pairs:
+            if auditor.notification_flag:
+                documents_by_recipient.setdefault(auditor.mail, []).append(document.name)
+        audit_uids = self.audit_repo.assign_audits(
+            [(document, auditor.id) for document, auditor in pairs],
+            AUDIT_STATUS_PENDING
+        )
+        for document_uid in document_uids:
+            audit_result_cache.pop(document_uid)
+        current_app.logger.info(f"Assigned {len(audit_uids)} audits")
+
+        self.notify_auditors(documents_by_recipient)
+
+        return [
+            {"documentUid": document_uid, "auditUid": audit_uid}
+            for document_uid, audit_uid in zip(document_uids, audit_uids)
+        ]
+
+    def notify_auditors(self, documents_by_recipient: Dict[str, List[str]]) -> None:
+        """Publish one email per auditor telling them about their new audit tasks.
+
+        The audits are already committed, so a failure to publish is logged
+        instead of failing the assignment.
+
+        Args:
+            documents_by_recipient (Dict[str, List[str]]): The names of the newly
+                                                           assigned documents, by auditor mail.
+        """
+        messages = []
+        for recipient, document_names in documents_by_recipient.items():
+            title = "You Have a New Audit Task!" if len(document_names) == 1 \
+                else f"You Have {len(document_names)} New Audit Tasks!"
+            content = "You have been assigned new audit tasks for these documents:\n" + \
+                "".join(f"- {name}\n" for name in document_names) + \
+                "Please log in to the system to complete the audits."
+            messages.append({"title": title, "content": content, "recipient": recipient})
+        if not messages:
+            return
+        try:
+            self.notification_service.publish_many_to_queue(third_party = "email", messages = messages)
+        except Exception as e:
+            current_app.logger.error(f"Failed to notify {len(messages)} auditors of their audits")
+            current_app.logger.error(e)
+
     def get_audit_result(self, document_uid: str) -> Optional[Dict]:
         """
         Retrieve the audit result for a given document by its unique identifier (UID).
 
-        This method fetches the audit record associated with the provided document UID. It then retrieves the
-        status of the audit and constructs a dictionary containing details of the audit, such as the audit's UID,
-        document UID, status, auditor's details, and timing of the audit. Depending on the status of the audit,
-        additional fields like 'rejectedReason' might be included.
+        The audit and its auditor are fetched with one joined query,
+        and the result is cached for a few seconds. Writes to the audit through
+        this service or DocumentService drop the cached result.
 
         Args:
             document_uid (str): The unique identifier for the document whose audit result is to be retrieved.
@@ -101,75 +260,59 @@ class AuditService:
                                 - 2: rejected
                                 - 3: pending).
                 - auditor: Information about the auditor.
-                - auditedTime: The timestamp when the audit status was last updated.
+                - auditedTime: The timestamp when the audit was approved or rejected.
                 - rejectedReason: The reason for rejection.
         """
-        document = self.document_repo.get_document_by_uid(document_uid)
-        if document:
-            document_id = document.id
-            current_app.logger.info(f"Find document id: {document_id} for document UID: {document_uid}")
-            audit = self.audit_repo.get_audit_by_document_id(document_id)
-            if audit:
-                audit_status = self.audit_repo.get_audit_status_by_audit_status_id(audit.audit_status_id)
-                if audit_status:
-                    audit_status_id = audit_status.audit_status_id
-                    current_app.logger.info(f"audit_result is {audit_status_id}")
-                    # possible values 1 means approved
-                    if audit_status_id == 1:
-                        auditor = self.user_repo.find_user_by_id(audit.auditor_id)
-                        audit_result = {
-                            'auditUid': audit.uid,
-                            'documentUid': document_uid,
-                            'auditStatus': audit_status.audit_status_id,
-                            'auditor': {
-                                "userId": auditor.id,
-                                "username": auditor.username,
-                                "name": auditor.name
-                            },
-                            'auditedTime': audit_status.updated_date.isoformat() + 'Z'
-                        }
-                    # 2 means rejected
-                    elif audit_status_id == 2:
-                        auditor = self.user_repo.find_user_by_id(audit.auditor_id)
-                        audit_result = {
-                            'auditUid': audit.uid,
-                            'documentUid': document_uid,
-                            'auditStatus': audit_status.audit_status_id,
-                            'rejectedReason': audit.rejected_reason,
-                            'auditor': {
-                                "userId": auditor.id,
-                                "username": auditor.username,
-                                "name": auditor.name
-                            },
-                            'auditedTime': audit_status.updated_date.isoformat() + 'Z'
-                        }
-                    # 3 means pending
-                    elif audit_status_id == 3:
-                        auditor = self.user_repo.find_user_by_id(audit.auditor_id)
-                        audit_result = {
-                            'auditUid': audit.uid,
-                            'documentUid': document_uid,
-                            'auditStatus': audit_status.audit_status_id,
-                            'auditor': {
-                                "userId": auditor.id,
-                                "username": auditor.username,
-                                "name": auditor.name
-                            },
-                        }
-                    else:
-                        audit_result = None
-                        current_app.logger.info(f"Error! audit_result is not match 1, 2, 3.")
-                    return audit_result
-                else:
-                    current_app.logger.info(f"Error! Cannot get audit_status by audit_status_id")
-                    return None
-            else:
-                current_app.logger.info(f"Error! Cannot get audit by document_id")
-                return None
-        else:
-            current_app.logger.info(f"Error! Cannot get document by document_uid")
+        audit_result = audit_result_cache.get(document_uid)
+        if audit_result is not None:
+            return audit_result
+
+        row = self.audit_repo.get_audit_result_by_document_uid(document_uid)
+        if row is None:
+            current_app.logger.info(f"Error! Cannot get audit by document_uid {document_uid}")
             return None
+        audit, auditor = row
+        audit_status_id = audit.audit_status_id
+        if audit_status_id not in lookup_registry.audit_statuses:
+            current_app.logger.info(f"Error! Cannot get audit_status by audit_status_id {audit_status_id}")
+            return None
+        current_app.logger.info(f"audit_result is {audit_status_id}")
+        # possible values: "approved(1)", "rejected(2)", "pending(3)"
+        if audit_status_id not in (AUDIT_STATUS_APPROVED, AUDIT_STATUS_REJECTED, AUDIT_STATUS_PENDING):
+            current_app.logger.info(f"Error! audit_result is not match 1, 2, 3.")
+            return None
+        audit_result = {
+            'auditUid': audit.uid,
+            'documentUid': document_uid,
+            'auditStatus': audit_status_id,
+            'auditor': {
+                "userId": auditor.id,
+                "username": auditor.username,
+                "name": auditor.name
+            }
+        }
+        if audit_status_id == AUDIT_STATUS_REJECTED:
+            audit_result['rejectedReason'] = audit.rejected_reason
+        if audit_status_id in (AUDIT_STATUS_APPROVED, AUDIT_STATUS_REJECTED):
+            audit_result['auditedTime'] = audit.updated_date.isoformat() + 'Z'
+        audit_result_cache.set(document_uid, audit_result)
+        return audit_result
+
+    def get_audit_result_version(self, document_uid: str) -> Optional[Tuple]:
+        """
+        Collect what get_audit_result depends on, without building it.
+
+        Args:
+            document_uid (str): The unique identifier of the document.
 
+        Returns:
+            Optional[Tuple]: Values that change whenever the result of get_audit_result
+                             changes, None if the document or its audit cannot be found.
+        """
+        version = self.audit_repo.get_audit_result_version(document_uid)
+        if version is None:
+            return None
+        return tuple(version)
 
     def submit_audit_result(
         self,
@@ -199,29 +342,22 @@ class AuditService:
                 Returns None if no audit record is found for the given document UID or the specific
                 audit status does not exist.
         """
-        # search document by UID
-        document = self.document_repo.get_document_by_uid(document_uid)
-        if document:
-            document_id = document.id
-            audit = self.audit_repo.get_audit_by_document_id(document_id)
-
-            if audit:
-                # possible values: "approved(1)", "rejected(2)", "pending(3)"
-                # if document still pending, update to new audit status
-                if audit.audit_status_id == 3:
-                    # update reject reason for document in audit table
-                    audit.audit_status_id = audit_status
-                    audit.rejected_reason = rejected_reason
-                    self.audit_repo.update_audit(audit)
-                    current_app.logger.info(f"Update reject reason: {rejected_reason} for document UID {document_uid}")
-                    return True
-                else:
-                    current_app.logger.info(f"audit_status_id is {audit.id}, {document_uid} had been auditted.")
-                    return False
+        if audit_status not in lookup_registry.audit_statuses:
+            current_app.logger.info(f"Audit status: {audit_status} not exist")
+            return None
+        audit = self.audit_repo.get_audit_by_document_uid(document_uid)
+        if audit:
+            # possible values: "approved(1)", "rejected(2)", "pending(3)"
+            # if document still pending, update to new audit status, checked by the
+            # update itself so that of two concurrent submits only one is applied
+            if self.audit_repo.transition_audit(audit, AUDIT_STATUS_PENDING, audit_status, rejected_reason):
+                audit_result_cache.pop(document_uid)
+                current_app.logger.info(f"Update reject reason: {rejected_reason} for document UID {document_uid}")
+                return True
             else:
-                # cannot find document by UID
-                current_app.logger.info(f"Cannot get audit by document_uid {document_uid}")
-                return None
+                current_app.logger.info(f"Audit {audit.id} of document UID {document_uid} had been auditted.")
+                return False
         else:
-            current_app.logger.info(f"Error! Cannot get document by document_uid")
+            # cannot find the document or its audit by UID
+            current_app.logger.info(f"Cannot get audit by document_uid {document_uid}")
             return None
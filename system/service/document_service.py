@@ -1,12 +1,29 @@
-from typing import List, Dict, Optional
+import json
+import zlib
+from typing import Iterator, List, Dict, Optional, Tuple
 from uuid import uuid4
 from flask import current_app, session
-from model.document_model import Document, DocumentPermissionType
+from model.audit_model import AUDIT_STATUS_NOT_SENT
+from model.document_model import DOCUMENT_PERMISSION_WRITE, Document, DocumentPermissionType
+from model.user_model import UserIdentity
 from repo.document_repo import DocumentRepository
 from repo.user_repo import UserRepository
 from repo.audit_repo import AuditRepository
+from repo.lookup import lookup_registry
+from repo.pagination import decode_cursor, encode_cursor, split_page
 from service.notification_service import NotificationService
-from datetime import datetime, timedelta
+from service.lease_service import EditLeaseService
+from service.audit_service import audit_result_cache
+from service.revision_service import RevisionService
+from service.search_service import SearchService
+from service.user_service import UserService
+from service.text_ops import apply_ops, ops_from_utf16
+from redis.exceptions import RedisError
+
+# exported lines are sent in chunks of about this many bytes
+EXPORT_CHUNK_SIZE = 64 * 1024
+# saves of a PUT before it answers 409, each losing the race to a concurrent save
+PUT_SAVE_ATTEMPTS = 3
 
 class DocumentService:
     def __init__(self):
@@ -14,131 +31,333 @@ class DocumentService:
         self.user_repo = UserRepository()
         self.audit_repo = AuditRepository()
         self.notification_service = NotificationService()
+        self.lease_service = EditLeaseService()
+        self.revision_service = RevisionService()
+        self.user_service = UserService()
+        self.search_service = SearchService()
 
-    def get_all_documents(self, user_id: int, sort: str) -> Optional[List[Dict]]:
+    def get_all_documents(
+        self,
+        user_id: int,
+        sort: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Dict:
         """
-        Retrieve a list of all documents sorted by a specified attribute.
+        Retrieve a page of documents sorted by a specified attribute.
 
-        This method queries the document repository to obtain all documents sorted
+        This method queries the document repository to obtain documents sorted
         according to the provided sorting key. Each document's details are then
         formatted into a dictionary, which includes the document's unique identifier,
-        name, and status.
+        name, status, and a short snippet of the body. The full body is only
+        returned by get_document.
+
+        The caller's permission type and the latest audit status are fetched by
+        the same listing query, so the number of statements issued does not grow
+        with the number of documents. Pages are keyed on (sort column, id), so
+        fetching any page costs the same as fetching the first one.
 
         Args:
+            user_id (int): The ID of the user listing documents.
             sort (str): The attribute name by which the documents should be sorted.
                         This should be a valid attribute of the Document model.
+            limit (Optional[int]): The page size, None returns every document.
+            cursor (Optional[str]): The nextCursor returned with the previous page.
 
         Returns:
-            Optional[List[Dict]]: A list of dictionaries, where each dictionary
-                                contains details of a document. If an exception
-                                occurs (e.g., an unsupported sorting key), None
-                                is returned.
+            Dict: A dictionary with the documents of the page and the cursor of
+                  the next page, which is None on the last page.
 
         Raises:
-            None explicitly, but logs an informational message if an exception
-            occurs, indicating the unsupported sorting key used.
+            ValueError: If the sorting key or the cursor is invalid.
         """
-        def get_document_status(doc, user):
-            if doc.owner_id == user.id:
-                return 2
-            else:
-                return self.document_repo.get_permission_by_document_and_user(doc.id, user.id).document_permission_type_id
-
-        def get_document_audit_status(doc):
-            audit = self.audit_repo.get_audit_by_document_id(doc.id)
-            return audit.audit_status_id if audit else 4
-
+        after = decode_cursor(cursor) if cursor else None
         try:
-            user = self.user_repo.find_user_by_id(user_id)
-            docs = self.document_repo.get_all_documents(user, sort)
-            docs_list = [
-                {
-                    "uid": doc.uid,
-                    "name": doc.name,
-                    "status": get_document_status(doc, user),
-                    "auditStatus": get_document_audit_status(doc),
-                    "body": doc.body,
-                }
-                for doc in docs
-            ]
-            return docs_list
-        except Exception as e:
+            rows = self.document_repo.get_all_documents(user_id, sort, limit, after)
+        except ValueError:
             current_app.logger.info(f"Unsupport sorting key: {sort}")
-            return None
+            raise
+        rows, has_next = split_page(rows, limit)
+        docs_list = [
+            {
+                "uid": doc.uid,
+                "name": doc.name,
+                "status": DOCUMENT_PERMISSION_WRITE if doc.owner_id == user_id else permission_type_id,
+                "auditStatus": audit_status_id if audit_status_id else AUDIT_STATUS_NOT_SENT,
+                "snippet": doc.snippet,
+                "size": doc.body_size,
+            }
+            for doc, permission_type_id, audit_status_id in rows
+        ]
+        last_doc = rows[-1][0] if rows else None
+        return {
+            "documents": docs_list,
+            "nextCursor": encode_cursor(getattr(last_doc, sort), last_doc.id) if has_next else None
+        }
+
+    def export_documents(self, user_id: int, compress: bool = False, batch_size: int = 500) -> Iterator[bytes]:
+        """
+        Export every document the user can open as NDJSON, one document per line.
+
+        The documents are read and encoded batch by batch while the response is
+        sent, so memory use does not grow with the number of documents.
+
+        Args:
+            user_id (int): The ID of the user exporting documents.
+            compress (bool): Whether the lines are gzip compressed.
+            batch_size (int): The number of documents read from the database at a time.
+
+        Returns:
+            Iterator[bytes]: Chunks of the export, to be written to the response in order.
+        """
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        buffer = []
+        buffered = 0
+        exported = 0
+        for row in self.document_repo.stream_documents(user_id, batch_size):
+            line = json.dumps({
+                "uid": row.uid,
+                "name": row.name,
+                "body": row.body,
+                "version": row.version,
+                "status": DOCUMENT_PERMISSION_WRITE if row.owner_id == user_id else row.permission_type_id,
+                "createdDate": row.created_date.isoformat() + 'Z' if row.created_date else None,
+                "updatedDate": row.updated_date.isoformat() + 'Z' if row.updated_date else None
+            }, ensure_ascii=False).encode('utf-8') + b'\n'
+            buffer.append(line)
+            buffered += len(line)
+            exported += 1
+            if buffered >= EXPORT_CHUNK_SIZE:
+                chunk = b''.join(buffer)
+                buffer = []
+                buffered = 0
+                chunk = compressor.compress(chunk) if compressor else chunk
+                if chunk:
+                    yield chunk
+        chunk = b''.join(buffer)
+        if compressor:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
+        current_app.logger.info(f"Exported {exported} documents of user_id: {user_id}")
 
     def create_document(self, name: str, owner_id: int, document_status_id: int) -> str:
         document = Document(
             uid=str(uuid4()),
             name=name,
             owner_id=owner_id,
-            document_status_id=document_status_id,
-            lock_session=""
+            document_status_id=document_status_id
         )
         new_doc = self.document_repo.create_document(document)
+        self.search_service.index_document(new_doc)
         return new_doc.uid
 
-    def update_document(self, uid: str, body: str, comments: List[Dict]):
+    def update_document(
+        self,
+        uid: str,
+        body: str,
+        comments: List[Dict],
+        author_id: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Replace the body and the comments of a document.
+
+        The body is saved with the same conditional UPDATE as patch_document,
+        against the version just read. When another save wins the race, the
+        version is read again and the save retried, PUT_SAVE_ATTEMPTS times.
+
+        Args:
+            uid (str): The unique identifier of the document.
+            body (str): The new body.
+            comments (List[Dict]): The comments of the document.
+            author_id (Optional[int]): The ID of the user saving the document.
+
+        Returns:
+            Optional[Dict]: {"state": "true", "version": ...} with the new version,
+                            {"state": "conflict", "version": ...} if every attempt lost
+                            the race, None if the document cannot be found.
+
+        Raises:
+            ValueError: If a commentor cannot be found.
+        """
         document = self.document_repo.get_document_by_uid(uid)
-        if document:
-            # update document
-            document.body = body
-            self.document_repo.update_document(document=document)
-
-            # prepare data to udpate document comment
-            # transform username into userid
-            comments = [{
-                    "inline_id": comment.get('inlineId'),
-                    "text": comment['text'],
-                    "commentor_id": self.user_repo.find_user_by_name(comment['commentor']['name']).id,
-                    "document_id": document.id
-                } for comment in comments
-            ]
-
-            # update document comment
-            is_updated_succesfully = self.document_repo.update_document_comments(
-                document_id = document.id,
-                comments_updates = comments
+        if not document:
+            return None
+        comments = self.resolve_comments(document, comments)
+        for _ in range(PUT_SAVE_ATTEMPTS):
+            # read again after a lost race, the failed save expired the document
+            base_version = document.version
+            # record the change in the revision history, in the same transaction
+            revision = self.revision_service.make_revision(
+                document.id, base_version + 1, document.body, body, author_id=author_id
             )
+            if self.document_repo.update_document_body(document, base_version, body, revision):
+                break
+            current_app.logger.info(f"Retry update of document uid: {uid}, version {base_version} was saved concurrently")
+        else:
+            return {"state": "conflict", "version": document.version}
+        self.search_service.index_document(document)
+        self.save_document_comments(document, comments)
+        return {"state": "true", "version": document.version}
+
+    def patch_document(
+        self,
+        uid: str,
+        base_version: int,
+        ops: List[Dict],
+        comments: Optional[List[Dict]] = None,
+        author_id: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Apply text operations to the body of a document saved at base_version.
+
+        Args:
+            uid (str): The unique identifier of the document.
+            base_version (int): The version of the body the operations were computed against.
+            ops (List[Dict]): The retain, insert and delete operations, counted in UTF-16
+                              code units, see text_ops.ops_from_utf16.
+            comments (Optional[List[Dict]]): The comments of the document, left untouched if None.
+            author_id (Optional[int]): The ID of the user saving the document.
+
+        Returns:
+            Optional[Dict]: {"state": "true", "version": ...} with the new version if the
+                            patch was applied, {"state": "conflict", "version": ...} with the
+                            current version if base_version is stale, None if the document
+                            cannot be found.
+
+        Raises:
+            ValueError: If the operations do not apply to the body or a commentor cannot be found.
+        """
+        document = self.document_repo.get_document_by_uid(uid)
+        if not document:
+            current_app.logger.info(f"Can't find document by uid: {uid}")
+            return None
+        if document.version != base_version:
+            current_app.logger.info(f"Reject patch of document uid: {uid}, base version {base_version} is not {document.version}")
+            return {"state": "conflict", "version": document.version}
+
+        # the editor counts UTF-16 code units, revisions store characters
+        ops = ops_from_utf16(document.body or '', ops)
+        body = apply_ops(document.body or '', ops)
+        if comments is not None:
+            comments = self.resolve_comments(document, comments)
+        revision = self.revision_service.make_revision(
+            document.id, base_version + 1, document.body, body, ops=ops, author_id=author_id
+        )
+        if not self.document_repo.update_document_body(document, base_version, body, revision):
+            # another save won the race between the version check and the update
+            current_app.logger.info(f"Reject patch of document uid: {uid}, base version {base_version} was saved concurrently")
+            return {"state": "conflict", "version": document.version}
+
+        self.search_service.index_document(document)
+        if comments is not None:
+            self.save_document_comments(document, comments)
+        else:
+            self.reset_audit_status(document)
+        return {"state": "true", "version": document.version}
+
+    def resolve_comments(self, document: Document, comments: List[Dict]) -> List[Dict]:
+        """
+        Turn the comments of a save request into the rows of update_document_comments.
+
+        A commentor is given by its user ID, or by its full name. IDs are checked
+        together with one query, names are resolved together with another one,
+        names resolved before come from a cache.
+
+        Args:
+            document (Document): The document the comments belong to.
+            comments (List[Dict]): The comments, each with 'inlineId', 'text' and
+                                   'commentor': {"id": ...} or {"name": ...}.
 
-            audit = self.audit_repo.get_audit_by_document_id(document.id)
-            if audit:
-                audit.audit_status_id = 4
-                self.audit_repo.update_audit(audit)
+        Returns:
+            List[Dict]: The comments with the user ID of their commentor.
 
-            if is_updated_succesfully == False:
-                current_app.logger.error(f"Error when udpate comment for document id: {document.id}")
+        Raises:
+            ValueError: If the ID or the name of a commentor cannot be found.
+        """
+        names = [comment['commentor']['name'] for comment in comments if not comment['commentor'].get('id')]
+        user_ids = self.user_service.find_user_ids_by_names(names)
+        # checked here, a missing user would only fail the comment insert after the body was saved
+        existing_ids = self.user_repo.find_existing_user_ids(
+            [int(comment['commentor']['id']) for comment in comments if comment['commentor'].get('id')]
+        )
+        rows = []
+        for comment in comments:
+            commentor = comment['commentor']
+            if commentor.get('id'):
+                commentor_id = int(commentor['id'])
+                if commentor_id not in existing_ids:
+                    raise ValueError(f"Can't find commentor by ID: {commentor['id']}")
             else:
-                current_app.logger.info(f"Update {len(comments)} comments for document id: {document.id} successfully")
+                commentor_id = user_ids.get(commentor.get('name'))
+            if commentor_id is None:
+                raise ValueError(f"Can't find commentor: {commentor.get('name')}")
+            rows.append({
+                "inline_id": comment.get('inlineId'),
+                "text": comment['text'],
+                "commentor_id": commentor_id,
+                "document_id": document.id
+            })
+        return rows
+
+    def save_document_comments(self, document: Document, comments: List[Dict]):
+        # update document comment
+        is_updated_succesfully = self.document_repo.update_document_comments(
+            document_id = document.id,
+            comments_updates = comments
+        )
 
-            return is_updated_succesfully
-        return None
+        self.reset_audit_status(document)
+
+        if is_updated_succesfully == False:
+            current_app.logger.error(f"Error when udpate comment for document id: {document.id}")
+        else:
+            current_app.logger.info(f"Update {len(comments)} comments for document id: {document.id} successfully")
+
+        return is_updated_succesfully
+
+    def reset_audit_status(self, document: Document):
+        """Roll the audit of an edited document back to the "Not Sent" status."""
+        audit = self.audit_repo.get_audit_by_document_id(document.id)
+        if audit:
+            audit.audit_status_id = AUDIT_STATUS_NOT_SENT
+            self.audit_repo.update_audit(audit)
+            audit_result_cache.pop(document.uid)
 
     def get_document(self, user_id: str, document_uid: str) -> Optional[Dict]:
+        """
+        Retrieve a document with its comments, the user's mode and the audit status.
+
+        This is a read-only operation: it never takes the edit lease of the
+        document. Editors take the lease with acquire_lock_session_by_uid and keep
+        it with update_lock_session_by_uid.
+
+        Args:
+            user_id (str): The ID of the user reading the document.
+            document_uid (str): The unique identifier of the document.
+
+        Returns:
+            Optional[Dict]: The document details, or a dictionary with a 'state'
+                            key if the document cannot be found.
+        """
         document = self.document_repo.get_document_by_uid(document_uid)
         if document:
             user = self.user_repo.find_user_by_id(user_id)
-            document = self.document_repo.get_document_by_uid(document_uid)
             mode = self.document_repo.get_document_mode(user, document)
             audit_status = self.audit_repo.get_audit_by_document_id(document.id)
-            audit_status_id = audit_status.audit_status_id if audit_status else 4
+            audit_status_id = audit_status.audit_status_id if audit_status else AUDIT_STATUS_NOT_SENT
             document_comments = self.document_repo.get_document_comment_by_document_id(document.id)
-            otherIsEditting = False
             current_app.logger.info(f"Get {len(document_comments)} comments of document (uid: {document_uid})")
-            if document.lock_session is not "" and document.lock_session is not None:
-                if document.lock_session != session.get("lock_session"):
-                    lock_session = datetime.strptime(document.lock_session, "%Y-%m-%d %H:%M:%S")
-                    if lock_session + timedelta(minutes=5) > datetime.now() :
-                        current_app.logger.info(f"Document Ud: {document_uid} is locked by other user.")
-                        otherIsEditting = True
-            document.lock_session = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            session["lock_session"] = document.lock_session
-            self.document_repo.update_document(document)
+            otherIsEditting = self.is_locked_by_other(document)
+            if otherIsEditting:
+                current_app.logger.info(f"Document Ud: {document_uid} is locked by other user.")
             return {
                 'otherIsEditting': otherIsEditting,
                 "uid": document.uid,
                 "name": document.name,
                 "body": document.body,
-                "otherIsEditing": bool(document.lock_session),
+                "version": document.version,
+                "otherIsEditing": otherIsEditting,
                 "mode": mode,
                 "auditStatus": audit_status_id,
                 "comments": [
@@ -146,7 +365,7 @@ class DocumentService:
                         "inlineId": comment.inline_id,
                         "text": comment.text,
                         "commentor": {
-                            "name": self.user_repo.find_user_by_id(comment.commenter_id).name,
+                            "name": comment.commenter.name,
                         }
                     }
                     for comment in document_comments
@@ -155,24 +374,93 @@ class DocumentService:
         current_app.logger.info(f"Can't find document by uid: {document_uid}")
         return {"state": "Cant find document by uid"}
 
-    def delete_lock_session_by_uid(self, uid: str):
+    def get_document_version(self, user: UserIdentity, document_uid: str) -> Optional[Tuple]:
+        """
+        Collect what get_document returns for the user depends on, without building it.
+
+        Args:
+            user (UserIdentity): The user reading the document.
+            document_uid (str): The unique identifier of the document.
+
+        Returns:
+            Optional[Tuple]: Values that change whenever the response of get_document
+                             changes, None if the document cannot be found.
+        """
+        version = self.document_repo.get_document_version(document_uid)
+        if version is None:
+            return None
+        # the row carries id, uid and owner_id, all the mode and lease lookups need
+        mode = self.document_repo.get_document_mode(user, version)
+        return (user.id, mode, self.is_locked_by_other(version), *version)
+
+    def current_lease_holder(self) -> str:
+        """The edit lease holder identity of the current browser session."""
+        if 'lease_holder' not in session:
+            session['lease_holder'] = uuid4().hex
+        return session['lease_holder']
+
+    def is_locked_by_other(self, document: Document) -> bool:
+        """Whether another session holds the edit lease of the document."""
+        try:
+            lease = self.lease_service.get(document.uid)
+        except RedisError as e:
+            current_app.logger.warning(f"Cannot read edit lease of document uid: {document.uid}, error: {e}")
+            return False
+        return lease is not None and lease.holder != session.get('lease_holder')
+
+    def acquire_lock_session_by_uid(self, uid: str):
+        """Take the edit lease of a document unless another session holds it.
+
+        The fencing token of the lease is kept in the session, it is required
+        to renew and release the lease.
+
+        Returns:
+            dict: {"state": "true", "fencingToken": ...} when the lease is taken,
+                  {"state": "unavailable"} when Redis cannot be reached,
+                  {"state": "false", "otherIsEditting": ...} otherwise.
+        """
         document = self.document_repo.get_document_by_uid(uid)
         if document:
-            if session.get("lock_session") == document.lock_session:
-                document.lock_session = None
-                self.document_repo.update_document(document)
-                session.pop('lock_session', None)
+            try:
+                lease = self.lease_service.acquire(document.uid, self.current_lease_holder())
+            except RedisError as e:
+                current_app.logger.warning(f"Cannot take edit lease of document uid: {uid}, error: {e}")
+                return {"state": "unavailable"}
+            if not lease.acquired:
+                current_app.logger.info(f"Document Ud: {uid} is locked by other user.")
+                return {"state": "false", "otherIsEditting": True}
+            session['lease_tokens'] = {**session.get('lease_tokens', {}), uid: lease.token}
+            return {"state": "true", "fencingToken": lease.token}
+        return {"state": "false", "otherIsEditting": False}
+
+    def delete_lock_session_by_uid(self, uid: str):
+        """Release the edit lease of a document, {"state": "unavailable"} when Redis cannot be reached."""
+        token = session.get('lease_tokens', {}).get(uid)
+        if token is not None:
+            try:
+                released = self.lease_service.release(uid, session.get('lease_holder'), token)
+            except RedisError as e:
+                # the token is kept, so the release can be retried
+                current_app.logger.warning(f"Cannot release edit lease of document uid: {uid}, error: {e}")
+                return {"state": "unavailable"}
+            lease_tokens = dict(session['lease_tokens'])
+            lease_tokens.pop(uid)
+            session['lease_tokens'] = lease_tokens
+            if released:
                 return {"state": "true"}
         return {"state": "false"}
 
     def update_lock_session_by_uid(self, uid: str):
-        document = self.document_repo.get_document_by_uid(uid)
-        if document:
-            if session.get("lock_session") == document.lock_session:
-                document.lock_session = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                session["lock_session"] = document.lock_session
-                self.document_repo.update_document(document)
-                return {"state": "true", "lock_session": document.lock_session}
+        """Renew the edit lease of a document, {"state": "unavailable"} when Redis cannot be reached."""
+        token = session.get('lease_tokens', {}).get(uid)
+        if token is not None:
+            try:
+                renewed = self.lease_service.renew(uid, session.get('lease_holder'), token)
+            except RedisError as e:
+                current_app.logger.warning(f"Cannot renew edit lease of document uid: {uid}, error: {e}")
+                return {"state": "unavailable"}
+            if renewed:
+                return {"state": "true", "fencingToken": token}
         return {"state": "false"}
 
     def delete_document_by_uid(self, document_uid: str):
@@ -196,6 +484,7 @@ class DocumentService:
             if document:
                 current_app.logger.info(f"Delete document UID: {document_uid}")
                 self.document_repo.delete_document(document)
+                audit_result_cache.pop(document_uid)
                 return True
             else:
                 current_app.logger.info(f"No document found with UID: {document_uid}")
@@ -214,7 +503,7 @@ class DocumentService:
                 audit = self.audit_repo.get_audit_by_document_id(document.id)
 
                 # search username
-                auditor = self.user_repo.find_user_by_id(audit.creator_id)
+                auditor = self.user_repo.find_user_by_id(audit.auditor_id)
                 current_app.logger.info(
                     f"Found user id: {auditor.id}, name: {auditor.name}, "
                     f"username: {auditor.username} of document UID: {document_uid}"
@@ -265,7 +554,7 @@ class DocumentService:
 
     def update_document_permission(self, uid: str, username: str, permission_type: int) -> bool:
         document = self.document_repo.get_document_by_uid(uid)
-        if self.document_repo.is_document_permission_type_exist(permission_type) == False:
+        if permission_type not in lookup_registry.document_permission_types:
             current_app.logger.info(f"Document permisssion type: {permission_type} not exist")
             return False
 
@@ -294,6 +583,7 @@ class DocumentService:
         if document:
             document.name = new_document_name
             self.document_repo.update_document(document)
+            self.search_service.index_document(document)
             return document
         else:
             current_app.logger.info(f"Error! Cannot get document by document_uid {uid}")
@@ -0,0 +1,223 @@
+import itertools
+import json
+import os
+from typing import Callable, Dict, Iterator, List, Optional, TextIO
+from uuid import uuid4
+
+from flask import current_app
+from model.document_model import NEW_DOCUMENT_STATUS_ID, DocumentImport, make_snippet
+from repo.import_repo import ImportRepository
+from repo.lookup import lookup_registry
+from repo.user_repo import UserRepository
+from service.search_service import SearchService
+from service.user_service import UserService
+
+MAX_NAME_LENGTH = 100
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_records(stream: TextIO) -> Iterator[Dict]:
+    """
+    Read the records of an archive one by one, never the whole file at once.
+
+    The archive is either NDJSON, one document per line as written by the
+    export, or a JSON array of documents.
+
+    Raises:
+        ValueError: If the archive is not valid JSON.
+    """
+    first = stream.read(1)
+    while first.isspace():
+        first = stream.read(1)
+    if not first:
+        return
+    if first == '[':
+        yield from iter_array(stream)
+        return
+    for line in itertools.chain([first + stream.readline()], stream):
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_array(stream: TextIO) -> Iterator[Dict]:
+    """Decode the items of a JSON array whose '[' was already read."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # the next item is incomplete, read more of it
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("The JSON array of the archive is not complete")
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+
+def batches(records: Iterator[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class ImportService:
+    """
+    Bulk import of documents, with their permissions and comments, from an archive.
+
+    Records are inserted in batches, each batch in one transaction that also
+    records the progress of the import. A failed import keeps the batches
+    committed before the failure and resumes after them.
+    """
+    def __init__(self):
+        self.import_repo = ImportRepository()
+        self.user_repo = UserRepository()
+        self.user_service = UserService()
+        self.search_service = SearchService()
+
+    def start_import(self, owner_username: str, source: str) -> DocumentImport:
+        """
+        Record a new import of the archive source, owned by a user.
+
+        Raises:
+            ValueError: If the owner cannot be found.
+        """
+        owner = self.user_repo.find_user_by_username(owner_username)
+        if owner is None:
+            raise ValueError(f"Can't find user by username: {owner_username}")
+        return self.import_repo.create_import(DocumentImport(owner_id=owner.id, source=os.path.abspath(source)))
+
+    def get_import(self, import_id: int) -> Optional[DocumentImport]:
+        return self.import_repo.get_import(import_id)
+
+    def resume_import(self, import_id: int, source: str) -> DocumentImport:
+        """
+        Find a failed import to resume from the same archive source.
+
+        Raises:
+            ValueError: If the import cannot be found, is completed, or was of another
+                        archive, whose first records resuming would skip.
+        """
+        document_import = self.import_repo.get_import(import_id)
+        if document_import is None or document_import.status == 'completed':
+            raise ValueError(f"No import {import_id} to resume")
+        if os.path.abspath(document_import.source) != os.path.abspath(source):
+            raise ValueError(f"Import {import_id} is of {document_import.source}, not {source}")
+        return document_import
+
+    def import_documents(
+        self,
+        document_import: DocumentImport,
+        records: Iterator[Dict],
+        batch_size: int = 500,
+        progress: Optional[Callable[[int], None]] = None
+    ) -> DocumentImport:
+        """
+        Import the records of an archive, skipping those a previous run already imported.
+
+        Each record is a document: {"name": ..., "body": ..., "permissions":
+        [{"username": ..., "permissionType": ...}], "comments": [{"inlineId": ...,
+        "text": ..., "commentor": {"name": ...}}]}, permissions and comments
+        being optional.
+
+        Args:
+            document_import (DocumentImport): The import, new or failed before.
+            records (Iterator[Dict]): Every record of the archive, from the start.
+            batch_size (int): The number of documents inserted per transaction.
+            progress (Optional[Callable[[int], None]]): Called with the number of
+                                                        records imported after each batch.
+
+        Returns:
+            DocumentImport: The import, 'completed', or 'failed' with the error and
+                            the number of records imported before it.
+        """
+        imported = document_import.imported
+        try:
+            for batch in batches(itertools.islice(records, imported, None), batch_size):
+                self.import_batch(document_import.owner_id, batch, imported)
+                imported += len(batch)
+                self.import_repo.save_progress(document_import, imported)
+                current_app.logger.info(f"Import {document_import.id}: {imported} documents imported")
+                if progress:
+                    progress(imported)
+        except Exception as e:
+            self.import_repo.rollback()
+            current_app.logger.error(f"Import {document_import.id} failed after {imported} documents")
+            current_app.logger.error(e)
+            self.import_repo.save_progress(document_import, imported, 'failed', str(e))
+            return document_import
+        self.import_repo.save_progress(document_import, imported, 'completed')
+        return document_import
+
+    def import_batch(self, owner_id: int, records: List[Dict], offset: int):
+        """
+        Add the inserts of a batch of records to the current transaction.
+
+        Raises:
+            ValueError: If a record is invalid or names a user that cannot be found.
+        """
+        documents = [self.make_document(owner_id, record, offset + i) for i, record in enumerate(records)]
+        user_ids = self.user_repo.find_user_ids_by_usernames([
+            permission['username'] for record in records for permission in record.get('permissions', [])
+        ])
+        commentor_ids = self.user_service.find_user_ids_by_names([
+            comment['commentor']['name'] for record in records for comment in record.get('comments', [])
+        ])
+
+        document_ids = self.import_repo.insert_documents(documents)
+        permissions = []
+        comments = []
+        for document, record in zip(documents, records):
+            document_id = document_ids[document['uid']]
+            for permission in record.get('permissions', []):
+                if permission['username'] not in user_ids:
+                    raise ValueError(f"Can't find user by username: {permission['username']}")
+                if permission['permissionType'] not in lookup_registry.document_permission_types:
+                    raise ValueError(f"Document permission type: {permission['permissionType']} not exist")
+                permissions.append({
+                    "document_id": document_id,
+                    "user_id": user_ids[permission['username']],
+                    "document_permission_type_id": permission['permissionType']
+                })
+            for comment in record.get('comments', []):
+                name = comment['commentor']['name']
+                if name not in commentor_ids:
+                    raise ValueError(f"Can't find commentor: {name}")
+                comments.append({
+                    "document_id": document_id,
+                    "inline_id": comment.get('inlineId'),
+                    "text": comment['text'],
+                    "commenter_id": commentor_ids[name]
+                })
+        self.import_repo.insert_permissions(permissions)
+        self.import_repo.insert_comments(comments)
+        self.search_service.add_new_documents({document_ids[document['uid']]: document for document in documents})
+
+    @staticmethod
+    def make_document(owner_id: int, record: Dict, number: int) -> Dict:
+        """Build the column values of an imported document, number counting records from 0."""
+        if not isinstance(record, dict):
+            raise ValueError(f"Record {number} is not a JSON object")
+        name = record.get('name')
+        body = record.get('body')
+        if not isinstance(name, str) or not name or len(name) > MAX_NAME_LENGTH:
+            raise ValueError(f"Record {number} needs a name of 1 to {MAX_NAME_LENGTH} characters")
+        if body is not None and not isinstance(body, str):
+            raise ValueError(f"Record {number} has a body that is not a string")
+        return {
+            "uid": str(uuid4()),
+            "name": name,
+            "body": body,
+            "snippet": make_snippet(body),
+            "body_size": len(body) if body else 0,
+            "version": 1,
+            "owner_id": owner_id,
+            "document_status_id": NEW_DOCUMENT_STATUS_ID
+        }
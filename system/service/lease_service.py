@@ -0,0 +1,60 @@
+import os
+from typing import NamedTuple, Optional
+
+from repo.RedisRepo import RedisRepo
+
+# a lease not renewed for this long is considered abandoned
+LEASE_TTL_SECONDS = 5 * 60
+
+
+class Lease(NamedTuple):
+    acquired: bool
+    token: int
+    holder: str
+
+
+class EditLeaseService:
+    """Edit leases of documents, stored in Redis so every API replica sees the same state.
+
+    Each lease has a holder identity and a fencing token. The token increases
+    every time the lease changes hands, so a holder whose lease expired and was
+    taken by someone else can be told apart from the current holder.
+    """
+    def __init__(self, redis_repo: Optional[RedisRepo] = None):
+        self.redis_repo = redis_repo or RedisRepo(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379))
+        )
+        self.ttl_ms = LEASE_TTL_SECONDS * 1000
+
+    @staticmethod
+    def lease_key(document_uid: str) -> str:
+        return f"lease:document:{document_uid}"
+
+    def acquire(self, document_uid: str, holder: str) -> Lease:
+        """Take the edit lease of a document, or extend it if holder already owns it.
+
+        Returns:
+            Lease: acquired is False when another holder owns the lease, in which
+                   case token and holder describe the other holder's lease.
+        """
+        acquired, token, current_holder = self.redis_repo.acquire_lease(
+            self.lease_key(document_uid), holder, self.ttl_ms
+        )
+        return Lease(acquired, token, current_holder)
+
+    def renew(self, document_uid: str, holder: str, token: int) -> bool:
+        """Extend the edit lease, fails if the lease expired or changed hands."""
+        return self.redis_repo.renew_lease(self.lease_key(document_uid), holder, token, self.ttl_ms)
+
+    def release(self, document_uid: str, holder: str, token: int) -> bool:
+        """Release the edit lease, fails if the lease expired or changed hands."""
+        return self.redis_repo.release_lease(self.lease_key(document_uid), holder, token)
+
+    def get(self, document_uid: str) -> Optional[Lease]:
+        """Get the current edit lease of a document, None if nobody holds it."""
+        lease = self.redis_repo.get_lease(self.lease_key(document_uid))
+        if lease is None:
+            return None
+        token, holder = lease
+        return Lease(True, token, holder)
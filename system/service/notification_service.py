@@ -1,7 +1,8 @@
 import json
 import os
+from typing import Dict, List
 from repo.email_repo import EmailRepo
-from repo.rabbitmq_repo import RabbitMQPubliser
+from repo.rabbitmq_repo import rabbitmq_publisher
 from model.NotificationModel import Notification
 
 class NotificationService():
@@ -18,7 +19,7 @@ class NotificationService():
         self.thirdy2queue = {
             'email': os.getenv("RABBITMQ_EMAIL_QUEUE")
         }
-        self.rabbitmq_publisher = RabbitMQPubliser()
+        self.rabbitmq_publisher = rabbitmq_publisher
 
     def create_notifications(
         self, 
@@ -66,6 +67,17 @@ class NotificationService():
             }
         )
 
+    def publish_many_to_queue(
+        self,
+        third_party: str,
+        messages: List[Dict[str, str]]
+    ):
+        """Publish {"title", "content", "recipient"} messages over one channel of the pool."""
+        self.rabbitmq_publisher.send_messages_to_queue(
+            queue_name = self.thirdy2queue[third_party],
+            messages = messages
+        )
+
     def listen_and_send_notifications(
         self, 
         notification_type: str
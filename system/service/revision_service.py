@@ -0,0 +1,160 @@
+import json
+from typing import Dict, List, Optional
+
+from flask import current_app
+from model.document_model import DocumentRevision
+from repo.document_repo import DocumentRepository
+from repo.pagination import decode_cursor, encode_cursor, split_page
+from repo.revision_repo import RevisionRepository
+from service.text_ops import TextOp, apply_ops, diff_ops, ops_to_utf16
+
+# Every revision numbered a multiple of this is a snapshot, so rebuilding a
+# revision applies at most SNAPSHOT_INTERVAL - 1 deltas.
+SNAPSHOT_INTERVAL = 20
+
+class RevisionService:
+    """
+    Revision history of documents, stored as a snapshot followed by a chain of deltas.
+    """
+    def __init__(self):
+        self.document_repo = DocumentRepository()
+        self.revision_repo = RevisionRepository()
+
+    def make_revision(
+        self,
+        document_id: int,
+        revision: int,
+        previous_body: Optional[str],
+        body: str,
+        ops: Optional[List[TextOp]] = None,
+        author_id: Optional[int] = None
+    ) -> DocumentRevision:
+        """
+        Build the revision recording a save of a document, to be saved with the new body.
+
+        The revision is a delta against the previous revision, unless it starts a
+        new snapshot interval, the previous revision is missing (e.g. the
+        document was saved before history existed), or the delta would not be
+        smaller than the body.
+
+        Args:
+            document_id (int): The ID of the document.
+            revision (int): The document version being saved.
+            previous_body (Optional[str]): The body of version revision - 1.
+            body (str): The body being saved.
+            ops (Optional[List[TextOp]]): The operations turning previous_body into
+                                          body, computed when not given.
+            author_id (Optional[int]): The ID of the user saving the document.
+
+        Returns:
+            DocumentRevision: The unsaved revision.
+        """
+        latest = self.revision_repo.get_latest_revision(document_id)
+        is_snapshot = revision % SNAPSHOT_INTERVAL == 0 or latest is None or latest.revision != revision - 1
+        content = body
+        if not is_snapshot:
+            if ops is None:
+                ops = diff_ops(previous_body or '', body)
+            delta = json.dumps(ops, separators=(',', ':'))
+            if len(delta) < len(body):
+                content = delta
+            else:
+                is_snapshot = True
+        return DocumentRevision(
+            document_id=document_id,
+            revision=revision,
+            is_snapshot=is_snapshot,
+            content=content,
+            author_id=author_id
+        )
+
+    def list_revisions(self, document_uid: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> Optional[Dict]:
+        """
+        List the revisions of a document, oldest first.
+
+        Args:
+            document_uid (str): The unique identifier of the document.
+            limit (Optional[int]): The page size, None returns every revision.
+            cursor (Optional[str]): The nextCursor returned with the previous page.
+
+        Returns:
+            Optional[Dict]: The revisions of the page and the cursor of the next page,
+                            None if the document cannot be found.
+
+        Raises:
+            ValueError: If the cursor is invalid.
+        """
+        document = self.document_repo.get_document_by_uid(document_uid)
+        if not document:
+            current_app.logger.info(f"Can't find document by uid: {document_uid}")
+            return None
+        after = decode_cursor(cursor) if cursor else None
+        revisions = self.revision_repo.get_revisions(document.id, limit, after)
+        revisions, has_next = split_page(revisions, limit)
+        last_revision = revisions[-1] if revisions else None
+        return {
+            "revisions": [
+                {
+                    "revision": revision.revision,
+                    "author": {"name": revision.author.name} if revision.author else None,
+                    "createdDate": revision.created_date.isoformat() + 'Z'
+                }
+                for revision in revisions
+            ],
+            "nextCursor": encode_cursor(last_revision.revision, last_revision.id) if has_next else None
+        }
+
+    def get_revision_body(self, document_id: int, revision: int) -> Optional[str]:
+        """
+        Rebuild the body of a revision from the newest snapshot before it.
+
+        Returns:
+            Optional[str]: The body, None if the revision does not exist.
+        """
+        chain = self.revision_repo.get_revision_chain(document_id, revision)
+        if not chain or chain[-1].revision != revision:
+            return None
+        body = chain[0].content
+        for delta in chain[1:]:
+            body = apply_ops(body, json.loads(delta.content))
+        return body
+
+    def get_revision(self, document_uid: str, revision: int) -> Optional[Dict]:
+        """
+        Get the body of a document as saved by a revision.
+
+        Returns:
+            Optional[Dict]: The revision number and body, None if the document or
+                            the revision cannot be found.
+        """
+        document = self.document_repo.get_document_by_uid(document_uid)
+        if not document:
+            current_app.logger.info(f"Can't find document by uid: {document_uid}")
+            return None
+        body = self.get_revision_body(document.id, revision)
+        if body is None:
+            current_app.logger.info(f"Can't find revision {revision} of document uid: {document_uid}")
+            return None
+        return {"revision": revision, "body": body}
+
+    def diff_revisions(self, document_uid: str, from_revision: int, to_revision: int) -> Optional[Dict]:
+        """
+        Compare two revisions of a document.
+
+        Returns:
+            Optional[Dict]: The text operations turning the body of from_revision
+                            into the body of to_revision, counted in UTF-16 code
+                            units like the editor does, None if the document or
+                            one of the revisions cannot be found.
+        """
+        document = self.document_repo.get_document_by_uid(document_uid)
+        if not document:
+            current_app.logger.info(f"Can't find document by uid: {document_uid}")
+            return None
+        from_body = self.get_revision_body(document.id, from_revision)
+        to_body = self.get_revision_body(document.id, to_revision)
+        if from_body is None or to_body is None:
+            current_app.logger.info(f"Can't find revision {from_revision} or {to_revision} of document uid: {document_uid}")
+            return None
+        ops = ops_to_utf16(from_body, diff_ops(from_body, to_body))
+        return {"from": from_revision, "to": to_revision, "ops": ops}
@@ -0,0 +1,184 @@
+import html
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional
+
+from flask import current_app
+from model.document_model import Document
+from repo.cache import TTLCache
+from repo.search_repo import SearchRepository
+
+# terms of the document name count this many times, so name matches rank first
+NAME_WEIGHT = 3
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 10
+# terms found in more than this share of the documents, and in more than
+# COMMON_TERM_MIN_DOCUMENTS documents, barely change the ranking while their
+# posting lists are the longest to read, see SearchService.search
+COMMON_TERM_RATIO = 0.25
+COMMON_TERM_MIN_DOCUMENTS = 5000
+
+STOP_WORDS = frozenset((
+    "a an and are as at be but by for from has have in is it its of on or that "
+    "the this to was were will with"
+).split())
+
+TAG = re.compile(r'<[^>]+>')
+WORD = re.compile(r'\w+')
+CJK = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+
+# (document count, average document length), refreshed at most once a minute
+index_stats_cache = TTLCache(maxsize=1, ttl=60)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split text, plain or HTML, into search terms.
+
+    Terms are lower cased words with accents removed, stop words are dropped.
+    Chinese, Japanese and Korean text has no spaces between words, it is split
+    into overlapping pairs of characters instead.
+
+    Args:
+        text (Optional[str]): The text to be split.
+
+    Returns:
+        List[str]: The terms in order of appearance, with repetitions.
+    """
+    if not text:
+        return []
+    text = html.unescape(TAG.sub(' ', text))
+    text = unicodedata.normalize('NFKD', text.lower())
+    # drop accents, then compose back what NFKD split apart, e.g. Hangul syllables
+    text = unicodedata.normalize('NFKC', ''.join(char for char in text if not unicodedata.combining(char)))
+
+    terms = []
+    for word in WORD.findall(text):
+        start = 0
+        for run in CJK.finditer(word):
+            terms.extend(latin_terms(word[start:run.start()]))
+            cjk = run.group()
+            terms.extend([cjk] if len(cjk) == 1 else [cjk[i:i + 2] for i in range(len(cjk) - 1)])
+            start = run.end()
+        terms.extend(latin_terms(word[start:]))
+    return terms
+
+
+def latin_terms(word: str) -> List[str]:
+    if not word or word in STOP_WORDS:
+        return []
+    return [word[:MAX_TERM_LENGTH]]
+
+
+class SearchService:
+    """
+    Full-text search over the names and bodies of documents, ranked with BM25.
+
+    The index is an inverted index (term -> documents) in the database, updated
+    whenever a document is created, saved, renamed or deleted.
+    """
+    def __init__(self):
+        self.search_repo = SearchRepository()
+
+    def index_document(self, document: Document):
+        """Update the index entries of a document after its name or body changed."""
+        self.search_repo.replace_document_terms(document.id, self.count_terms(document.name, document.body))
+
+    def add_new_documents(self, documents: Dict[int, Dict]):
+        """
+        Add the index entries of documents never indexed before, in the caller's
+        transaction, e.g. a batch of imported documents.
+
+        Args:
+            documents (Dict[int, Dict]): The 'name' and 'body' of each document, by ID.
+        """
+        self.search_repo.add_documents_terms({
+            document_id: self.count_terms(document['name'], document['body'])
+            for document_id, document in documents.items()
+        })
+
+    @staticmethod
+    def count_terms(name: Optional[str], body: Optional[str]) -> Counter:
+        term_counts = Counter(tokenize(body))
+        for term in tokenize(name):
+            term_counts[term] += NAME_WEIGHT
+        return term_counts
+
+    def search(self, user_id: int, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Search the documents the user owns or has a permission on.
+
+        Query terms found in most documents are left out when the query has
+        rarer terms, or all but the rarest one otherwise. Their weight in BM25
+        is close to zero, but reading their posting lists would cost as much as
+        scanning every document.
+
+        Args:
+            user_id (int): The ID of the user searching.
+            query (str): The words searched for.
+            limit (int): The maximum number of documents returned.
+
+        Returns:
+            List[Dict]: The matching documents, best match first.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        stats = index_stats_cache.get('stats')
+        if stats is None:
+            stats = self.search_repo.get_index_stats()
+            index_stats_cache.set('stats', stats)
+        document_count, average_length = stats
+
+        document_frequencies = self.search_repo.get_document_frequencies(terms)
+        if not document_frequencies:
+            return []
+        # the cached document count may lag behind, never let it go below a term's frequency
+        document_count = max([document_count, *document_frequencies.values()])
+        rare = {
+            term: frequency
+            for term, frequency in document_frequencies.items()
+            if frequency <= max(document_count * COMMON_TERM_RATIO, COMMON_TERM_MIN_DOCUMENTS)
+        }
+        if rare:
+            document_frequencies = rare
+        else:
+            # only common terms, the rarest one alone still ranks the documents
+            term = min(document_frequencies, key=document_frequencies.get)
+            document_frequencies = {term: document_frequencies[term]}
+        term_weights = {
+            term: math.log(1 + (document_count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequencies.items()
+        }
+
+        rows = self.search_repo.search(user_id, term_weights, average_length, limit)
+        current_app.logger.info(f"Search {terms} found {len(rows)} documents")
+        return [
+            {
+                "uid": document.uid,
+                "name": document.name,
+                "snippet": document.snippet,
+                "score": round(score, 4)
+            }
+            for document, score in rows
+        ]
+
+    def reindex_documents(self, batch_size: int = 500) -> int:
+        """
+        Rebuild the index entries of every document, e.g. after the index was created.
+
+        Returns:
+            int: The number of documents indexed.
+        """
+        indexed = 0
+        last_id = 0
+        while True:
+            documents = self.search_repo.get_documents_after(last_id, batch_size)
+            if not documents:
+                return indexed
+            for document in documents:
+                self.index_document(document)
+            indexed += len(documents)
+            last_id = documents[-1].id
@@ -0,0 +1,191 @@
+import re
+from bisect import bisect_left
+from difflib import SequenceMatcher
+from typing import Dict, List, Union
+
+# split an HTML body after every tag, then after every word
+TAG_BOUNDARY = re.compile(r'(?<=>)')
+WORD_BOUNDARY = re.compile(r'(?<=[>\s])')
+# replaced blocks longer than this are not compared word by word
+MAX_REFINE_SIZE = 10000
+# characters outside the Basic Multilingual Plane, e.g. emoji, are two UTF-16 code units
+ASTRAL_CHARACTER = re.compile('[\U00010000-\U0010FFFF]')
+
+TextOp = Dict[str, Union[int, str]]
+
+
+def apply_ops(text: str, ops: List[TextOp]) -> str:
+    """Apply a list of text operations to text.
+
+    The operations walk the text from the start, in the same shape as a Quill
+    delta: {"retain": n} keeps the next n characters, {"delete": n} drops them
+    and {"insert": "..."} adds a string at the current position. Characters
+    after the last operation are kept.
+
+    Lengths count Python characters (code points). Operations of the API count
+    UTF-16 code units like the editor does, see ops_from_utf16 and ops_to_utf16.
+
+    Args:
+        text (str): The text the operations were computed against.
+        ops (List[TextOp]): The operations to be applied.
+
+    Returns:
+        str: The text after applying the operations.
+
+    Raises:
+        ValueError: If an operation is malformed or runs past the end of text.
+    """
+    parts = []
+    position = 0
+    for op in ops:
+        if not isinstance(op, dict) or len(op) != 1:
+            raise ValueError(f"Invalid text operation: {op}")
+        kind, value = next(iter(op.items()))
+        if kind == 'insert':
+            if not isinstance(value, str):
+                raise ValueError(f"insert expects a string, got: {value!r}")
+            parts.append(value)
+            continue
+        if kind not in ('retain', 'delete'):
+            raise ValueError(f"Unknown text operation: {kind}")
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"{kind} expects a non-negative integer, got: {value!r}")
+        if position + value > len(text):
+            raise ValueError(f"{kind} of {value} characters runs past the end of the text")
+        if kind == 'retain':
+            parts.append(text[position:position + value])
+        position += value
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def ops_from_utf16(text: str, ops: List[TextOp]) -> List[TextOp]:
+    """Convert the retain and delete lengths of ops from UTF-16 code units to characters.
+
+    The editor counts lengths in UTF-16 code units, as JavaScript strings do,
+    so a character outside the Basic Multilingual Plane, e.g. an emoji, counts
+    as two there and as one in Python. Malformed operations and operations
+    running past the end of text are passed on for apply_ops to reject.
+
+    Args:
+        text (str): The text the operations were computed against.
+        ops (List[TextOp]): The operations counted in UTF-16 code units.
+
+    Returns:
+        List[TextOp]: The operations counted in characters.
+
+    Raises:
+        ValueError: If an operation ends between the two code units of a character.
+    """
+    astral = [match.start() for match in ASTRAL_CHARACTER.finditer(text)]
+    if not astral:
+        return ops
+
+    def units_before(index: int) -> int:
+        return index + bisect_left(astral, index)
+
+    total_units = units_before(len(text))
+    converted = []
+    position = 0
+    for op in ops:
+        if not isinstance(op, dict) or len(op) != 1:
+            converted.append(op)
+            continue
+        kind, value = next(iter(op.items()))
+        if kind not in ('retain', 'delete') or not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            converted.append(op)
+            continue
+        end_units = units_before(position) + value
+        if end_units > total_units:
+            # runs past the end by as many characters as code units
+            converted.append({kind: len(text) - position + end_units - total_units})
+            position = len(text)
+            continue
+        # every character is at least one code unit, at most two
+        candidates = range(max(position, end_units - len(astral)), min(end_units, len(text)) + 1)
+        end = candidates[bisect_left(candidates, end_units, key=units_before)]
+        if units_before(end) != end_units:
+            raise ValueError(f"{kind} of {value} code units splits a character in two")
+        converted.append({kind: end - position})
+        position = end
+    return converted
+
+
+def ops_to_utf16(text: str, ops: List[TextOp]) -> List[TextOp]:
+    """Convert the retain and delete lengths of ops from characters to UTF-16 code units.
+
+    The reverse of ops_from_utf16, for operations sent to the editor.
+
+    Args:
+        text (str): The text the operations apply to.
+        ops (List[TextOp]): Valid operations counted in characters.
+
+    Returns:
+        List[TextOp]: The operations counted in UTF-16 code units.
+    """
+    if not ASTRAL_CHARACTER.search(text):
+        return ops
+    converted = []
+    position = 0
+    for op in ops:
+        kind, value = next(iter(op.items()))
+        if kind == 'insert':
+            converted.append(op)
+            continue
+        segment = text[position:position + value]
+        converted.append({kind: value + len(ASTRAL_CHARACTER.findall(segment))})
+        position += value
+    return converted
+
+
+def diff_ops(old: str, new: str) -> List[TextOp]:
+    """Build operations turning old into new, sized by the change rather than the text.
+
+    The common prefix and suffix are trimmed first, then the rest is compared
+    tag by tag (an HTML body split after every '>'), and blocks replaced
+    between tags are compared word by word. Several edits far apart from each
+    other don't resend the text between them.
+    """
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]:
+        suffix += 1
+
+    ops = []
+    add_op(ops, 'retain', prefix)
+    diff_tokens(ops, old[prefix:len(old) - suffix], new[prefix:len(new) - suffix], TAG_BOUNDARY)
+    # characters after the last operation are kept
+    while ops and 'retain' in ops[-1]:
+        ops.pop()
+    return ops
+
+
+def diff_tokens(ops: List[TextOp], old: str, new: str, boundary: re.Pattern):
+    old_tokens = boundary.split(old)
+    new_tokens = boundary.split(new)
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        old_block = ''.join(old_tokens[i1:i2])
+        new_block = ''.join(new_tokens[j1:j2])
+        if tag == 'equal':
+            add_op(ops, 'retain', len(old_block))
+        elif tag == 'replace' and boundary is TAG_BOUNDARY and \
+                max(len(old_block), len(new_block)) <= MAX_REFINE_SIZE:
+            diff_tokens(ops, old_block, new_block, WORD_BOUNDARY)
+        else:
+            add_op(ops, 'delete', len(old_block))
+            add_op(ops, 'insert', new_block)
+
+
+def add_op(ops: List[TextOp], kind: str, value: Union[int, str]):
+    """Append an operation, merging it into the previous one of the same kind."""
+    if not value:
+        return
+    if ops and kind in ops[-1]:
+        ops[-1][kind] += value
+    else:
+        ops.append({kind: value})
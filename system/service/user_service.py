@@ -1,8 +1,16 @@
 from typing import Optional, Dict, List
 
+from flask import g, has_app_context
+
+from repo.cache import TTLCache
 from repo.user_repo import UserRepository
 from repo.document_repo import DocumentRepository
-from model.user_model import User
+from model.user_model import User, UserIdentity
+
+# google_id -> UserIdentity, shared by every request of this process
+user_identity_cache = TTLCache(maxsize=10000, ttl=300)
+# full name -> user ID, used to resolve the commenters of saved comments
+user_id_by_name_cache = TTLCache(maxsize=10000, ttl=300)
 
 class UserService:
     def __init__(self):
@@ -98,9 +106,13 @@ class UserService:
         """
         user = self.user_repository.find_user_by_username(username)
         if user:
+            previous_name = user.name
             user.name = name
             user.notification_flag = notification_flag
             self.user_repository.update_user_settings(user)
+            self.invalidate_user_identity(user.google_id)
+            user_id_by_name_cache.pop(previous_name)
+            user_id_by_name_cache.pop(name)
             return {
                 'username': user.username,
                 'name': user.name,
@@ -128,19 +140,58 @@ class UserService:
             return user
         return None
 
-    def get_user_info_by_search_text(self, search_text: str, document_uid: str, user_id: int) -> List[dict]:
+    def find_user_ids_by_names(self, names: List[str]) -> Dict[str, int]:
         """
-        Retrieve detailed information about users by their name.
+        Resolve full names to user IDs, querying only the names not cached yet.
+
+        Names that cannot be found are not cached, so a user created later
+        under that name is found on the next call.
+
+        Args:
+            names (List[str]): The full names of the users, duplicates are fine.
+
+        Returns:
+            Dict[str, int]: The user ID of each name found.
+        """
+        user_ids = {}
+        missing = []
+        for name in set(names):
+            user_id = user_id_by_name_cache.get(name)
+            if user_id is None:
+                missing.append(name)
+            else:
+                user_ids[name] = user_id
+        if missing:
+            found = self.user_repository.find_user_ids_by_names(missing)
+            for name, user_id in found.items():
+                user_id_by_name_cache.set(name, user_id)
+            user_ids.update(found)
+        return user_ids
+
+    def get_user_info_by_search_text(
+        self,
+        search_text: str,
+        document_uid: str,
+        user_id: int,
+        limit: int = 10
+    ) -> List[dict]:
+        """
+        Retrieve detailed information about the users a document can be shared with,
+        by the beginning of their username, name or mail.
 
         Args:
             search_text (str): search text to search for in the database.
+            document_uid (str): The document being shared, its owner is left out.
+            user_id (int): The ID of the user searching, left out of the results.
+            limit (int): The maximum number of users returned.
 
         Returns:
-            List[dict]: A list of dictionaries containing user details such as name, email, and profile picture URL.
+            List[dict]: A list of dictionaries containing user details such as name, email, and profile picture URL,
+                        best match first.
         """
-        document = self.document_repository.get_document_by_uid(document_uid)
+        document = self.document_repository.get_document_by_uid(document_uid) if document_uid else None
         user = self.user_repository.find_user_by_id(user_id)
-        users = self.user_repository.find_users_by_search_text(search_text, document, user)
+        users = self.user_repository.find_users_by_search_text(search_text, document, user, limit)
         return [{
                 "name": user.name,
                 "username": user.username,
@@ -148,14 +199,50 @@ class UserService:
             } for user in users
         ]
 
-    def get_user_by_google_id(self, google_id: str) -> Optional[User]:
+    def reindex_users(self, batch_size: int = 500) -> int:
         """
-        Retrieve a user by their Google ID.
+        Rebuild the autocomplete tokens of every user, e.g. after the index was created.
+
+        Returns:
+            int: The number of users indexed.
+        """
+        indexed = 0
+        last_id = 0
+        while True:
+            users = self.user_repository.get_users_after(last_id, batch_size)
+            if not users:
+                return indexed
+            self.user_repository.index_users(users)
+            indexed += len(users)
+            last_id = users[-1].id
+
+    def get_user_by_google_id(self, google_id: str) -> Optional[UserIdentity]:
+        """
+        Retrieve the identity of a user by their Google ID.
+
+        The identity is memoized for the current request and cached across
+        requests for a few minutes, so authenticated requests usually resolve
+        the caller without a query. Unknown Google IDs are never cached.
 
         Args:
             google_id (str): The Google ID of the user to retrieve.
 
         Returns:
-            Optional[User]: The user object if found, otherwise None.
+            Optional[UserIdentity]: The identity of the user if found, otherwise None.
         """
-        return self.user_repository.find_user_by_google_id(google_id)
+        request_memo = g.setdefault('user_identities', {}) if has_app_context() else {}
+        identity = request_memo.get(google_id) or user_identity_cache.get(google_id)
+        if identity is None:
+            user = self.user_repository.find_user_by_google_id(google_id)
+            if user is None:
+                return None
+            identity = UserIdentity.from_user(user)
+            user_identity_cache.set(google_id, identity)
+        request_memo[google_id] = identity
+        return identity
+
+    def invalidate_user_identity(self, google_id: str) -> None:
+        """Drop the cached identity of a user after their fields change."""
+        user_identity_cache.pop(google_id)
+        if has_app_context():
+            g.setdefault('user_identities', {}).pop(google_id, None)
@@ -0,0 +1,51 @@
+import fakeredis
+import pytest
+import redis
+from flask import Flask
+from sqlalchemy import event
+from model.base_model import db
+from repo.document_repo import document_mode_cache
+from repo.lookup import lookup_registry
+from service.audit_service import audit_result_cache
+from service.search_service import index_stats_cache
+from service.user_service import user_id_by_name_cache, user_identity_cache
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # process-wide caches would otherwise leak rows between the in-memory databases of tests
+    user_identity_cache.clear()
+    user_id_by_name_cache.clear()
+    document_mode_cache.clear()
+    index_stats_cache.clear()
+    audit_result_cache.clear()
+    lookup_registry.invalidate()
+    yield
+
+@pytest.fixture
+def capture_statements(app: Flask):
+    """Call capture_statements(func) to get the result of func and the SQL statements it executed.
+
+    func runs in the app context of the caller, if any, e.g. inside a request
+    of the test client.
+    """
+    with app.app_context():
+        engine = db.engine
+
+    def capture(func):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            result = func()
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return result, statements
+    return capture
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    # in-process Redis with Lua support, so the lease scripts really run
+    monkeypatch.setattr(redis, 'Redis', fakeredis.FakeRedis)
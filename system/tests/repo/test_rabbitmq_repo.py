@@ -0,0 +1,140 @@
+import json
+import threading
+import pika
+import pytest
+from flask import Flask
+from unittest.mock import MagicMock, patch
+from repo.rabbitmq_repo import RabbitMQPubliser
+
+@pytest.fixture(autouse=True)
+def rabbitmq_env(monkeypatch):
+    monkeypatch.setenv("RABBITMQ_HOST", "rabbitmq")
+    monkeypatch.setenv("RABBITMQ_EMAIL_QUEUE", "email")
+
+class FakeChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.is_open = True
+        self.declared = []
+
+    def confirm_delivery(self):
+        pass
+
+    def queue_declare(self, queue, durable):
+        self.declared.append((queue, durable))
+
+    def basic_publish(self, exchange, routing_key, body, properties, mandatory):
+        if self.connection.broken:
+            raise pika.exceptions.StreamLostError("Connection reset")
+        self.connection.broker.setdefault(routing_key, []).append(body)
+
+
+class FakeConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.broken = False
+        self.is_open = True
+        self.fake_channel = FakeChannel(self)
+
+    def channel(self):
+        return self.fake_channel
+
+    def process_data_events(self, time_limit):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+@pytest.fixture
+def connections():
+    return []
+
+@pytest.fixture
+def publisher(connections):
+    broker = {}
+
+    def connect():
+        connections.append(FakeConnection(broker))
+        return connections[-1]
+
+    publisher = RabbitMQPubliser(pool_size=2, connection_factory=connect)
+    publisher.broker = broker
+    # logging of the publisher goes through current_app
+    with Flask(__name__).app_context():
+        yield publisher
+
+def test_send_message_is_durable_and_confirmed():
+    with patch('repo.rabbitmq_repo.pika.BlockingConnection') as mock_connection:
+        channel = mock_connection.return_value.channel.return_value
+
+        RabbitMQPubliser().send_message_to_queue("email", {"title": "Title", "recipient": "a@example.com"})
+
+        channel.confirm_delivery.assert_called_once()
+        channel.queue_declare.assert_called_once_with(queue="email", durable=True)
+        kwargs = channel.basic_publish.call_args.kwargs
+        assert kwargs["routing_key"] == "email"
+        assert json.loads(kwargs["body"]) == {"title": "Title", "recipient": "a@example.com"}
+        assert kwargs["properties"].delivery_mode == pika.DeliveryMode.Persistent.value
+        assert kwargs["mandatory"] is True
+
+def test_publisher_reuses_channels_and_declares_once(publisher, connections):
+    for i in range(5):
+        publisher.send_message_to_queue("email", {"number": i})
+    assert publisher.send_messages_to_queue("email", ["a", "b"]) == 2
+
+    assert len(connections) == 1
+    assert connections[0].fake_channel.declared == [("email", True)]
+    assert publisher.broker["email"][-3:] == ['{"number": 4}', "a", "b"]
+
+def test_publisher_is_shared_by_threads(publisher, connections):
+    def send(thread):
+        for i in range(50):
+            publisher.send_message_to_queue("email", f"{thread}-{i}")
+
+    threads = [threading.Thread(target=send, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(publisher.broker["email"]) == 400
+    assert len(set(publisher.broker["email"])) == 400
+    assert len(connections) <= 2
+
+def test_publisher_reconnects_without_sending_twice(publisher, connections):
+    publisher.send_message_to_queue("email", "first")
+    connections[0].broken = True
+    publisher.send_messages_to_queue("email", ["second", "third"])
+
+    assert publisher.broker["email"] == ["first", "second", "third"]
+    assert len(connections) == 2
+    assert not connections[0].is_open
+    # the queue is declared again on the new connection
+    assert connections[1].fake_channel.declared == [("email", True)]
+
+def test_email_consumer_acknowledges_after_sending():
+    from email_notification_system.main import NotificationService
+
+    service = NotificationService()
+    service.email_repo = MagicMock()
+    service.email_repo.send.side_effect = [None, Exception("SMTP is down"), Exception("SMTP is down")]
+    with patch('email_notification_system.main.pika.BlockingConnection') as mock_connection:
+        channel = mock_connection.return_value.channel.return_value
+        service.start_consuming()
+    channel.queue_declare.assert_called_once_with(queue="email", durable=True)
+    assert channel.basic_consume.call_args.kwargs["auto_ack"] is False
+    callback = channel.basic_consume.call_args.kwargs["on_message_callback"]
+
+    body = json.dumps({"recipient": "a@example.com", "title": "Title", "content": "Content"})
+    callback(channel, MagicMock(delivery_tag=1, redelivered=False), None, body)
+    channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    # a failed email is retried once, then dropped
+    callback(channel, MagicMock(delivery_tag=2, redelivered=False), None, body)
+    channel.basic_nack.assert_called_with(delivery_tag=2, requeue=True)
+    callback(channel, MagicMock(delivery_tag=3, redelivered=True), None, body)
+    channel.basic_nack.assert_called_with(delivery_tag=3, requeue=False)
+
+    callback(channel, MagicMock(delivery_tag=4, redelivered=False), None, "not json")
+    channel.basic_nack.assert_called_with(delivery_tag=4, requeue=False)
+    assert channel.basic_ack.call_count == 1
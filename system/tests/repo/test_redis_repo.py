@@ -0,0 +1,46 @@
+import pytest
+from repo.RedisRepo import RedisRepo
+
+@pytest.fixture
+def redis_repo(fake_redis):
+    repo = RedisRepo(host='lease-test')
+    repo.redis.flushall()
+    return repo
+
+def test_acquire_lease(redis_repo):
+    assert redis_repo.acquire_lease("lease:doc1", "alice", 60000) == (True, 1, "alice")
+    assert redis_repo.get_lease("lease:doc1") == (1, "alice")
+    assert 0 < redis_repo.redis.pttl("lease:doc1") <= 60000
+
+def test_acquire_lease_held_by_other(redis_repo):
+    redis_repo.acquire_lease("lease:doc1", "alice", 60000)
+    assert redis_repo.acquire_lease("lease:doc1", "bob", 60000) == (False, 1, "alice")
+    assert redis_repo.get_lease("lease:doc1") == (1, "alice")
+
+def test_acquire_lease_again_keeps_token(redis_repo):
+    redis_repo.acquire_lease("lease:doc1", "alice", 1000)
+    assert redis_repo.acquire_lease("lease:doc1", "alice", 60000) == (True, 1, "alice")
+    assert redis_repo.redis.pttl("lease:doc1") > 1000
+
+def test_fencing_token_increases_when_lease_changes_hands(redis_repo):
+    redis_repo.acquire_lease("lease:doc1", "alice", 60000)
+    # lease expires
+    redis_repo.redis.delete("lease:doc1")
+    assert redis_repo.acquire_lease("lease:doc1", "bob", 60000) == (True, 2, "bob")
+    # stale holder can neither renew nor release the new lease
+    assert redis_repo.renew_lease("lease:doc1", "alice", 1, 60000) is False
+    assert redis_repo.release_lease("lease:doc1", "alice", 1) is False
+    assert redis_repo.get_lease("lease:doc1") == (2, "bob")
+
+def test_renew_lease(redis_repo):
+    redis_repo.acquire_lease("lease:doc1", "alice", 1000)
+    assert redis_repo.renew_lease("lease:doc1", "alice", 1, 60000) is True
+    assert redis_repo.redis.pttl("lease:doc1") > 1000
+    assert redis_repo.renew_lease("lease:doc1", "alice", 2, 60000) is False
+
+def test_release_lease(redis_repo):
+    redis_repo.acquire_lease("lease:doc1", "alice", 60000)
+    assert redis_repo.release_lease("lease:doc1", "bob", 1) is False
+    assert redis_repo.release_lease("lease:doc1", "alice", 1) is True
+    assert redis_repo.get_lease("lease:doc1") is None
+    assert redis_repo.release_lease("lease:doc1", "alice", 1) is False
@@ -6,9 +6,10 @@ from repo.user_repo import UserRepository
 
 # Setup the application context and test client if using Flask or similar framework
 @pytest.fixture
-def user_repository():
-    # Mock the SQLAlchemy session
-    db.session = MagicMock()
+def user_repository(monkeypatch):
+    # Mock the SQLAlchemy session and query, restored after each test
+    monkeypatch.setattr(db, 'session', MagicMock())
+    monkeypatch.setattr(User, 'query', MagicMock())
     return UserRepository()
 
 def test_find_user_by_username(user_repository):
@@ -0,0 +1,253 @@
+import re
+import smtplib
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from datetime import datetime
+from model.base_model import db
+from model.user_model import User
+from model.document_model import Document
+from model.audit_model import Audit, AuditCounter, AuditStatus
+from controller.audit.routes import audit
+from repo.audit_repo import AuditRepository
+from repo.document_repo import DocumentRepository
+from service.audit_service import AuditService
+from service.document_service import DocumentService
+from service.notification_service import NotificationService
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            User(id=1, username="ownerUsername", name="Owner Name", mail="owner@gmail.com", google_id="google_id_owner"),
+            User(id=2, username="auditorUsername", name="Auditor Name", mail="auditor@gmail.com", google_id="google_id_auditor"),
+            AuditStatus(id=1, name="Approved"),
+            AuditStatus(id=2, name="Rejected"),
+            AuditStatus(id=3, name="Pending"),
+            AuditStatus(id=4, name="Not Sent"),
+        ])
+        db.session.commit()
+    app.register_blueprint(audit, url_prefix='/api/audits')
+    return app
+
+@pytest.fixture
+def client(app: Flask) -> FlaskClient:
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['google_id'] = 'google_id_auditor'
+    return client
+
+def add_audits(count: int, offset: int = 0):
+    for i in range(offset, offset + count):
+        db.session.add(Document(
+            id=i + 1,
+            uid=f"doc{i + 1}",
+            name=f"Document {i + 1}",
+            body=f"Body of document {i + 1}",
+            owner_id=1,
+            document_status_id=1,
+        ))
+        # every third audit is approved, the others are pending
+        db.session.add(Audit(
+            uid=f"audit{i + 1}",
+            document_id=i + 1,
+            auditor_id=2,
+            audit_status_id=1 if i % 3 == 0 else 3,
+            created_date=datetime(2024, 5, 1, 0, 0, i),
+        ))
+    db.session.commit()
+
+def test_get_all_audits_query_count_is_constant(app: Flask, capture_statements):
+    audit_service = AuditService()
+    with app.app_context():
+        add_audits(3)
+        page, statements = capture_statements(lambda: audit_service.get_all_audits(2, 'created_date'))
+        assert len(page["documents"]) == 3
+        assert len(statements) == 1
+
+        add_audits(40, offset=3)
+        db.session.expunge_all()
+        page, statements = capture_statements(lambda: audit_service.get_all_audits(2, 'created_date'))
+        assert len(page["documents"]) == 43
+        assert len(statements) == 1
+        assert not re.search(r"\.body\b", statements[0])
+
+def test_get_audits(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_audits(2)
+    response = client.get('/api/audits')
+    assert response.status_code == 200
+    assert [(audit["auditUid"], audit["documentUid"], audit["name"], audit["status"], audit["auditor"])
+            for audit in response.json["documents"]] == [
+        ("audit1", "doc1", "Document 1", 1, "auditorUsername"),
+        ("audit2", "doc2", "Document 2", 3, "auditorUsername"),
+    ]
+    assert response.json["nextCursor"] is None
+
+def test_get_audits_by_status(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_audits(9)
+
+    uids = []
+    cursor = None
+    for _ in range(3):
+        query = '?status=3&limit=2' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get('/api/audits' + query)
+        assert response.status_code == 200
+        uids.extend(audit["auditUid"] for audit in response.json["documents"])
+        cursor = response.json["nextCursor"]
+    assert uids == ["audit2", "audit3", "audit5", "audit6", "audit8", "audit9"]
+    assert cursor is None
+
+@pytest.mark.parametrize("query", ["?status=pending", "?limit=0", "?sort=unknown", "?sort=rejected_reason",
+                                   "?cursor=eyJ2IjpudWxsLCJpZCI6MX0="])
+def test_get_audits_invalid_args(client: FlaskClient, query: str):
+    response = client.get('/api/audits' + query)
+    assert response.status_code == 400
+    assert "error" in response.json
+
+def test_audit_counts_follow_audit_writes(app: Flask, client: FlaskClient):
+    audit_service = AuditService()
+    with app.app_context():
+        db.session.add(User(id=3, username="quietAuditor", name="Quiet Auditor", mail="quiet@gmail.com",
+                            google_id="google_id_quiet", notification_flag=False))
+        db.session.commit()
+        add_audits(3)
+        for i in range(4, 7):
+            db.session.add(Document(id=i, uid=f"doc{i}", name=f"Document {i}", owner_id=1, document_status_id=1))
+        db.session.commit()
+        # counts of the audits added above, which did not go through the repository
+        audit_service.rebuild_audit_counts()
+
+        for uid in ("doc4", "doc5", "doc6"):
+            audit_service.create_audit(uid, "quietAuditor")
+        audit_service.submit_audit_result("doc4", 1, None)
+        audit_service.submit_audit_result("doc5", 2, "Too short")
+        DocumentService().reset_audit_status(Document.query.filter_by(uid="doc6").one())
+        # reassigning the audit of doc1 moves it to the other auditor, as pending
+        audit_service.create_audit("doc1", "quietAuditor")
+        DocumentRepository().delete_document(Document.query.filter_by(uid="doc2").one())
+
+        assert audit_service.get_audit_counts(3) == {
+            "auditor": {"pending": 1, "approved": 1, "rejected": 1, "notSent": 1},
+            "owner": {"pending": 0, "approved": 0, "rejected": 0, "notSent": 0},
+        }
+        assert audit_service.get_audit_counts(1)["owner"] == {"pending": 2, "approved": 1, "rejected": 1, "notSent": 1}
+        counts = {(c.user_id, c.role, c.audit_status_id): c.count for c in AuditCounter.query}
+
+        # the maintained counts match a recount
+        audit_service.rebuild_audit_counts()
+        assert {(c.user_id, c.role, c.audit_status_id): c.count for c in AuditCounter.query if c.count} == \
+            {key: count for key, count in counts.items() if count}
+
+    response = client.get('/api/audits/counts')
+    assert response.status_code == 200
+    assert response.json["auditor"] == {"pending": 1, "approved": 0, "rejected": 0, "notSent": 0}
+
+def test_bulk_audit_assignment(app: Flask, client: FlaskClient, capture_statements):
+    audit_service = AuditService()
+    published = []
+    audit_service.notification_service.publish_many_to_queue = lambda third_party, messages: published.extend(messages)
+    with app.app_context():
+        db.session.add(User(id=3, username="secondAuditor", name="Second Auditor", mail="second@gmail.com",
+                            google_id="google_id_second"))
+        db.session.add(User(id=4, username="quietAuditor", name="Quiet Auditor", mail="quiet@gmail.com",
+                            google_id="google_id_quiet", notification_flag=False))
+        add_audits(1)
+        for i in range(2, 31):
+            db.session.add(Document(id=i, uid=f"doc{i}", name=f"Document {i}", owner_id=1, document_status_id=1))
+        db.session.commit()
+        audit_service.rebuild_audit_counts()
+        db.session.expunge_all()
+
+        # doc1 already has an approved audit, which is reassigned
+        usernames = ["auditorUsername", "secondAuditor", "quietAuditor"]
+        assignments = [
+            {"documentUid": f"doc{i}", "auditorUsername": usernames[i % 3]}
+            for i in range(1, 31)
+        ]
+        audits, statements = capture_statements(lambda: audit_service.create_audits(assignments))
+        assert [audit["documentUid"] for audit in audits] == [f"doc{i}" for i in range(1, 31)]
+        assert audits[0]["auditUid"] == "audit1"
+        assert Audit.query.filter_by(audit_status_id=3).count() == 30
+        # lookups, inserts, updates and counters do not grow with the number of assignments
+        assert len(statements) < 15
+
+        # one message per auditor, none for the auditor who turned notifications off
+        assert sorted(message["recipient"] for message in published) == ["auditor@gmail.com", "second@gmail.com"]
+        message = next(message for message in published if message["recipient"] == "second@gmail.com")
+        assert message["title"] == "You Have 10 New Audit Tasks!"
+        assert "- Document 1\n" in message["content"] and "- Document 28\n" in message["content"]
+
+        assert audit_service.get_audit_counts(1)["owner"] == {"pending": 30, "approved": 0, "rejected": 0, "notSent": 0}
+        assert audit_service.get_audit_counts(4)["auditor"]["pending"] == 10
+        counts = {(c.user_id, c.role, c.audit_status_id): c.count for c in AuditCounter.query if c.count}
+        audit_service.rebuild_audit_counts()
+        assert {(c.user_id, c.role, c.audit_status_id): c.count for c in AuditCounter.query if c.count} == counts
+
+def test_bulk_audit_assignment_is_all_or_nothing(app: Flask, client: FlaskClient):
+    with app.app_context():
+        for i in range(1, 3):
+            db.session.add(Document(id=i, uid=f"doc{i}", name=f"Document {i}", owner_id=1, document_status_id=1))
+        db.session.commit()
+
+    response = client.post('/api/audits/bulk', json={"assignments": [
+        {"documentUid": "doc1", "auditorUsername": "auditorUsername"},
+        {"documentUid": "missing", "auditorUsername": "auditorUsername"},
+        {"documentUid": "doc2", "auditorUsername": "nobody"},
+        {"documentUid": "doc1", "auditorUsername": "auditorUsername"},
+    ]})
+    assert response.status_code == 400
+    assert response.json["error"] == (
+        "Can't find document by UID: missing; Can't find user by username: nobody; "
+        "Document doc1 is assigned more than once"
+    )
+    with app.app_context():
+        assert Audit.query.count() == 0
+
+    response = client.post('/api/audits/bulk', json={"assignments": []})
+    assert response.status_code == 422
+
+def test_audit_emails_are_published_to_the_queue(app: Flask, monkeypatch):
+    published = []
+    monkeypatch.setattr(NotificationService, 'publisher_to_queue', lambda self, **message: published.append(message))
+    monkeypatch.setattr(NotificationService, 'publish_many_to_queue',
+                        lambda self, third_party, messages: published.extend({"third_party": third_party, **message}
+                                                                             for message in messages))
+    monkeypatch.setattr(smtplib, 'SMTP', None)
+    with app.app_context():
+        db.session.add(Document(id=1, uid="doc1", name="Document 1", owner_id=1, document_status_id=1))
+        db.session.commit()
+
+        assert AuditService().create_audit("doc1", "auditorUsername") is not None
+        assert DocumentService().document_reminder("doc1")
+    assert [(message["third_party"], message["recipient"]) for message in published] == [
+        ("email", "auditor@gmail.com"),
+        ("email", "auditor@gmail.com"),
+    ]
+    assert "- Document 1\n" in published[0]["content"]
+
+def test_concurrent_audit_submits_move_counts_once(app: Flask):
+    audit_service = AuditService()
+    with app.app_context():
+        add_audits(2)
+        audit_service.rebuild_audit_counts()
+        audit = Audit.query.filter_by(uid="audit2").one()
+        # both submits read the audit while it was pending
+        pending = SimpleNamespace(id=audit.id, document_id=audit.document_id, auditor_id=2, audit_status_id=3)
+        audit_service.audit_repo.get_audit_by_document_uid = lambda document_uid: pending
+
+        assert audit_service.submit_audit_result("doc2", 1, None) is True
+        assert audit_service.submit_audit_result("doc2", 2, "Too late") is False
+        assert db.session.get(Audit, audit.id).audit_status_id == 1
+        assert audit_service.get_audit_counts(2)["auditor"] == {"pending": 0, "approved": 2, "rejected": 0, "notSent": 0}
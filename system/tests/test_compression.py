@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime
+from flask import Flask
+from sqlalchemy import LargeBinary, select, type_coerce, update
+from model.base_model import db
+from model.compression import ZLIB_HEADER, compress_text, decompress_text
+from model.user_model import User
+from model.document_model import Document
+from repo.document_repo import DocumentRepository
+
+LONG_BODY = "<p>" + "All work and no play makes Jack a dull boy. " * 100 + "</p>"
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="owner", name="Owner", mail="owner@gmail.com", google_id="google_id_owner"))
+        db.session.add(Document(id=1, uid="doc1", name="Long", body=LONG_BODY, owner_id=1, document_status_id=1))
+        db.session.add(Document(id=2, uid="doc2", name="Short", body="<p>short</p>", owner_id=1, document_status_id=1))
+        db.session.add(Document(id=3, uid="doc3", name="Empty", body=None, owner_id=1, document_status_id=1))
+        db.session.commit()
+    yield app
+
+def raw_body(document_id: int) -> bytes:
+    raw = type_coerce(Document.body, LargeBinary)
+    return db.session.execute(select(raw).where(Document.id == document_id)).scalar_one()
+
+@pytest.mark.parametrize("text", ["", "short", "\x00starts with NUL", LONG_BODY, "ünïcödé " * 200])
+def test_compress_text_round_trip(text):
+    assert decompress_text(compress_text(text)) == text
+
+def test_short_text_is_stored_plain():
+    assert compress_text("<p>short</p>") == b"<p>short</p>"
+    assert compress_text(LONG_BODY).startswith(ZLIB_HEADER)
+    assert len(compress_text(LONG_BODY)) < len(LONG_BODY) / 10
+
+def test_body_is_stored_compressed(app: Flask):
+    with app.app_context():
+        assert raw_body(1).startswith(ZLIB_HEADER)
+        assert raw_body(2) == b"<p>short</p>"
+        assert raw_body(3) is None
+        db.session.expire_all()
+        assert db.session.get(Document, 1).body == LONG_BODY
+        assert db.session.get(Document, 2).body == "<p>short</p>"
+        assert db.session.get(Document, 3).body is None
+
+def test_compress_document_bodies(app: Flask):
+    with app.app_context():
+        # a body written while the column held plain text
+        legacy = type_coerce(LONG_BODY.encode('utf-8'), LargeBinary)
+        edited = datetime(2020, 1, 2, 3, 4, 5)
+        db.session.execute(update(Document).where(Document.id == 1).values(body=legacy, updated_date=edited))
+        db.session.commit()
+        db.session.expire_all()
+        assert raw_body(1) == LONG_BODY.encode('utf-8')
+        assert db.session.get(Document, 1).body == LONG_BODY
+
+        assert DocumentRepository().compress_document_bodies(batch_size=1) == 1
+        assert raw_body(1).startswith(ZLIB_HEADER)
+        assert raw_body(2) == b"<p>short</p>"
+        db.session.expire_all()
+        assert db.session.get(Document, 1).body == LONG_BODY
+        # rewriting the stored bytes is not an edit
+        assert db.session.get(Document, 1).updated_date == edited
+
+        assert DocumentRepository().compress_document_bodies() == 0
@@ -0,0 +1,449 @@
+import gzip
+import json
+import pytest
+import redis
+from flask import Flask
+from flask.testing import FlaskClient
+from model.base_model import db
+from model.user_model import User
+from model.document_model import Document, DocumentComment
+from model.audit_model import Audit, AuditStatus
+from controller.document import routes as document_routes
+from controller.document.routes import documents
+from repo.document_repo import DocumentRepository
+from repo.lookup import lookup_registry
+from service.lease_service import EditLeaseService
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        owner = User(
+            id=1,
+            username="ownerUsername",
+            name="Owner Name",
+            mail="owner@gmail.com",
+            google_id="google_id_owner",
+        )
+        document = Document(
+            id=1,
+            uid="doc1",
+            name="Document 1",
+            body="Body of document 1",
+            owner_id=1,
+            document_status_id=1,
+        )
+        db.session.add_all([owner, document])
+        db.session.commit()
+    app.register_blueprint(documents, url_prefix='/api/documents')
+    return app
+
+@pytest.fixture(autouse=True)
+def lease_service(monkeypatch, fake_redis):
+    lease_service = EditLeaseService()
+    lease_service.redis_repo.redis.flushall()
+    monkeypatch.setattr(document_routes.document_service, 'lease_service', lease_service)
+    return lease_service
+
+@pytest.fixture
+def client(app: Flask) -> FlaskClient:
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['google_id'] = 'google_id_owner'
+    return client
+
+def add_comments(count: int, offset: int = 0):
+    for i in range(offset, offset + count):
+        commenter = User(
+            id=100 + i,
+            username=f"commenter{i}",
+            name=f"Commenter {i}",
+            mail=f"commenter{i}@gmail.com",
+            google_id=f"google_id_{i}",
+        )
+        comment = DocumentComment(
+            inline_id=f"inline{i}",
+            document_id=1,
+            text=f"Comment {i}",
+            commenter_id=100 + i,
+        )
+        db.session.add_all([commenter, comment])
+    db.session.commit()
+
+def test_get_document_comments(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_comments(2)
+    response = client.get('/api/documents/doc1')
+    assert response.status_code == 200
+    assert response.json["comments"] == [
+        {"inlineId": "inline0", "text": "Comment 0", "commentor": {"name": "Commenter 0"}},
+        {"inlineId": "inline1", "text": "Comment 1", "commentor": {"name": "Commenter 1"}},
+    ]
+
+def test_get_document_commenters_are_loaded_in_bulk(app: Flask, client: FlaskClient, capture_statements):
+    with app.app_context():
+        add_comments(2)
+    # warm up the caller identity cache, so both requests issue the same lookups
+    client.get('/api/documents/doc1')
+    response, few_comments_statements = capture_statements(lambda: client.get('/api/documents/doc1'))
+    assert len(response.json["comments"]) == 2
+
+    with app.app_context():
+        add_comments(30, offset=2)
+    response, many_comments_statements = capture_statements(lambda: client.get('/api/documents/doc1'))
+    assert len(response.json["comments"]) == 32
+
+    assert len(many_comments_statements) == len(few_comments_statements)
+
+def test_get_document_is_read_only(app: Flask, client: FlaskClient, capture_statements):
+    response, statements = capture_statements(lambda: client.get('/api/documents/doc1'))
+    assert response.status_code == 200
+    assert response.json["otherIsEditting"] is False
+    assert all(statement.startswith('SELECT') for statement in statements)
+
+class UnreachableRedisRepo:
+    def get_lease(self, key):
+        raise redis.ConnectionError("Connection refused")
+
+    def acquire_lease(self, key, holder, ttl_ms):
+        raise redis.ConnectionError("Connection refused")
+
+    def renew_lease(self, key, holder, token, ttl_ms):
+        raise redis.ConnectionError("Connection refused")
+
+    def release_lease(self, key, holder, token):
+        raise redis.ConnectionError("Connection refused")
+
+def test_get_document_without_redis(client: FlaskClient, monkeypatch):
+    monkeypatch.setattr(
+        document_routes.document_service,
+        'lease_service',
+        EditLeaseService(redis_repo=UnreachableRedisRepo())
+    )
+    response = client.get('/api/documents/doc1')
+    assert response.status_code == 200
+    assert response.json["otherIsEditting"] is False
+
+def test_lock_session_without_redis(client: FlaskClient, monkeypatch, lease_service: EditLeaseService):
+    assert client.post('/api/documents/doc1/lock-session').status_code == 200
+
+    monkeypatch.setattr(
+        document_routes.document_service,
+        'lease_service',
+        EditLeaseService(redis_repo=UnreachableRedisRepo())
+    )
+    for request in (client.post, client.put, client.delete):
+        response = request('/api/documents/doc1/lock-session')
+        assert response.status_code == 503
+        assert response.json == {"state": "unavailable"}
+
+    # the lease can still be released once Redis is back
+    monkeypatch.setattr(document_routes.document_service, 'lease_service', lease_service)
+    assert client.delete('/api/documents/doc1/lock-session').status_code == 200
+
+def test_acquire_lock_session(app: Flask, client: FlaskClient, lease_service: EditLeaseService):
+    other_client = app.test_client()
+    with other_client.session_transaction() as session:
+        session['google_id'] = 'google_id_owner'
+
+    response = client.post('/api/documents/doc1/lock-session')
+    assert response.status_code == 200
+    assert response.json["state"] == "true"
+    assert response.json["fencingToken"] == 1
+    assert lease_service.get("doc1").token == 1
+
+    # the lock holder can take the lock again and keeps seeing the document as free
+    assert client.post('/api/documents/doc1/lock-session').status_code == 200
+    assert client.get('/api/documents/doc1').json["otherIsEditting"] is False
+
+    # another session reads the document but cannot take the lock
+    assert other_client.get('/api/documents/doc1').json["otherIsEditting"] is True
+    response = other_client.post('/api/documents/doc1/lock-session')
+    assert response.status_code == 409
+
+    # only the holder can renew and release the lease
+    assert other_client.put('/api/documents/doc1/lock-session').status_code == 400
+    assert other_client.delete('/api/documents/doc1/lock-session').status_code == 400
+    assert client.put('/api/documents/doc1/lock-session').status_code == 200
+    assert client.delete('/api/documents/doc1/lock-session').status_code == 200
+    assert client.delete('/api/documents/doc1/lock-session').status_code == 400
+
+    response = other_client.post('/api/documents/doc1/lock-session')
+    assert response.status_code == 200
+    assert response.json["fencingToken"] == 2
+
+def test_acquire_lock_session_document_not_found(client: FlaskClient):
+    response = client.post('/api/documents/not_exist/lock-session')
+    assert response.status_code == 400
+
+def test_patch_document(app: Flask, client: FlaskClient):
+    response = client.get('/api/documents/doc1')
+    assert response.json["version"] == 1
+
+    response = client.patch('/api/documents/doc1', json={
+        "baseVersion": 1,
+        "ops": [{"retain": 8}, {"delete": 10}, {"insert": "the first document"}],
+    })
+    assert response.status_code == 200
+    assert response.json == {"state": "true", "version": 2}
+
+    response = client.get('/api/documents/doc1')
+    assert response.json["body"] == "Body of the first document"
+    assert response.json["version"] == 2
+    with app.app_context():
+        document = db.session.get(Document, 1)
+        assert document.snippet == "Body of the first document"
+        assert document.body_size == len("Body of the first document")
+
+def test_patch_document_rejects_stale_version(client: FlaskClient):
+    response = client.patch('/api/documents/doc1', json={"baseVersion": 1, "ops": [{"insert": "A "}]})
+    assert response.status_code == 200
+
+    response = client.patch('/api/documents/doc1', json={"baseVersion": 1, "ops": [{"insert": "B "}]})
+    assert response.status_code == 409
+    assert response.json == {"state": "conflict", "version": 2}
+
+    # a full save moves the version as well
+    assert client.put('/api/documents/doc1', json={"body": "New body", "comments": []}).status_code == 200
+    response = client.patch('/api/documents/doc1', json={"baseVersion": 2, "ops": [{"insert": "C "}]})
+    assert response.status_code == 409
+    assert response.json["version"] == 3
+    assert client.get('/api/documents/doc1').json["body"] == "New body"
+
+def test_patch_document_invalid_ops(client: FlaskClient):
+    response = client.patch('/api/documents/doc1', json={"baseVersion": 1, "ops": [{"retain": 100}]})
+    assert response.status_code == 400
+    response = client.patch('/api/documents/doc1', json={"ops": []})
+    assert response.status_code == 422
+    response = client.patch('/api/documents/not_exist', json={"baseVersion": 1, "ops": []})
+    assert response.status_code == 400
+
+def test_get_document_not_modified(app: Flask, client: FlaskClient, capture_statements):
+    response = client.get('/api/documents/doc1')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    response, statements = capture_statements(
+        lambda: client.get('/api/documents/doc1', headers={'If-None-Match': etag})
+    )
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.data == b''
+    # answered from the version lookup, the document itself is not loaded
+    assert not any('document.body' in statement for statement in statements)
+
+def test_get_document_etag_changes(app: Flask, client: FlaskClient):
+    etag = client.get('/api/documents/doc1').headers['ETag']
+
+    client.patch('/api/documents/doc1', json={"baseVersion": 1, "ops": [{"insert": "A "}]})
+    response = client.get('/api/documents/doc1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json["body"] == "A Body of document 1"
+    etag = response.headers['ETag']
+
+    with app.app_context():
+        add_comments(1)
+    response = client.get('/api/documents/doc1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.json["comments"]) == 1
+    etag = response.headers['ETag']
+
+    # another session starts editing
+    other_client = app.test_client()
+    with other_client.session_transaction() as session:
+        session['google_id'] = 'google_id_owner'
+    other_client.post('/api/documents/doc1/lock-session')
+    response = client.get('/api/documents/doc1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json["otherIsEditting"] is True
+
+def test_get_document_not_found_has_no_etag(client: FlaskClient):
+    response = client.get('/api/documents/not_exist', headers={'If-None-Match': '*'})
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
+
+def test_update_document_comments_in_bulk(app: Flask, capture_statements):
+    document_repo = DocumentRepository()
+    with app.app_context():
+        add_comments(30)
+    comments = [
+        {"inline_id": f"inline{i}", "text": f"Comment {i}", "commentor_id": 100 + i, "document_id": 1}
+        for i in range(30)
+    ]
+
+    with app.app_context():
+        # nothing changed: one lookup, no writes
+        result, statements = capture_statements(lambda: document_repo.update_document_comments(1, comments))
+        assert result is True
+        assert len(statements) == 1 and statements[0].startswith('SELECT')
+
+        comments[3]["text"] = "Edited comment 3"
+        comments[7]["commentor_id"] = 101
+        comments.append({"inline_id": "inline_new", "text": "New comment", "commentor_id": 100, "document_id": 1})
+        comments.append({"inline_id": None, "text": "Comment without inline id", "commentor_id": 100, "document_id": 1})
+        result, statements = capture_statements(lambda: document_repo.update_document_comments(1, comments))
+        assert result is True
+        assert [statement.split()[0] for statement in statements] == ['SELECT', 'UPDATE', 'INSERT']
+
+        saved = {comment.inline_id: comment for comment in DocumentComment.query.filter_by(document_id=1)}
+        assert len(saved) == 32
+        assert saved["inline3"].text == "Edited comment 3"
+        assert saved["inline7"].commenter_id == 101
+        assert saved["inline_new"].text == "New comment"
+        assert saved[None].text == "Comment without inline id"
+
+def test_update_document_resolves_commentors_in_one_query(app: Flask, client: FlaskClient, capture_statements):
+    with app.app_context():
+        add_comments(3)
+    comments = [
+        {"inlineId": f"inline{i}", "text": f"Edited {i}", "commentor": {"name": f"Commenter {i % 3}"}}
+        for i in range(6)
+    ] + [{"inlineId": "inline6", "text": "By id", "commentor": {"id": 1}}]
+
+    response, statements = capture_statements(
+        lambda: client.put('/api/documents/doc1', json={"body": "Body", "comments": comments})
+    )
+    assert response.status_code == 200
+    assert len([statement for statement in statements if 'FROM user' in statement and 'user.name IN' in statement]) == 1
+
+    # names resolved before come from the cache
+    response, statements = capture_statements(
+        lambda: client.put('/api/documents/doc1', json={"body": "Body 2", "comments": comments})
+    )
+    assert response.status_code == 200
+    assert not any('user.name IN' in statement for statement in statements)
+
+    saved = client.get('/api/documents/doc1').json["comments"]
+    assert {"inlineId": "inline6", "text": "By id", "commentor": {"name": "Owner Name"}} in saved
+    assert {"inlineId": "inline4", "text": "Edited 4", "commentor": {"name": "Commenter 1"}} in saved
+
+@pytest.mark.parametrize("commentor", [{"name": "Nobody"}, {"id": 999}])
+def test_update_document_unknown_commentor(client: FlaskClient, commentor: dict):
+    comments = [{"inlineId": "inline0", "text": "Comment", "commentor": commentor}]
+    response = client.put('/api/documents/doc1', json={"body": "New body", "comments": comments})
+    assert response.status_code == 400
+    # nothing is saved
+    assert client.get('/api/documents/doc1').json["body"] == "Body of document 1"
+
+def add_documents(count: int):
+    for i in range(count):
+        db.session.add(Document(
+            id=10 + i,
+            uid=f"export{i}",
+            name=f"Export {i}",
+            body=f"<p>Body {i}</p>" * 100,
+            owner_id=1,
+            document_status_id=1,
+        ))
+    db.session.commit()
+
+def test_export_documents(app: Flask, client: FlaskClient, monkeypatch):
+    # small chunks, so the export is sent in several parts
+    monkeypatch.setattr('service.document_service.EXPORT_CHUNK_SIZE', 4096)
+    with app.app_context():
+        add_documents(50)
+
+    response = client.get('/api/documents/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert not response.is_sequence
+    lines = response.get_data().decode('utf-8').splitlines()
+    documents = [json.loads(line) for line in lines]
+    assert [document["uid"] for document in documents] == ["doc1"] + [f"export{i}" for i in range(50)]
+    assert documents[1]["body"] == "<p>Body 0</p>" * 100
+    assert documents[1]["status"] == 2
+
+def test_export_documents_gzip(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_documents(3)
+
+    response = client.get('/api/documents/export?compress=gzip')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+    assert [json.loads(line)["uid"] for line in lines] == ["doc1", "export0", "export1", "export2"]
+
+    assert client.get('/api/documents/export?compress=zip').status_code == 400
+
+def add_audit(audit_status_id: int):
+    db.session.add_all([
+        User(id=2, username="auditorUsername", name="Auditor Name", mail="auditor@gmail.com", google_id="google_id_auditor"),
+        AuditStatus(id=audit_status_id, name="Status"),
+        Audit(id=1, uid="audit1", document_id=1, auditor_id=2, audit_status_id=audit_status_id, rejected_reason="Too short"),
+    ])
+    db.session.commit()
+
+def test_get_audit_result_in_one_query(app: Flask, client: FlaskClient, capture_statements):
+    with app.app_context():
+        add_audit(2)
+        # loaded on startup
+        lookup_registry.load()
+    response, statements = capture_statements(lambda: client.get('/api/documents/doc1/audit-result'))
+    assert response.status_code == 200
+    assert response.json["auditStatus"] == 2
+    assert response.json["rejectedReason"] == "Too short"
+    assert response.json["auditor"] == {"userId": 2, "username": "auditorUsername", "name": "Auditor Name"}
+    assert "auditedTime" in response.json
+    # the version lookup, then the audit and its auditor in one query
+    assert len(statements) == 2
+    etag = response.headers['ETag']
+
+    # still current for the client, answered from the version lookup alone
+    response, statements = capture_statements(
+        lambda: client.get('/api/documents/doc1/audit-result', headers={'If-None-Match': etag})
+    )
+    assert response.status_code == 304
+    assert len(statements) == 1
+    assert 'audit.rejected_reason' not in statements[0]
+    assert 'user.username' not in statements[0]
+
+    # a new status is a new version
+    with app.app_context():
+        db.session.get(Audit, 1).audit_status_id = 1
+        db.session.commit()
+    response = client.get('/api/documents/doc1/audit-result', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_latest_audit_is_current(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_audit(1)
+        # sent to audit again after the first audit was approved
+        db.session.add_all([
+            AuditStatus(id=3, name="Pending"),
+            Audit(id=2, uid="audit2", document_id=1, auditor_id=2, audit_status_id=3),
+        ])
+        db.session.commit()
+    listed = client.get('/api/documents').json["documents"]
+    assert [document["auditStatus"] for document in listed] == [3]
+    assert client.get('/api/documents/doc1').json["auditStatus"] == 3
+    response = client.get('/api/documents/doc1/audit-result')
+    assert response.json["auditUid"] == "audit2"
+    assert response.json["auditStatus"] == 3
+
+def test_get_audit_result_after_writes(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_audit(3)
+        db.session.add(AuditStatus(id=1, name="Approved"))
+        db.session.commit()
+    response = client.get('/api/documents/doc1/audit-result')
+    assert response.json["auditStatus"] == 3
+    assert "auditedTime" not in response.json
+
+    response = client.post('/api/documents/doc1/audit-result', json={"auditStatus": 1, "rejectedReason": None})
+    assert response.status_code == 200
+    response = client.get('/api/documents/doc1/audit-result')
+    assert response.json["auditStatus"] == 1
+
+    # editing the document rolls its audit back to "Not Sent", which has no result
+    client.put('/api/documents/doc1', json={"body": "New body", "comments": []})
+    assert client.get('/api/documents/doc1/audit-result').status_code == 400
@@ -0,0 +1,187 @@
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from datetime import datetime
+from sqlalchemy import update
+from model.base_model import db
+from model.user_model import User
+from model.document_model import Document, DocumentPermission, DocumentPermissionType
+from model.audit_model import Audit, AuditStatus
+from controller.document.routes import documents
+from repo.document_repo import DocumentRepository
+from service.document_service import DocumentService
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        owner = User(
+            id=1,
+            username="ownerUsername",
+            name="Owner Name",
+            mail="owner@gmail.com",
+            google_id="google_id_owner",
+        )
+        reader = User(
+            id=2,
+            username="readerUsername",
+            name="Reader Name",
+            mail="reader@gmail.com",
+            google_id="google_id_reader",
+        )
+        db.session.add_all([
+            owner,
+            reader,
+            DocumentPermissionType(id=1, name="read"),
+            DocumentPermissionType(id=2, name="write"),
+            AuditStatus(id=1, name="Approved"),
+            AuditStatus(id=3, name="Pending"),
+        ])
+        db.session.commit()
+    app.register_blueprint(documents, url_prefix='/api/documents')
+    return app
+
+@pytest.fixture
+def client(app: Flask) -> FlaskClient:
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['google_id'] = 'google_id_reader'
+    return client
+
+def add_documents(count: int, offset: int = 0):
+    for i in range(offset, offset + count):
+        document = Document(
+            id=i + 1,
+            uid=f"doc{i + 1}",
+            name=f"Document {i + 1}",
+            body=f"Body of document {i + 1}",
+            owner_id=1,
+            document_status_id=1,
+            created_date=datetime(2024, 5, 1, 0, 0, i),
+        )
+        db.session.add(document)
+        # share every document with the reader, and every other one with the owner too
+        db.session.add(DocumentPermission(document_id=i + 1, user_id=2, document_permission_type_id=1))
+        if i % 2 == 0:
+            db.session.add(DocumentPermission(document_id=i + 1, user_id=1, document_permission_type_id=2))
+            db.session.add(Audit(uid=f"audit{i + 1}", document_id=i + 1, auditor_id=2, audit_status_id=3))
+    db.session.commit()
+
+def test_get_all_documents_query_count_is_constant(app: Flask, capture_statements):
+    document_service = DocumentService()
+    with app.app_context():
+        add_documents(3)
+        page, statements = capture_statements(lambda: document_service.get_all_documents(1, 'created_date'))
+        small_count = len(statements)
+        assert len(page["documents"]) == 3
+
+        add_documents(40, offset=3)
+        page, statements = capture_statements(lambda: document_service.get_all_documents(1, 'created_date'))
+        large_count = len(statements)
+        assert len(page["documents"]) == 43
+
+    assert small_count == 1
+    assert large_count == small_count
+
+def test_get_all_documents_does_not_load_body(app: Flask, capture_statements):
+    document_service = DocumentService()
+    with app.app_context():
+        db.session.add(Document(
+            id=1,
+            uid="doc1",
+            name="Document 1",
+            body="<h1>Title</h1><p>Fish &amp; chips</p>" + "<p>text</p>" * 100,
+            owner_id=1,
+            document_status_id=1,
+        ))
+        db.session.commit()
+        db.session.expunge_all()
+        page, statements = capture_statements(lambda: document_service.get_all_documents(1, 'created_date'))
+
+    assert len(statements) == 1
+    assert "document.body AS" not in statements[0]
+    assert page["documents"][0]["snippet"].startswith("Title Fish & chips text")
+    assert page["documents"][0]["size"] == 1137
+
+def test_backfill_document_summaries(app: Flask):
+    edited = datetime(2020, 1, 2, 3, 4, 5)
+    with app.app_context():
+        add_documents(3)
+        # documents stored before the summary columns existed
+        db.session.execute(update(Document).values(snippet=None, body_size=0, updated_date=edited))
+        db.session.commit()
+
+        assert DocumentRepository().backfill_document_summaries(batch_size=2) == 3
+        db.session.expire_all()
+        documents = Document.query.order_by(Document.id).all()
+        assert [(document.snippet, document.body_size) for document in documents] == [
+            ("Body of document 1", 18), ("Body of document 2", 18), ("Body of document 3", 18)
+        ]
+        # filling in derived columns is not an edit
+        assert [document.updated_date for document in documents] == [edited] * 3
+        assert DocumentRepository().backfill_document_summaries() == 0
+
+def test_get_all_documents_status(app: Flask):
+    document_service = DocumentService()
+    with app.app_context():
+        add_documents(2)
+        owner_docs = document_service.get_all_documents(1, 'created_date')["documents"]
+        reader_docs = document_service.get_all_documents(2, 'created_date')["documents"]
+
+    # owner sees each document once even when other users have permissions on it
+    assert [doc["uid"] for doc in owner_docs] == ["doc1", "doc2"]
+    assert [doc["status"] for doc in owner_docs] == [2, 2]
+    assert [doc["status"] for doc in reader_docs] == [1, 1]
+    assert [doc["auditStatus"] for doc in reader_docs] == [3, 4]
+
+def test_get_documents(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_documents(2)
+    response = client.get('/api/documents')
+    assert response.status_code == 200
+    assert response.json["documents"] == [
+        {"uid": "doc1", "name": "Document 1", "status": 1, "auditStatus": 3, "snippet": "Body of document 1", "size": 18},
+        {"uid": "doc2", "name": "Document 2", "status": 1, "auditStatus": 4, "snippet": "Body of document 2", "size": 18},
+    ]
+    assert response.json["nextCursor"] is None
+
+def test_get_documents_pagination(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_documents(7)
+
+    uids = []
+    cursor = None
+    for _ in range(3):
+        query = '?limit=3' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get('/api/documents' + query)
+        assert response.status_code == 200
+        uids.extend(doc["uid"] for doc in response.json["documents"])
+        cursor = response.json["nextCursor"]
+    assert uids == [f"doc{i}" for i in range(1, 8)]
+    assert cursor is None
+
+def test_get_documents_pagination_by_name(app: Flask, client: FlaskClient):
+    with app.app_context():
+        add_documents(3)
+
+    response = client.get('/api/documents?sort=name&limit=2')
+    assert [doc["uid"] for doc in response.json["documents"]] == ["doc1", "doc2"]
+    response = client.get(f'/api/documents?sort=name&limit=2&cursor={response.json["nextCursor"]}')
+    assert [doc["uid"] for doc in response.json["documents"]] == ["doc3"]
+    assert response.json["nextCursor"] is None
+
+# a cursor without sort value, and columns that may be NULL or too large for a cursor
+@pytest.mark.parametrize("query", ["?limit=0", "?limit=abc", "?cursor=notacursor", "?sort=unknown",
+                                   "?cursor=eyJ2IjpudWxsLCJpZCI6MX0=", "?sort=body", "?sort=snippet"])
+def test_get_documents_invalid_page_args(client: FlaskClient, query: str):
+    response = client.get('/api/documents' + query)
+    assert response.status_code == 400
+    assert "error" in response.json
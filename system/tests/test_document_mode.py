@@ -0,0 +1,112 @@
+import pytest
+from flask import Flask
+from model.base_model import db
+from model.user_model import User
+from model.document_model import Document, DocumentPermission
+from model.audit_model import Audit
+from repo.audit_repo import AuditRepository
+from repo.document_repo import DocumentRepository, document_mode_cache
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        for i in range(1, 4):
+            db.session.add(User(
+                id=i,
+                username=f"user{i}",
+                name=f"User {i}",
+                mail=f"user{i}@gmail.com",
+                google_id=f"google_id_{i}",
+            ))
+        for i in range(1, 5):
+            db.session.add(Document(id=i, uid=f"doc{i}", name=f"Document {i}", owner_id=1, document_status_id=1))
+        db.session.add(DocumentPermission(document_id=1, user_id=2, document_permission_type_id=1))
+        db.session.add(DocumentPermission(document_id=2, user_id=2, document_permission_type_id=2))
+        db.session.add(Audit(uid="audit3", document_id=3, auditor_id=2, audit_status_id=3))
+        db.session.commit()
+    yield app
+
+def test_get_document_mode(app: Flask):
+    document_repo = DocumentRepository()
+    with app.app_context():
+        owner, user = db.session.get(User, 1), db.session.get(User, 2)
+        documents = [db.session.get(Document, i) for i in range(1, 5)]
+        assert [document_repo.get_document_mode(owner, doc) for doc in documents] == [2, 2, 2, 2]
+        assert [document_repo.get_document_mode(user, doc) for doc in documents] == [1, 2, 3, None]
+
+def test_get_document_mode_is_cached(app: Flask, capture_statements):
+    document_repo = DocumentRepository()
+    with app.app_context():
+        user, document = db.session.get(User, 2), db.session.get(Document, 1)
+        mode, statements = capture_statements(lambda: document_repo.get_document_mode(user, document))
+        assert (mode, len(statements)) == (1, 2)
+        mode, statements = capture_statements(lambda: document_repo.get_document_mode(user, document))
+        assert (mode, len(statements)) == (1, 0)
+
+def test_permission_change_invalidates_document_mode(app: Flask):
+    document_repo = DocumentRepository()
+    with app.app_context():
+        user, document = db.session.get(User, 3), db.session.get(Document, 1)
+        assert document_repo.get_document_mode(user, document) is None
+
+        document_repo.add_document_permission(user, document, 1)
+        assert document_repo.get_document_mode(user, document) == 1
+
+        permission = document_repo.get_permission_by_document_and_user(document.id, user.id)
+        permission.document_permission_type_id = 2
+        document_repo.update_document_permission(permission)
+        assert document_repo.get_document_mode(user, document) == 2
+
+def test_audit_change_invalidates_document_mode(app: Flask):
+    document_repo = DocumentRepository()
+    audit_repo = AuditRepository()
+    with app.app_context():
+        user, document = db.session.get(User, 3), db.session.get(Document, 4)
+        assert document_repo.get_document_mode(user, document) is None
+
+        audit_repo.create_audit(Audit(uid="audit4", document_id=4, auditor_id=3, audit_status_id=3))
+        assert document_repo.get_document_mode(user, document) == 3
+
+        audit = audit_repo.get_audit_by_document_id(4)
+        audit.auditor_id = 2
+        audit_repo.update_audit(audit)
+        assert document_repo.get_document_mode(user, document) is None
+
+def test_document_mode_of_any_auditor(app: Flask):
+    document_repo = DocumentRepository()
+    with app.app_context():
+        # a second audit of document 3, by another auditor than the first
+        db.session.add(Audit(uid="audit3b", document_id=3, auditor_id=3, audit_status_id=3))
+        db.session.commit()
+        user, document = db.session.get(User, 3), db.session.get(Document, 3)
+        assert document_repo.get_document_mode(user, document) == 3
+        document_mode_cache.clear()
+        assert document_repo.get_document_modes(user, [document]) == {3: 3}
+
+def test_get_document_modes(app: Flask, capture_statements):
+    document_repo = DocumentRepository()
+    with app.app_context():
+        user = db.session.get(User, 2)
+        documents = [db.session.get(Document, i) for i in range(1, 5)]
+        modes, statements = capture_statements(lambda: document_repo.get_document_modes(user, documents))
+        assert modes == {1: 1, 2: 2, 3: 3, 4: None}
+        assert len(statements) == 2
+
+        # answered from the cache filled by the bulk lookup
+        modes, statements = capture_statements(lambda: document_repo.get_document_modes(user, documents))
+        assert modes == {1: 1, 2: 2, 3: 3, 4: None}
+        assert len(statements) == 0
+        mode, statements = capture_statements(lambda: document_repo.get_document_mode(user, documents[2]))
+        assert (mode, len(statements)) == (3, 0)
+
+        document_repo.delete_document(documents[0])
+        modes = document_repo.get_document_modes(user, documents[1:])
+        assert modes == {2: 2, 3: 3, 4: None}
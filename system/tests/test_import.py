@@ -0,0 +1,125 @@
+import io
+import json
+import pytest
+from flask import Flask
+from model.base_model import db
+from model.user_model import User
+from model.document_model import Document, DocumentComment, DocumentImport, DocumentPermission, DocumentPermissionType
+from controller.commands import commands
+from service import import_service
+from service.import_service import iter_records
+from service.search_service import SearchService
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="owner", name="Owner", mail="owner@gmail.com", google_id="google_id_owner"))
+        db.session.add(User(id=2, username="reader", name="Reader", mail="reader@gmail.com", google_id="google_id_reader"))
+        db.session.add(DocumentPermissionType(id=1, name="read"))
+        db.session.commit()
+    app.register_blueprint(commands)
+    return app
+
+def write_archive(tmp_path, records) -> str:
+    path = tmp_path / "archive.ndjson"
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+    return str(path)
+
+def make_records(count: int):
+    return [
+        {
+            "name": f"Imported {i}",
+            "body": f"<p>Archive body {i}</p>",
+            "permissions": [{"username": "reader", "permissionType": 1}],
+            "comments": [{"inlineId": f"inline{i}", "text": f"Comment {i}", "commentor": {"name": "Reader"}}],
+        }
+        for i in range(count)
+    ]
+
+def test_iter_records_reads_ndjson_and_json_arrays(monkeypatch):
+    monkeypatch.setattr(import_service, 'READ_CHUNK_SIZE', 7)
+    records = [{"name": "a", "body": "<p>[1, 2]</p>"}, {"name": "b"}]
+    assert list(iter_records(io.StringIO('\n'.join(json.dumps(record) for record in records) + '\n\n'))) == records
+    assert list(iter_records(io.StringIO(' \n' + json.dumps(records, indent=2)))) == records
+    assert list(iter_records(io.StringIO(''))) == []
+    with pytest.raises(ValueError):
+        list(iter_records(io.StringIO('[{"name": "a"}, {"name"')))
+
+def test_import_documents_in_batches(app: Flask, tmp_path, capture_statements):
+    archive = write_archive(tmp_path, make_records(25))
+    with app.app_context():
+        result, statements = capture_statements(
+            lambda: app.test_cli_runner().invoke(args=['import-documents', archive, '--owner', 'owner', '--batch-size', '10'])
+        )
+        assert result.exit_code == 0, result.output
+        assert "Imported 10 documents\nImported 20 documents\nImported 25 documents\n" in result.output
+
+        assert Document.query.filter_by(owner_id=1).count() == 25
+        assert DocumentPermission.query.filter_by(user_id=2).count() == 25
+        assert DocumentComment.query.filter_by(commenter_id=2).count() == 25
+        assert Document.query.filter_by(name="Imported 3").one().body == "<p>Archive body 3</p>"
+        assert DocumentImport.query.one().status == 'completed'
+        # one INSERT per table and batch, not per document
+        document_inserts = [s for s in statements if s.startswith('INSERT INTO document ')]
+        assert len(document_inserts) == 3
+
+        results = SearchService().search(1, "archive", limit=30)
+        assert len(results) == 25
+
+def test_import_documents_resumes_after_failure(app: Flask, tmp_path):
+    records = make_records(5)
+    records[3]["permissions"] = [{"username": "nobody", "permissionType": 1}]
+    archive = write_archive(tmp_path, records)
+
+    with app.app_context():
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['import-documents', archive, '--owner', 'owner', '--batch-size', '2'])
+        assert result.exit_code != 0
+        assert "Can't find user by username: nobody" in result.output
+        assert "--resume 1" in result.output
+        document_import = DocumentImport.query.one()
+        assert (document_import.status, document_import.imported) == ('failed', 2)
+        # the failed batch is rolled back, the batch before it is kept
+        assert Document.query.count() == 2
+
+        records[3]["permissions"] = [{"username": "reader", "permissionType": 1}]
+        write_archive(tmp_path, records)
+        result = runner.invoke(args=['import-documents', archive, '--resume', '1', '--batch-size', '2'])
+        assert result.exit_code == 0, result.output
+        assert sorted(document.name for document in Document.query) == [f"Imported {i}" for i in range(5)]
+        assert DocumentImport.query.one().status == 'completed'
+
+        result = runner.invoke(args=['import-documents', archive, '--resume', '1'])
+        assert "No import 1 to resume" in result.output
+
+def test_import_documents_resume_needs_the_same_archive(app: Flask, tmp_path):
+    records = make_records(3)
+    records[1]["permissions"] = [{"username": "nobody", "permissionType": 1}]
+    archive = write_archive(tmp_path, records)
+    other = tmp_path / "other.ndjson"
+    other.write_text(json.dumps(make_records(1)[0]) + '\n', encoding='utf-8')
+
+    with app.app_context():
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['import-documents', archive, '--owner', 'owner', '--batch-size', '1'])
+        assert DocumentImport.query.one().status == 'failed'
+
+        result = runner.invoke(args=['import-documents', str(other), '--resume', '1'])
+        assert result.exit_code != 0
+        assert f"Import 1 is of {archive}, not {other}" in result.output
+        assert Document.query.count() == 1
+
+def test_import_documents_unknown_owner(app: Flask, tmp_path):
+    archive = write_archive(tmp_path, make_records(1))
+    with app.app_context():
+        result = app.test_cli_runner().invoke(args=['import-documents', archive, '--owner', 'nobody'])
+        assert result.exit_code != 0
+        assert "Can't find user by username: nobody" in result.output
@@ -0,0 +1,47 @@
+import pytest
+from flask import Flask
+from model.base_model import db
+from model.audit_model import AuditStatus
+from model.document_model import DocumentPermissionType
+from repo.audit_repo import AuditRepository
+from repo.document_repo import DocumentRepository
+from repo.lookup import lookup_registry
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            AuditStatus(id=1, name="Approved"),
+            AuditStatus(id=3, name="Pending"),
+            DocumentPermissionType(id=1, name="read"),
+        ])
+        db.session.commit()
+    return app
+
+def test_lookup_registry_is_loaded_once(app: Flask, capture_statements):
+    with app.app_context():
+        statuses, statements = capture_statements(lambda: lookup_registry.audit_statuses)
+        assert dict(statuses) == {1: "Approved", 3: "Pending"}
+        assert len(statements) == 3
+
+        _, statements = capture_statements(lambda: (lookup_registry.audit_statuses, lookup_registry.document_permission_types))
+        assert len(statements) == 0
+        with pytest.raises(TypeError):
+            statuses[2] = "Rejected"
+
+def test_lookup_registry_is_refreshed_on_change(app: Flask):
+    with app.app_context():
+        assert 2 not in lookup_registry.audit_statuses
+        AuditRepository().create_audit_status(AuditStatus(id=2, name="Rejected"))
+        assert lookup_registry.audit_statuses[2] == "Rejected"
+
+        DocumentRepository().create_document_permission_type_not_exist(DocumentPermissionType(id=2, name="write"))
+        assert dict(lookup_registry.document_permission_types) == {1: "read", 2: "write"}
@@ -0,0 +1,171 @@
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from model.base_model import db
+from model.user_model import User
+from model.document_model import Document, DocumentRevision
+from controller.document import routes as document_routes
+from controller.document.routes import documents
+from service.lease_service import EditLeaseService
+from service.revision_service import SNAPSHOT_INTERVAL
+from service.text_ops import apply_ops, ops_from_utf16
+
+PARAGRAPH = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20 + "</p>"
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="owner", name="Owner Name", mail="owner@gmail.com", google_id="google_id_owner"))
+        db.session.add(Document(id=1, uid="doc1", name="Document 1", body=PARAGRAPH * 50, owner_id=1, document_status_id=1))
+        db.session.commit()
+    app.register_blueprint(documents, url_prefix='/api/documents')
+    return app
+
+@pytest.fixture(autouse=True)
+def lease_service(monkeypatch, fake_redis):
+    monkeypatch.setattr(document_routes.document_service, 'lease_service', EditLeaseService())
+
+@pytest.fixture
+def client(app: Flask) -> FlaskClient:
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['google_id'] = 'google_id_owner'
+    return client
+
+def save_edits(client: FlaskClient, count: int):
+    """Make count small edits, alternating PATCH and PUT, and return the bodies saved."""
+    bodies = {}
+    body = client.get('/api/documents/doc1').json["body"]
+    for i in range(count):
+        position = (i * 997) % len(body)
+        new_body = body[:position] + f"[edit {i}]" + body[position:]
+        if i % 2:
+            response = client.put('/api/documents/doc1', json={"body": new_body, "comments": []})
+            assert response.status_code == 200
+        else:
+            version = client.get('/api/documents/doc1').json["version"]
+            response = client.patch('/api/documents/doc1', json={
+                "baseVersion": version,
+                "ops": [{"retain": position}, {"insert": f"[edit {i}]"}],
+            })
+            assert response.status_code == 200
+        body = new_body
+        bodies[i + 2] = body
+    return bodies
+
+def test_revisions_are_rebuilt(app: Flask, client: FlaskClient):
+    bodies = save_edits(client, 2 * SNAPSHOT_INTERVAL + 3)
+    for revision, body in bodies.items():
+        response = client.get(f'/api/documents/doc1/revisions/{revision}')
+        assert response.status_code == 200
+        assert response.json == {"revision": revision, "body": body}
+
+    with app.app_context():
+        revisions = DocumentRevision.query.order_by(DocumentRevision.revision).all()
+        assert [r.revision for r in revisions if r.is_snapshot] == [2, SNAPSHOT_INTERVAL, 2 * SNAPSHOT_INTERVAL]
+        # deltas grow with the edit, not with the document
+        assert all(len(r.content) < 100 for r in revisions if not r.is_snapshot)
+
+def test_list_revisions(client: FlaskClient):
+    save_edits(client, 5)
+    response = client.get('/api/documents/doc1/revisions?limit=3')
+    assert response.status_code == 200
+    assert [r["revision"] for r in response.json["revisions"]] == [2, 3, 4]
+    assert response.json["revisions"][0]["author"] == {"name": "Owner Name"}
+
+    cursor = response.json["nextCursor"]
+    response = client.get(f'/api/documents/doc1/revisions?limit=3&cursor={cursor}')
+    assert [r["revision"] for r in response.json["revisions"]] == [5, 6]
+    assert response.json["nextCursor"] is None
+
+def test_diff_revisions(client: FlaskClient):
+    bodies = save_edits(client, 3)
+    response = client.get('/api/documents/doc1/revisions/2/diff/4')
+    assert response.status_code == 200
+    assert response.json["from"] == 2 and response.json["to"] == 4
+    assert apply_ops(bodies[2], response.json["ops"]) == bodies[4]
+    # only the words around the two edits are sent
+    assert sum(len(op.get("insert", "")) for op in response.json["ops"]) < 30
+
+def test_ops_count_utf16_code_units(app: Flask, client: FlaskClient):
+    with app.app_context():
+        db.session.get(Document, 1).body = "<p>\U0001F600 smile</p>"
+        db.session.commit()
+    version = client.get('/api/documents/doc1').json["version"]
+    # retain the emoji as the editor counts it, two code units
+    response = client.patch('/api/documents/doc1', json={
+        "baseVersion": version,
+        "ops": [{"retain": 6}, {"delete": 5}, {"insert": "grin"}],
+    })
+    assert response.status_code == 200
+    assert client.get('/api/documents/doc1').json["body"] == "<p>\U0001F600 grin</p>"
+
+    # a position between the two code units of the emoji
+    response = client.patch('/api/documents/doc1', json={"baseVersion": version + 1, "ops": [{"retain": 4}]})
+    assert response.status_code == 400
+
+    response = client.patch('/api/documents/doc1', json={
+        "baseVersion": version + 1,
+        "ops": [{"retain": 6}, {"delete": 4}, {"insert": "big grin"}],
+    })
+    assert response.status_code == 200
+    response = client.get(f'/api/documents/doc1/revisions/{version + 1}/diff/{version + 2}')
+    assert response.json["ops"][0] == {"retain": 6}
+    old = "<p>\U0001F600 grin</p>"
+    assert apply_ops(old, ops_from_utf16(old, response.json["ops"])) == "<p>\U0001F600 big grin</p>"
+
+def test_revision_not_found(client: FlaskClient):
+    save_edits(client, 1)
+    assert client.get('/api/documents/doc1/revisions/1').status_code == 400
+    assert client.get('/api/documents/doc1/revisions/3').status_code == 400
+    assert client.get('/api/documents/doc1/revisions/2/diff/3').status_code == 400
+    assert client.get('/api/documents/not_exist/revisions').status_code == 400
+    assert client.get('/api/documents/doc1/revisions?cursor=bad').status_code == 400
+
+def test_delete_document_deletes_revisions(app: Flask, client: FlaskClient):
+    save_edits(client, 2)
+    assert client.delete('/api/documents/doc1').status_code == 200
+    with app.app_context():
+        assert DocumentRevision.query.count() == 0
+
+def test_put_retries_after_concurrent_save(app: Flask, client: FlaskClient, monkeypatch):
+    document_repo = document_routes.document_service.document_repo
+    update_document_body = document_repo.update_document_body
+    calls = []
+
+    def racing_update_document_body(document, base_version, body, revision=None):
+        if not calls:
+            # a PATCH saves between the read of the PUT and its update
+            assert update_document_body(document, base_version, "Patched body")
+        calls.append(base_version)
+        return update_document_body(document, base_version, body, revision)
+
+    monkeypatch.setattr(document_repo, 'update_document_body', racing_update_document_body)
+    response = client.put('/api/documents/doc1', json={"body": "Put body", "comments": []})
+    assert response.status_code == 200
+    assert calls == [1, 2]
+    with app.app_context():
+        document = db.session.get(Document, 1)
+        assert (document.body, document.version) == ("Put body", 3)
+        assert [r.revision for r in DocumentRevision.query] == [3]
+
+def test_put_conflict_when_revision_is_recorded(app: Flask, client: FlaskClient):
+    with app.app_context():
+        # the revision of the next version was recorded by another save
+        db.session.add(DocumentRevision(document_id=1, revision=2, is_snapshot=True, content="Other body"))
+        db.session.commit()
+
+    response = client.put('/api/documents/doc1', json={"body": "Put body", "comments": []})
+    assert response.status_code == 409
+    assert response.json == {"state": "conflict", "version": 1}
+    with app.app_context():
+        assert db.session.get(Document, 1).body == PARAGRAPH * 50
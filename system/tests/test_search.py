@@ -0,0 +1,96 @@
+import re
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from model.base_model import db
+from model.user_model import User
+from model.document_model import Document, DocumentPermission
+from model.search_model import SearchPosting
+from controller.document import routes as document_routes
+from controller.document.routes import documents
+from service.lease_service import EditLeaseService
+from service.search_service import SearchService, tokenize
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="owner", name="Owner", mail="owner@gmail.com", google_id="google_id_owner"))
+        db.session.add(User(id=2, username="other", name="Other", mail="other@gmail.com", google_id="google_id_other"))
+        db.session.add(Document(id=1, uid="doc1", name="Budget report", body="<p>Quarterly budget numbers.</p>", owner_id=1, document_status_id=1))
+        db.session.add(Document(id=2, uid="doc2", name="Meeting notes", body="<p>We discussed the budget, the budget and the schedule.</p>", owner_id=1, document_status_id=1))
+        db.session.add(Document(id=3, uid="doc3", name="Private budget", body="<p>Budget of another user.</p>", owner_id=2, document_status_id=1))
+        db.session.add(Document(id=4, uid="doc4", name="Shared plan", body="<p>Shared budget plan.</p>", owner_id=2, document_status_id=1))
+        db.session.add(DocumentPermission(document_id=4, user_id=1, document_permission_type_id=1))
+        db.session.commit()
+        SearchService().reindex_documents()
+    app.register_blueprint(documents, url_prefix='/api/documents')
+    return app
+
+@pytest.fixture(autouse=True)
+def lease_service(monkeypatch, fake_redis):
+    monkeypatch.setattr(document_routes.document_service, 'lease_service', EditLeaseService())
+
+@pytest.fixture
+def client(app: Flask) -> FlaskClient:
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['google_id'] = 'google_id_owner'
+    return client
+
+def search(client: FlaskClient, query: str):
+    response = client.get('/api/documents/search', query_string={"q": query})
+    assert response.status_code == 200
+    return [document["uid"] for document in response.json["documents"]]
+
+def test_tokenize():
+    assert tokenize("<p>The Café &amp; R&eacute;sum&eacute;</p>") == ["cafe", "resume"]
+    assert tokenize("雲端原生 test") == ["雲端", "端原", "原生", "test"]
+    assert tokenize(None) == []
+
+def test_search_ranks_readable_documents(client: FlaskClient):
+    # the name match ranks first, documents of other users are filtered out
+    assert search(client, "budget") == ["doc1", "doc2", "doc4"]
+    assert search(client, "schedule") == ["doc2"]
+    assert search(client, "BUDGET plan") == ["doc4", "doc1", "doc2"]
+    assert search(client, "nothing matches") == []
+    assert search(client, "the") == []
+
+def test_search_does_not_read_bodies(client: FlaskClient, capture_statements):
+    _, statements = capture_statements(lambda: search(client, "budget"))
+    assert statements
+    assert not any(re.search(r'document\.body\b', statement) for statement in statements)
+
+def test_index_follows_document_changes(app: Flask, client: FlaskClient):
+    response = client.post('/api/documents')
+    uid = response.json["documentUid"]
+    assert search(client, "new document") == [uid]
+
+    assert client.put(f'/api/documents/{uid}', json={"body": "<p>Roadmap draft</p>", "comments": []}).status_code == 200
+    assert search(client, "roadmap") == [uid]
+
+    assert client.patch(f'/api/documents/{uid}', json={"baseVersion": 2, "ops": [{"retain": 3}, {"delete": 7}, {"insert": "Timeline"}]}).status_code == 200
+    assert search(client, "roadmap") == []
+    assert search(client, "timeline") == [uid]
+
+    assert client.put(f'/api/documents/{uid}/name', json={"name": "Launch"}).status_code == 200
+    assert search(client, "launch") == [uid]
+    assert search(client, "new document") == []
+
+    assert client.delete(f'/api/documents/{uid}').status_code == 200
+    assert search(client, "launch") == []
+    with app.app_context():
+        assert SearchPosting.query.filter_by(term="launch").count() == 0
+
+def test_search_invalid_limit(client: FlaskClient):
+    assert client.get('/api/documents/search?q=budget&limit=0').status_code == 400
+    response = client.get('/api/documents/search?q=budget&limit=1')
+    assert [document["uid"] for document in response.json["documents"]] == ["doc1"]
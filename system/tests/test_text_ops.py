@@ -0,0 +1,88 @@
+import pytest
+from service.text_ops import apply_ops, diff_ops, ops_from_utf16, ops_to_utf16
+
+def test_apply_ops():
+    text = "Hello, world!"
+    assert apply_ops(text, []) == text
+    assert apply_ops(text, [{"retain": 7}, {"delete": 5}, {"insert": "there"}]) == "Hello, there!"
+    assert apply_ops(text, [{"insert": ">> "}]) == ">> Hello, world!"
+    assert apply_ops(text, [{"retain": 13}, {"insert": "!"}]) == "Hello, world!!"
+    assert apply_ops(text, [{"delete": 13}]) == ""
+
+@pytest.mark.parametrize("ops", [
+    [{"retain": 14}],
+    [{"retain": 10}, {"delete": 4}],
+    [{"retain": -1}],
+    [{"retain": "1"}],
+    [{"insert": 1}],
+    [{"replace": "x"}],
+    [{"retain": 1, "insert": "x"}],
+    ["retain"],
+])
+def test_apply_invalid_ops(ops):
+    with pytest.raises(ValueError):
+        apply_ops("Hello, world!", ops)
+
+def test_ops_from_utf16():
+    # the emoji is one character, and two UTF-16 code units in the editor
+    text = "<p>\U0001F600 smile \U0001F600</p>"
+    assert ops_from_utf16(text, [{"retain": 6}, {"delete": 5}, {"insert": "grin"}]) == \
+        [{"retain": 5}, {"delete": 5}, {"insert": "grin"}]
+    assert apply_ops(text, ops_from_utf16(text, [{"retain": 6}, {"delete": 5}, {"insert": "grin"}])) == \
+        "<p>\U0001F600 grin \U0001F600</p>"
+    assert apply_ops(text, ops_from_utf16(text, [{"retain": 3}, {"delete": 2}])) == "<p> smile \U0001F600</p>"
+    assert apply_ops(text, ops_from_utf16(text, [{"retain": 14}, {"insert": "!"}])) == \
+        "<p>\U0001F600 smile \U0001F600!</p>"
+    # text without such characters counts the same in both
+    assert ops_from_utf16("Hello, world!", [{"retain": 7}]) == [{"retain": 7}]
+
+@pytest.mark.parametrize("ops", [
+    [{"retain": 4}],
+    [{"retain": 3}, {"delete": 1}],
+])
+def test_ops_from_utf16_splitting_a_character(ops):
+    with pytest.raises(ValueError):
+        ops_from_utf16("<p>\U0001F600</p>", ops)
+
+@pytest.mark.parametrize("ops", [
+    [{"retain": 18}],
+    [{"retain": 3}, {"delete": 20}],
+    [{"retain": "1"}],
+])
+def test_ops_from_utf16_invalid_ops(ops):
+    with pytest.raises(ValueError):
+        apply_ops("<p>\U0001F600</p>", ops_from_utf16("<p>\U0001F600</p>", ops))
+
+def test_ops_to_utf16():
+    old = "<p>\U0001F600 smile \U0001F600</p>"
+    new = "<p>\U0001F600 grin \U0001F600 \U0001F44D</p>"
+    ops = diff_ops(old, new)
+    assert ops_from_utf16(old, ops_to_utf16(old, ops)) == ops
+    assert ops_to_utf16(old, [{"retain": 5}, {"delete": 5}, {"insert": "grin"}]) == \
+        [{"retain": 6}, {"delete": 5}, {"insert": "grin"}]
+
+@pytest.mark.parametrize("old, new", [
+    ("Hello, world!", "Hello, there!"),
+    ("Hello, world!", "Hello, world!"),
+    ("", "<p>text</p>"),
+    ("<p>text</p>", ""),
+    ("aaaa", "aaaaaa"),
+    ("abcabc", "abc"),
+])
+def test_diff_ops_round_trip(old, new):
+    assert apply_ops(old, diff_ops(old, new)) == new
+
+def test_diff_ops_only_sends_the_change():
+    old = "<p>" + "a" * 10000 + "</p>"
+    new = "<p>" + "a" * 5000 + "b" + "a" * 5000 + "</p>"
+    assert diff_ops(old, new) == [{"retain": 5003}, {"insert": "b"}]
+
+def test_diff_ops_scattered_edits():
+    paragraphs = [f"<p>Paragraph {i} of the document body.</p>" for i in range(200)]
+    old = "".join(paragraphs)
+    paragraphs[10] = "<p>Paragraph 10 of the edited document body.</p>"
+    paragraphs[150] = "<p>Paragraph 150 of the document.</p>"
+    new = "".join(paragraphs)
+    ops = diff_ops(old, new)
+    assert apply_ops(old, ops) == new
+    assert sum(len(op.get("insert", "")) for op in ops) < 20
@@ -0,0 +1,106 @@
+import pytest
+from flask import Flask
+from model.base_model import db
+from model.user_model import User, UserIdentity
+from model.document_model import Document
+from service.user_service import UserService
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            id=1,
+            username="albert123",
+            name="Albert",
+            mail="albert@example.com",
+            google_id="google_id_1",
+        ))
+        db.session.commit()
+    return app
+
+def test_get_user_by_google_id_is_cached(app: Flask, capture_statements):
+    user_service = UserService()
+    with app.test_request_context():
+        user, statements = capture_statements(lambda: user_service.get_user_by_google_id("google_id_1"))
+        assert user == UserIdentity(1, "albert123", "Albert", "albert@example.com", "google_id_1")
+        assert len(statements) == 1
+
+    # a later request is answered from the cross-request cache
+    with app.test_request_context():
+        user, statements = capture_statements(lambda: user_service.get_user_by_google_id("google_id_1"))
+        assert user.id == 1
+        assert len(statements) == 0
+
+def test_get_user_by_google_id_unknown_user_is_not_cached(app: Flask):
+    user_service = UserService()
+    with app.test_request_context():
+        assert user_service.get_user_by_google_id("google_id_2") is None
+        user_service.create_user("bob", "Bob", "bob@example.com", "google_id_2")
+        assert user_service.get_user_by_google_id("google_id_2").username == "bob"
+
+def test_update_user_settings_invalidates_identity(app: Flask):
+    user_service = UserService()
+    with app.test_request_context():
+        assert user_service.get_user_by_google_id("google_id_1").name == "Albert"
+        user_service.update_user_settings("albert123", "Albert Einstein", False)
+        assert user_service.get_user_by_google_id("google_id_1").name == "Albert Einstein"
+
+    with app.test_request_context():
+        assert user_service.get_user_by_google_id("google_id_1").name == "Albert Einstein"
+
+def test_find_user_ids_by_names(app: Flask, capture_statements):
+    user_service = UserService()
+    with app.test_request_context():
+        user_service.create_user("bob", "Bob", "bob@example.com", "google_id_2")
+        user_ids, statements = capture_statements(lambda: user_service.find_user_ids_by_names(["Albert", "Bob", "Albert", "Carol"]))
+        assert user_ids == {"Albert": 1, "Bob": 2}
+        assert len(statements) == 1
+
+        user_ids, statements = capture_statements(lambda: user_service.find_user_ids_by_names(["Albert", "Bob"]))
+        assert user_ids == {"Albert": 1, "Bob": 2}
+        assert len(statements) == 0
+
+        # a rename drops both names from the cache
+        user_service.update_user_settings("albert123", "Bob", True)
+        user_service.update_user_settings("bob", "Carol", True)
+        assert user_service.find_user_ids_by_names(["Albert", "Bob", "Carol"]) == {"Bob": 1, "Carol": 2}
+
+def test_search_users_by_prefix(app: Flask):
+    user_service = UserService()
+    with app.test_request_context():
+        # albert123 was added before the index existed
+        assert user_service.reindex_users() == 1
+        user_service.create_user("bob", "Bob Albertson", "bob@example.com", "google_id_2")
+        user_service.create_user("carol", "Carol Dupré", "albert.fan@example.com", "google_id_3")
+        user_service.create_user("dave", "Dave", "dave@example.com", "google_id_4")
+        db.session.add(Document(id=1, uid="document-1", name="Document", owner_id=4, document_status_id=1))
+        db.session.commit()
+
+        search = lambda text, **kwargs: [
+            user["username"]
+            for user in user_service.get_user_info_by_search_text(text, "document-1", 4, **kwargs)
+        ]
+        # username first, then name words, then mail, case does not matter
+        assert search("ALBERT") == ["albert123", "bob", "carol"]
+        assert search("albert", limit=2) == ["albert123", "bob"]
+        assert search("albert123") == ["albert123"]
+        assert search("dupre") == ["carol"]
+        assert search("carol dup") == ["carol"]
+        assert search("bob@example") == ["bob"]
+        assert search("%") == []
+        # the owner and the caller are left out
+        assert search("dave") == []
+        assert [user["username"] for user in user_service.get_user_info_by_search_text("albert", "document-1", 1)] == ["bob", "carol"]
+
+        # renames are indexed
+        user_service.update_user_settings("bob", "Robert", True)
+        assert search("albert") == ["albert123", "carol"]
+        assert search("rob") == ["bob"]